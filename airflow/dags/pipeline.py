@@ -1,11 +1,17 @@
 from airflow import DAG
 from airflow.decorators import task
+from airflow.models.param import Param
 from datetime import datetime
 import os
 import sys
 
 sys.path.append("/opt/airflow/src")
-from src.Text_preprocessing import run_preprocessing
+from src.Text_preprocessing import (
+    get_engine, prepare_schema, count_pending, plan_partitions, run_partition,
+    finalize_partitions, close_empty_run
+)
+from src.ingestion_state import FULL_REBUILD, start_run, pipeline_lock
+from src.run_journal import open_run
 
 with DAG(
     dag_id="drug_review_preprocessing",
@@ -16,15 +22,88 @@ with DAG(
         "owner": "mlops",
         "retries": 1,
     },
+    params={
+        # "incremental" only reads raw_data above the stored watermark,
+        # trigger with "full" to empty processed_data and backfill everything
+        "mode": Param("incremental", enum=["incremental", "full"]),
+        # raw_data rows per partition task
+        "partition_size": Param(int(os.getenv("PREPROCESS_PARTITION_SIZE", 20000)),
+                                type="integer", minimum=1),
+        # at most this many partition tasks run at the same time
+        "max_parallelism": Param(int(os.getenv("PREPROCESS_MAX_PARALLELISM", 4)),
+                                 type="integer", minimum=1),
+    },
     tags=["healthcare", "nlp", "preprocessing"],
 ) as dag:
 
+    @task.short_circuit
+    def count_pending_task(**context):
+        """
+        Starts (or, on a retry of the same DAG run, resumes) the run and skips
+        everything downstream when raw_data has nothing above the watermark.
+        Schema migrations and property bits are prepared here, once, under the
+        lock; the parallel partition tasks only read them.
+        """
+        engine = get_engine()
+        mode = context["params"]["mode"]
+        # the micro-batch loop pauses while this DAG run is in flight
+        with pipeline_lock(engine) as acquired:
+            if not acquired:
+                raise RuntimeError("another preprocessing run holds the pipeline lock")
+            prepare_schema(engine)
+            _, resumed = open_run(engine, mode, context["run_id"])
+            start_run(engine, mode, resume=resumed)
+            pending = count_pending(engine)
+            if pending["pending"] == 0:
+                if mode == FULL_REBUILD:
+                    # processed_data was emptied, the aggregates built on it must follow
+                    finalize_partitions(engine, context["run_id"], pending["watermark"])
+                else:
+                    close_empty_run(engine, context["run_id"])
+                return False
+        return pending
+
+    @task
+    def plan_partitions_task(pending, **context):
+        """
+        Splits (watermark, max_id] into uniqueID ranges and groups them into
+        at most max_parallelism lanes
+        """
+        params = context["params"]
+        partitions = plan_partitions(
+            get_engine(), pending["watermark"], pending["max_id"], params["partition_size"]
+        )
+        lanes = min(params["max_parallelism"], len(partitions))
+        return [partitions[i::lanes] for i in range(lanes)]
+
+    @task
+    def preprocess_partition_task(lane, **context):
+        """
+        Executes preprocessing pipeline for a group of partitions:
+        raw_data (start < uniqueID <= end) -> preprocessing -> processed_data
+        Chunks journaled by an earlier try of this task are skipped.
+        """
+        workers = max(1, (os.cpu_count() or 1) // context["params"]["max_parallelism"])
+        return sum(
+            run_partition(partition["start"], partition["end"], workers=workers,
+                          run_id=context["run_id"])
+            for partition in lane
+        )
+
     @task
-    def preprocess_task():
+    def finalize_task(rows, pending, **context):
         """
-        Executes full preprocessing pipeline:
-        raw_data -> preprocessing -> processed_data
+        Moves the watermark to max_id once every partition is stored and
+        refreshes the aggregates built on processed_data
         """
-        return run_preprocessing()
+        engine = get_engine()
+        with pipeline_lock(engine) as acquired:
+            if not acquired:
+                raise RuntimeError("another preprocessing run holds the pipeline lock")
+            rows = finalize_partitions(engine, context["run_id"], pending["max_id"])
+        return f"Processed {rows} records"
 
-    preprocess_task()
+    pending = count_pending_task()
+    lanes = plan_partitions_task(pending)
+    rows = preprocess_partition_task.expand(lane=lanes)
+    finalize_task(rows, pending)
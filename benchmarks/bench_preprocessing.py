@@ -0,0 +1,191 @@
+# Throughput benchmark of the preprocessing pipeline on a synthetic corpus:
+#
+#   python benchmarks/bench_preprocessing.py --sizes 1000 10000 50000
+#   python benchmarks/bench_preprocessing.py --compare old.json new.json
+#
+# Every corpus size runs in its own process against a throw-away local
+# database (sqlite by default, see src/db.py), a cold lemma cache and its own
+# snapshot directory, so sizes do not share caches and peak RSS is per run.
+# Results are written as JSON (one file per commit by default) so two runs
+# can be diffed with --compare.
+import os
+import sys
+import json
+import time
+import platform
+import tempfile
+import argparse
+import resource
+import subprocess
+from datetime import datetime
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+RESULTS_DIR = os.path.join(ROOT, 'benchmarks', 'results')
+DEFAULT_SIZES = [1000, 10000, 50000]
+
+
+def reset_peak_rss():
+    """Reset the kernel's peak RSS counter (Linux), so each stage gets its own peak."""
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+        return True
+    except OSError:
+        return False
+
+
+def peak_rss_mb():
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return round(int(line.split()[1]) / 1024, 1)
+    except OSError:
+        pass
+    # process lifetime peak: kB on Linux, bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=ROOT,
+            capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def run_single(size, backend, seed, workers, workdir):
+    """Benchmark one corpus size in this process; returns the result dict."""
+    os.environ.update({
+        "DB_BACKEND": backend,
+        "DB_PATH": os.path.join(workdir, f"bench.{backend}"),
+        "LEMMA_CACHE_PATH": os.path.join(workdir, "lemma_cache.sqlite"),
+        "PROCESSED_SNAPSHOT_DIR": os.path.join(workdir, "snapshots"),
+    })
+    sys.path.append(os.path.join(ROOT, 'src'))
+    sys.path.append(os.path.join(ROOT, 'benchmarks'))
+
+    import pandas as pd
+    from sqlalchemy import text
+    import Text_preprocessing as tp
+    from synthetic_reviews import generate_reviews, describe
+
+    engine = tp.get_engine()
+    corpus = generate_reviews(size, seed)
+    corpus.to_sql("raw_data", engine, if_exists="append", index=False, chunksize=5000)
+    writer = tp.prepare_run(engine)
+
+    stages = {}
+
+    def measure(name, func, data):
+        reset_peak_rss()
+        start = time.perf_counter()
+        data = func(data)
+        seconds = time.perf_counter() - start
+        stages[name] = {
+            "seconds": round(seconds, 4),
+            "reviews_per_sec": round(size / seconds, 1) if seconds else None,
+            "peak_rss_mb": peak_rss_mb(),
+        }
+        return data
+
+    data = measure("read", lambda _: pd.read_sql(
+        text(tp.RAW_DELTA_QUERY), engine,
+        params={"after_id": tp.NO_WATERMARK, "until_id": tp.MAX_UNIQUE_ID}
+    ), None)
+    for name, stage in tp.build_stages(workers):
+        data = measure(name, stage, data)
+
+    def write(processed):
+        for i in range(0, len(processed), tp.CHUNK_SIZE):
+            tp.write_chunk(engine, processed.iloc[i:i + tp.CHUNK_SIZE], writer, track_watermark=False)
+        return processed
+
+    measure("write", write, data)
+    total = sum(stage["seconds"] for stage in stages.values())
+    return {
+        "size": size,
+        "corpus": describe(corpus),
+        "total_seconds": round(total, 4),
+        "reviews_per_sec": round(size / total, 1) if total else None,
+        "peak_rss_mb": max(stage["peak_rss_mb"] for stage in stages.values()),
+        "stages": stages,
+    }
+
+
+def run_sizes(sizes, backend, seed, workers):
+    results = []
+    for size in sizes:
+        with tempfile.TemporaryDirectory(prefix="bench_preprocessing_") as workdir:
+            completed = subprocess.run(
+                [sys.executable, __file__, "--single", str(size), "--backend", backend,
+                 "--seed", str(seed), "--workers", str(workers), "--workdir", workdir],
+                capture_output=True, text=True, cwd=workdir,
+            )
+        if completed.returncode != 0:
+            raise RuntimeError(f"benchmark of {size} reviews failed:\n{completed.stderr}")
+        result = json.loads(completed.stdout.strip().splitlines()[-1])
+        print(f"{size:>8} reviews: {result['reviews_per_sec']:>9} reviews/sec, "
+              f"peak {result['peak_rss_mb']} MB  "
+              + ", ".join(f"{name} {stage['seconds']}s" for name, stage in result["stages"].items()))
+        results.append(result)
+    return results
+
+
+def compare(old_path, new_path):
+    """Print the reviews/sec change per size and stage between two result files."""
+    with open(old_path) as f:
+        old = {r["size"]: r for r in json.load(f)["results"]}
+    with open(new_path) as f:
+        new = {r["size"]: r for r in json.load(f)["results"]}
+
+    def change(before, after):
+        if not before or not after:
+            return "n/a"
+        return f"{(after - before) / before:+.1%}"
+
+    for size in sorted(set(old) & set(new)):
+        print(f"{size} reviews: total {change(old[size]['reviews_per_sec'], new[size]['reviews_per_sec'])}")
+        for name in new[size]["stages"]:
+            if name in old[size]["stages"]:
+                before = old[size]["stages"][name]["reviews_per_sec"]
+                after = new[size]["stages"][name]["reviews_per_sec"]
+                print(f"  {name:>10}: {before} -> {after} reviews/sec ({change(before, after)})")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="preprocessing throughput benchmark")
+    parser.add_argument("--sizes", type=int, nargs="+", default=DEFAULT_SIZES)
+    parser.add_argument("--backend", choices=["sqlite", "duckdb"], default="sqlite")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--workers", type=int, default=1,
+                        help="1 benchmarks each stage serially, >1 the process pool path")
+    parser.add_argument("--out", help="result file (default benchmarks/results/preprocessing-<commit>.json)")
+    parser.add_argument("--compare", nargs=2, metavar=("OLD", "NEW"))
+    parser.add_argument("--single", type=int, help=argparse.SUPPRESS)
+    parser.add_argument("--workdir", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.compare:
+        compare(*args.compare)
+    elif args.single:
+        print(json.dumps(run_single(args.single, args.backend, args.seed, args.workers, args.workdir)))
+    else:
+        commit = git_commit()
+        report = {
+            "commit": commit,
+            "created": datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "config": {"backend": args.backend, "seed": args.seed, "workers": args.workers},
+            "results": run_sizes(args.sizes, args.backend, args.seed, args.workers),
+        }
+        out = args.out or os.path.join(RESULTS_DIR, f"preprocessing-{commit}.json")
+        os.makedirs(os.path.dirname(os.path.abspath(out)), exist_ok=True)
+        with open(out, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"results written to {out}")
@@ -0,0 +1,138 @@
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from property_lexicon import medical_properties
+
+# Shape of the drugs.com review corpus the pipeline runs on: 214K reviews,
+# 3,667 drugs and 916 conditions, both long tailed (a few contraceptives and
+# antidepressants own most reviews). Reviews average ~84 words, are wrapped in
+# quotes and carry HTML entities (mostly &#039; for apostrophes).
+N_DRUGS = 3667
+N_CONDITIONS = 916
+MEDIAN_WORDS = 72
+WORDS_SIGMA = 0.55
+MAX_WORDS = 1800
+# share of reviews per rating 1..10
+RATING_SHARES = [0.134, 0.043, 0.040, 0.031, 0.050, 0.039, 0.058, 0.117, 0.171, 0.317]
+FIRST_DATE, LAST_DATE = "2008-02-24", "2017-12-12"
+MEAN_USEFUL_COUNT = 28
+# share of drawn words taken from the keyword lexicons instead of filler text
+KEYWORD_RATE = 0.08
+# per word rate of "I&#039;ve" style contractions, ~60% of reviews get at least one
+CONTRACTION_RATE = 0.011
+
+FILLER = (
+    "i have been taking this medication for about months and it was prescribed by my doctor "
+    "after trying several other options the first week was hard but now i feel much better "
+    "my symptoms are under control most days although some nights are still difficult "
+    "would recommend to anyone with the same condition dose was increased twice "
+    "started at mg then went up insurance covered most of it pharmacy never had issues "
+    "overall experience has been good so far but everyone reacts differently "
+    "please talk with your doctor before you stop or change anything"
+).split()
+CONTRACTIONS = ["I&#039;ve", "don&#039;t", "it&#039;s", "I&#039;m", "didn&#039;t", "can&#039;t"]
+ENTITIES = ["&amp;", "&quot;", "&#039;"]
+
+_SYLLABLES = ["lo", "va", "zi", "pro", "tex", "mel", "dor", "ri", "cal", "nex", "ta", "quin",
+              "sar", "bel", "mi", "fen", "tro", "xa", "lin", "dol"]
+
+
+def _names(rng, count, suffixes):
+    names = set()
+    while len(names) < count:
+        parts = rng.choice(_SYLLABLES, size=rng.integers(2, 5))
+        names.add("".join(parts).capitalize() + rng.choice(suffixes))
+    return sorted(names)
+
+
+def _zipf_weights(count, exponent):
+    weights = 1.0 / np.arange(1, count + 1) ** exponent
+    return weights / weights.sum()
+
+
+def keyword_vocabulary():
+    from Text_preprocessing import benefit_keywords, side_effect_keywords
+
+    words = set(benefit_keywords) | set(side_effect_keywords)
+    for keywords in medical_properties.values():
+        words.update(keywords)
+    return sorted(words)
+
+
+def generate_reviews(n, seed=42, n_drugs=N_DRUGS, n_conditions=N_CONDITIONS):
+    """A raw_data shaped DataFrame of n synthetic reviews (deterministic for a seed)."""
+    rng = np.random.default_rng(seed)
+    drugs = _names(rng, n_drugs, ["", "", "ine", "ol", "ex", "a"])
+    conditions = _names(rng, n_conditions, [" Disorder", " Pain", "", " Syndrome", "itis"])
+
+    drug_ids = rng.choice(n_drugs, size=n, p=_zipf_weights(n_drugs, 1.05))
+    # most reviews of a drug are filed under its main condition
+    main_condition = rng.choice(n_conditions, size=n_drugs, p=_zipf_weights(n_conditions, 1.0))
+    other_condition = rng.choice(n_conditions, size=n, p=_zipf_weights(n_conditions, 1.0))
+    condition_ids = np.where(rng.random(n) < 0.8, main_condition[drug_ids], other_condition)
+
+    lengths = np.clip(
+        rng.lognormal(np.log(MEDIAN_WORDS), WORDS_SIGMA, size=n).astype(int), 3, MAX_WORDS
+    )
+    keywords = keyword_vocabulary()
+    vocabulary = np.array(FILLER + keywords + CONTRACTIONS, dtype=object)
+    weights = np.concatenate([
+        np.full(len(FILLER), (1 - KEYWORD_RATE - CONTRACTION_RATE) / len(FILLER)),
+        np.full(len(keywords), KEYWORD_RATE / len(keywords)),
+        np.full(len(CONTRACTIONS), CONTRACTION_RATE / len(CONTRACTIONS)),
+    ])
+    words = rng.choice(vocabulary, size=int(lengths.sum()), p=weights / weights.sum())
+    entity_reviews = rng.random(n) < 0.05
+
+    reviews = []
+    for i, review_words in enumerate(np.split(words, np.cumsum(lengths)[:-1])):
+        review = " ".join(review_words)
+        if entity_reviews[i]:
+            review = f"{review} {rng.choice(ENTITIES)} {rng.choice(FILLER)}"
+        reviews.append(f'"{review[:1].upper()}{review[1:]}."')
+
+    first, last = pd.Timestamp(FIRST_DATE), pd.Timestamp(LAST_DATE)
+    days = rng.integers(0, (last - first).days + 1, size=n)
+    return pd.DataFrame({
+        "uniqueID": np.arange(1, n + 1),
+        "drugName": np.array(drugs, dtype=object)[drug_ids],
+        "conditions": np.array(conditions, dtype=object)[condition_ids],
+        "review": reviews,
+        "rating": rng.choice(np.arange(1, 11), size=n, p=np.array(RATING_SHARES) / sum(RATING_SHARES)),
+        "date": (first + pd.to_timedelta(days, unit="D")).strftime("%d-%b-%y"),
+        "usefulCount": rng.geometric(1 / MEAN_USEFUL_COUNT, size=n) - 1,
+    })
+
+
+def describe(df):
+    """The distribution figures the generator is meant to reproduce."""
+    words = df["review"].str.split().str.len()
+    return {
+        "reviews": len(df),
+        "drugs": int(df["drugName"].nunique()),
+        "conditions": int(df["conditions"].nunique()),
+        "mean_words": round(float(words.mean()), 1),
+        "median_words": float(words.median()),
+        "html_entity_share": round(float(df["review"].str.contains("&#?\\w+;").mean()), 3),
+        "top_drug_share": round(float(df["drugName"].value_counts(normalize=True).iloc[0]), 4),
+    }
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="generate a synthetic raw_data corpus")
+    parser.add_argument("--size", type=int, default=10000)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--csv", help="write the corpus to this csv")
+    args = parser.parse_args()
+
+    corpus = generate_reviews(args.size, args.seed)
+    if args.csv:
+        corpus.to_csv(args.csv, index=False)
+    print(describe(corpus))
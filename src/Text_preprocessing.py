@@ -1,33 +1,226 @@
 import pandas as pd
 import numpy as np
-import nltk
-import re
 import os
 import sys
+import time
+import queue
+import threading
+import json
+import argparse
+from collections import deque
 sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'src'))
-from sqlalchemy import create_engine
-from dotenv import load_dotenv
+from sqlalchemy import text
 from logger import logging
-from nltk.corpus import stopwords
-from nltk.stem import WordNetLemmatizer
-from nltk.tokenize import word_tokenize
-
-
-def run_preprocessing():
-    load_dotenv()
-    
-    engine = create_engine(
-        f"mysql+pymysql://{os.getenv('DB_USER')}:{os.getenv('DB_PASSWORD')}"
-        f"@{os.getenv('DB_HOST')}:{int(os.getenv('DB_PORT'))}/{os.getenv('DB_NAME')}",
-        pool_pre_ping=True
+from ingestion_state import (
+    INCREMENTAL, RUN_MODES, NO_WATERMARK, start_run, advance_watermark, finish_run,
+    get_watermark, pipeline_lock
+)
+from text_normalizer import TextNormalizer, clean_text
+from lemma_cache import get_cache, report_stats
+from keyword_matcher import KeywordMatcher
+from nltk_resources import ensure_resources
+from run_journal import (
+    open_run, record_chunk, resume_point, run_rows, close_run, active_runs, FAILED
+)
+import db
+from snapshot import publish_snapshot
+from drug_leaderboard import refresh_leaderboard
+from drug_trends import refresh_trends
+from analysis_cache import invalidate_results
+from review_index import update_index
+from review_dedup import ReviewDeduplicator, ensure_dedup_schema, merge_canonicals, DEDUP_ENABLED
+from property_lexicon import (
+    compute_masks, default_bits, property_bits, load_property_bits, refresh_property_bits
+)
+from bulk_writer import ProcessedWriter, ensure_unique_key, STRATEGIES, DEFAULT_STRATEGY, BATCH_SIZE
+
+# rows per chunk in streaming mode ; peak memory is bounded by a few chunks
+CHUNK_SIZE = int(os.getenv("PREPROCESS_CHUNK_SIZE", 5000))
+# upper uniqueID bound used when a run is not limited to a partition
+MAX_UNIQUE_ID = 2 ** 63 - 1
+
+# micro-batch mode: poll raw_data every POLL_INTERVAL seconds and process at
+# most the current batch size; the batch size adapts between MIN and MAX so a
+# write takes about TARGET_WRITE_SECONDS
+POLL_INTERVAL = float(os.getenv("MICRO_BATCH_POLL_INTERVAL", 10))
+MICRO_BATCH_SIZE = int(os.getenv("MICRO_BATCH_SIZE", 500))
+MIN_MICRO_BATCH_SIZE = int(os.getenv("MICRO_BATCH_MIN_SIZE", 50))
+MAX_MICRO_BATCH_SIZE = int(os.getenv("MICRO_BATCH_MAX_SIZE", 5000))
+TARGET_WRITE_SECONDS = float(os.getenv("MICRO_BATCH_TARGET_WRITE_SECONDS", 2))
+# derived tables are refreshed at most this often while micro-batching
+DOWNSTREAM_REFRESH_INTERVAL = float(os.getenv("MICRO_BATCH_REFRESH_INTERVAL", 900))
+METRICS_PATH = os.getenv(
+    "MICRO_BATCH_METRICS_PATH",
+    os.path.join(os.path.dirname(__file__), '..', 'cache', 'micro_batch_metrics.json')
+)
+
+benefit_keywords = [
+    "effective", "works", "relief", "better", "improved",
+    "help", "helps", "good", "great", "excellent",
+    "amazing", "life changing", "wonderful", "pain relief"
+]
+
+side_effect_keywords = [
+    "side effect", "nausea", "headache", "dizziness",
+    "fatigue", "weight gain", "insomnia",
+    "pain", "vomiting", "drowsiness"
+]
+
+PROCESSED_COLUMNS = [
+    "uniqueID",
+    "drugName",
+    "conditions",
+    "review",
+    "rating",
+    "review_date",
+    "usefulCount",
+    "benefit_mentions",
+    "side_effect_mentions",
+    "property_mask",
+]
+
+
+_normalizer = None
+
+
+def get_normalizer():
+    """Stopword set and lemmatizer are built once per process, not once per review."""
+    global _normalizer
+    if _normalizer is None:
+        _normalizer = TextNormalizer(lemmatize=get_cache().lemmatize)
+    return _normalizer
+
+
+def tokenize_and_remove_stopwords(text):
+    return get_normalizer().tokenize_and_remove_stopwords(text)
+
+
+_keyword_matcher = None
+
+
+def get_keyword_matcher():
+    """Keyword families compiled once; phrases go through the same normalization
+    as the reviews so e.g. "works" matches the lemmatized "work"."""
+    global _keyword_matcher
+    if _keyword_matcher is None:
+        _keyword_matcher = KeywordMatcher(
+            {
+                "benefit_mentions": benefit_keywords,
+                "side_effect_mentions": side_effect_keywords,
+            },
+            normalize=lambda phrase: tokenize_and_remove_stopwords(clean_text(phrase)).split(),
+        )
+    return _keyword_matcher
+
+
+# ---------------------------------------------------------------------------
+# Pipeline stages : each one takes a chunk (DataFrame) and returns it
+# ---------------------------------------------------------------------------
+
+def clean_stage(chunk):
+    chunk["review"] = chunk["review"].apply(clean_text)
+    return chunk
+
+
+def tokenize_stage(chunk):
+    normalizer = get_normalizer()
+    chunk["tokens"] = chunk["review"].apply(
+        lambda text: normalizer.remove_stopwords(normalizer.tokenize(text))
     )
-    logging.info("Connected to AWS RDS successfully")
+    return chunk
+
+
+def lemmatize_stage(chunk):
+    chunk["review"] = chunk["tokens"].apply(get_normalizer().lemmatize_tokens)
+    return chunk.drop(columns=["tokens"])
+
+
+def keyword_stage(chunk):
+    matcher = get_keyword_matcher()
+    counts = matcher.count(chunk["review"])
+    for column in matcher.columns:
+        chunk[column] = counts[column].to_numpy()
+    chunk["review_date"] = parse_review_dates(chunk["date"])
+    return chunk
+
+
+def parse_review_dates(dates):
+    return pd.to_datetime(dates, format="%d-%b-%y", errors="coerce")
+
+
+# property -> bit, read from the property_lexicon table at the start of a run
+_property_bits = None
+
+
+def properties_stage(chunk):
+    """medical_properties evaluated once per review at ingest, stored as a bitmask."""
+    bits = _property_bits or default_bits()
+    chunk["property_mask"] = compute_masks(chunk["review"], bits)
+    return chunk[PROCESSED_COLUMNS]
+
+
+PIPELINE_STAGES = [
+    ("clean", clean_stage),
+    ("tokenize", tokenize_stage),
+    ("lemmatize", lemmatize_stage),
+    ("keywords", keyword_stage),
+    ("properties", properties_stage),
+]
+
+# workers=None means PREPROCESS_WORKERS (defaults to the number of cores)
+DEFAULT_WORKERS = None
+
+
+def build_stages(workers=DEFAULT_WORKERS):
+    """Serial stages for workers=1, otherwise clean/tokenize/lemmatize run as one
+    "normalize" stage fanned out over a process pool."""
+    from parallel_preprocessing import WORKERS, normalize_reviews
+
+    workers = WORKERS if workers is None else workers
+    if workers <= 1:
+        return PIPELINE_STAGES
 
-    nltk.download("punkt")
-    nltk.download("stopwords")
-    nltk.download("wordnet")
-    logging.info("punkt , stopwords , wordnet  downloaded")
-    query = """
+    def normalize_stage(chunk):
+        chunk["review"] = normalize_reviews(chunk["review"].tolist(), workers=workers)
+        return chunk
+
+    return [
+        ("normalize", normalize_stage),
+        ("keywords", keyword_stage),
+        ("properties", properties_stage),
+    ]
+
+
+class StageStats:
+    """Accumulates rows and wall time per pipeline stage (thread safe)."""
+
+    def __init__(self):
+        self.stages = {}
+        self._lock = threading.Lock()
+
+    def record(self, stage, rows, seconds):
+        with self._lock:
+            entry = self.stages.setdefault(stage, {"rows": 0, "seconds": 0.0})
+            entry["rows"] += rows
+            entry["seconds"] += seconds
+
+    def report(self):
+        report = {}
+        for stage, entry in self.stages.items():
+            rate = entry["rows"] / entry["seconds"] if entry["seconds"] else 0.0
+            report[stage] = {
+                "rows": entry["rows"],
+                "seconds": round(entry["seconds"], 3),
+                "rows_per_sec": round(rate, 1),
+            }
+            logging.info(
+                f"stage {stage}: {entry['rows']} rows in {entry['seconds']:.2f}s "
+                f"({rate:.1f} rows/sec)"
+            )
+        return report
+
+
+RAW_DELTA_QUERY = """
     SELECT
         uniqueID,
         drugName,
@@ -37,92 +230,596 @@ def run_preprocessing():
         date,
         usefulCount
     FROM raw_data
-    WHERE uniqueID NOT IN (
-        SELECT uniqueID FROM processed_data
-    ) ;
+    WHERE uniqueID > :after_id
+      AND uniqueID <= :until_id
+    ORDER BY uniqueID
+"""
+
+
+def read_raw_chunks(engine, chunk_size=CHUNK_SIZE, after_id=NO_WATERMARK,
+                    until_id=MAX_UNIQUE_ID):
+    """Yield raw_data rows in (after_id, until_id] in uniqueID order using keyset pagination."""
+    query = text(RAW_DELTA_QUERY + " LIMIT :chunk_size")
+
+    while True:
+        chunk = pd.read_sql(
+            query, engine,
+            params={"after_id": after_id, "until_id": until_id, "chunk_size": chunk_size}
+        )
+        if chunk.empty:
+            return
+        after_id = int(chunk["uniqueID"].iloc[-1])
+        yield chunk
+        if len(chunk) < chunk_size:
+            return
+
+
+def process_chunk(chunk, stages, stats=None, dedup=None):
+    """Run a raw chunk through the stages, recording each stage's throughput.
+
+    With a deduplicator only the reviews whose cleaned text was not processed
+    before go through the stages; the others reuse the stored output.
     """
+    if dedup is not None:
+        rows, duplicates = dedup.split(chunk)
+    else:
+        rows = chunk
+    processed = rows
+    if not processed.empty:
+        for name, stage in stages:
+            start = time.perf_counter()
+            processed = stage(processed)
+            if stats is not None:
+                stats.record(name, len(processed), time.perf_counter() - start)
+    else:
+        processed = processed.reindex(columns=PROCESSED_COLUMNS)
 
-    data = pd.read_sql(query, engine)
-    logging.info("sql data reading completed from raw_data table")
+    if dedup is None:
+        return processed
+    duplicates = duplicates.assign(review_date=parse_review_dates(duplicates["date"]))
+    return dedup.merge(processed, rows, duplicates)
 
-    def clean_text(text):
-        if not isinstance(text, str):
-            return ""
-        text = text.lower()
-        text = re.sub(r'&#?\w+;|http\S+|[^a-zA-Z\s]', '', text)
-        text = ' '.join(text.split())
-        logging.info("'&#?\w+;|http\S+|[^a-zA-Z\s]' removed from review ")
-        return text
-
-    def tokenize_and_remove_stopwords(text):
-        if not text:
-            return ""
-        tokens = word_tokenize(text)
-        stop_words = set(stopwords.words("english"))
-        tokens = [t for t in tokens if t not in stop_words and len(t) > 2]
-
-        lemmatizer = WordNetLemmatizer()
-        tokens = [lemmatizer.lemmatize(t) for t in tokens]
-        logging.info('tokenization and removing of stopwords done ')
-        return " ".join(tokens)
-
-    data["review"] = data["review"].apply(clean_text)
-    data["review"] = data["review"].apply(tokenize_and_remove_stopwords)
-
-    benefit_keywords = [
-        "effective", "works", "relief", "better", "improved",
-        "help", "helps", "good", "great", "excellent",
-        "amazing", "life changing", "wonderful"
-    ]
 
-    side_effect_keywords = [
-        "side effect", "nausea", "headache", "dizziness",
-        "fatigue", "weight gain", "insomnia",
-        "pain", "vomiting", "drowsiness"
-    ]
+def report_dedup(dedup, stats):
+    """Dedup ratio of a run and the stage time it saved."""
+    if dedup is None:
+        return None
+    processing = sum(
+        entry["seconds"] for stage, entry in stats.stages.items() if stage not in ("read", "write")
+    )
+    return dedup.report(processing)
+
+
+def timed_reader(chunks, stats):
+    chunks = iter(chunks)
+    while True:
+        start = time.perf_counter()
+        chunk = next(chunks, None)
+        if chunk is None:
+            return
+        stats.record("read", len(chunk), time.perf_counter() - start)
+        yield chunk
+
+
+def write_chunk(engine, chunk, writer, track_watermark=True, run_id=None, chunk_start=None):
+    """Write a processed chunk, journal it and advance the watermark in one transaction.
+
+    Partition runs pass track_watermark=False: partitions finish out of order,
+    so the watermark is only moved once all of them are done. With a run_id
+    the chunk (chunk_start, max uniqueID] is recorded in the run journal, so a
+    retry of the run skips it.
+    """
+    with engine.begin() as conn:
+        writer.write(conn, chunk)
+        if run_id is not None:
+            record_chunk(conn, run_id, chunk_start, chunk["uniqueID"].max(), len(chunk))
+        if track_watermark:
+            advance_watermark(conn, chunk["uniqueID"].max(), len(chunk))
+
+
+class ChunkWriter(threading.Thread):
+    """Background writer so chunk N is stored while chunk N+1 is read and processed.
+
+    The queue is bounded, so the pipeline never holds more than `max_pending`
+    finished chunks waiting for the database.
+    """
+
+    def __init__(self, engine, writer, stats, max_pending=1, track_watermark=True,
+                 run_id=None, after_id=NO_WATERMARK):
+        super().__init__(daemon=True)
+        self.engine = engine
+        self.writer = writer
+        self.stats = stats
+        self.track_watermark = track_watermark
+        self.run_id = run_id
+        # chunks arrive in uniqueID order, each one starts where the previous ended
+        self.position = after_id
+        self.queue = queue.Queue(maxsize=max_pending)
+        self.rows_written = 0
+        self.error = None
+
+    def run(self):
+        while True:
+            chunk = self.queue.get()
+            if chunk is None:
+                return
+            if self.error is not None:
+                continue
+            try:
+                start = time.perf_counter()
+                write_chunk(self.engine, chunk, self.writer, self.track_watermark,
+                            self.run_id, self.position)
+                self.position = int(chunk["uniqueID"].max())
+                self.stats.record("write", len(chunk), time.perf_counter() - start)
+                self.rows_written += len(chunk)
+            except Exception as e:
+                self.error = e
+
+    def put(self, chunk):
+        if self.error is not None:
+            raise self.error
+        self.queue.put(chunk)
+
+    def close(self):
+        self.queue.put(None)
+        self.join()
+        if self.error is not None:
+            raise self.error
+
+
+def new_deduplicator(engine):
+    return ReviewDeduplicator(engine) if DEDUP_ENABLED else None
+
 
-    data["benefit_mentions"] = data["review"].apply(
-        lambda x: sum(1 for w in benefit_keywords if w in x)
+def run_streaming(engine, writer, chunk_size=CHUNK_SIZE, after_id=NO_WATERMARK,
+                  workers=DEFAULT_WORKERS, until_id=MAX_UNIQUE_ID, track_watermark=True,
+                  run_id=None, dedup=None):
+    """Stream raw_data through the pipeline stages chunk by chunk.
+
+    Returns the number of rows written and the per stage throughput report.
+    """
+    stats = StageStats()
+    dedup = dedup or new_deduplicator(engine)
+    stages = build_stages(workers)
+    chunks = timed_reader(read_raw_chunks(engine, chunk_size, after_id, until_id), stats)
+    chunks = (process_chunk(chunk, stages, stats, dedup) for chunk in chunks)
+
+    chunk_writer = ChunkWriter(engine, writer, stats, track_watermark=track_watermark,
+                               run_id=run_id, after_id=after_id)
+    chunk_writer.start()
+    try:
+        for chunk in chunks:
+            chunk_writer.put(chunk)
+            logging.info(f"chunk up to uniqueID {chunk['uniqueID'].iloc[-1]} queued for writing")
+    finally:
+        chunk_writer.close()
+
+    report = stats.report()
+    report["dedup"] = report_dedup(dedup, stats)
+    return chunk_writer.rows_written, report
+
+
+def run_batch(engine, writer, after_id=NO_WATERMARK, workers=DEFAULT_WORKERS, run_id=None,
+              chunk_size=CHUNK_SIZE, dedup=None):
+    """Process every raw_data row above the watermark as a single frame.
+
+    The frame is written in chunk_size slices, each committed with its journal
+    entry and watermark, so a failure while writing only loses the slices not
+    stored yet.
+    """
+    data = pd.read_sql(
+        text(RAW_DELTA_QUERY), engine,
+        params={"after_id": after_id, "until_id": MAX_UNIQUE_ID}
     )
+    logging.info("sql data reading completed from raw_data table")
 
-    data["side_effect_mentions"] = data["review"].apply(
-        lambda x: sum(1 for w in side_effect_keywords if w in x)
+    stats = StageStats()
+    dedup = dedup or new_deduplicator(engine)
+    data = process_chunk(data, build_stages(workers), stats, dedup)
+    logging.info("review cleaned, tokenized, lemmatized and keyword columns created")
+    processed_df = data
+
+    if processed_df.empty:
+        return 0
+
+    start = time.perf_counter()
+    position = after_id
+    for i in range(0, len(processed_df), chunk_size):
+        chunk = processed_df.iloc[i:i + chunk_size]
+        write_chunk(engine, chunk, writer, run_id=run_id, chunk_start=position)
+        position = int(chunk["uniqueID"].max())
+    stats.record("write", len(processed_df), time.perf_counter() - start)
+    logging.info('data stored in table processed_data')
+    stats.report()
+    report_dedup(dedup, stats)
+    return len(processed_df)
+
+
+def get_engine(write_strategy=None):
+    """Engine for the configured DB_BACKEND (see db.py)."""
+    return db.get_engine(
+        connect_args={"local_infile": True} if write_strategy == "load_data" else None
     )
-    logging.info("two new column 'benifit_mensions & side_effect_mensions' created ")
-    data["review_date"] = pd.to_datetime(
-        data["date"], format="%d-%b-%y", errors="coerce"
+
+
+def prepare_schema(engine):
+    """Schema migrations and property bit assignment; returns the bits.
+
+    Run once per run while holding the pipeline lock, concurrent callers
+    would race on the same ALTER TABLE / lexicon rows.
+    """
+    ensure_unique_key(engine)
+    ensure_dedup_schema(engine)
+    return property_bits(engine)
+
+
+def prepare_run(engine, write_strategy=DEFAULT_STRATEGY, write_batch_size=BATCH_SIZE,
+                migrate=True):
+    """Schema, lexicon bits and NLTK resources needed before processing rows.
+
+    migrate=False only loads the bits: partition tasks run in parallel and
+    rely on the DAG's count_pending_task having called prepare_schema.
+    """
+    global _property_bits
+    _property_bits = prepare_schema(engine) if migrate else load_property_bits(engine)
+    ensure_resources()
+    return ProcessedWriter(write_strategy, write_batch_size)
+
+
+def refresh_downstream(engine, rows=0):
+    """Everything derived from processed_data that has to follow a finished run.
+
+    rows is the number of processed_data rows committed since the previous
+    refresh; without new rows, merged duplicates or updated masks the snapshot
+    and the cached app results are left alone.
+    """
+    # parallel partitions may have picked different copies of a text as canonical
+    merged = merge_canonicals(engine)
+    # recompute only the mask bits whose keywords changed since they were stored
+    updated = refresh_property_bits(engine)
+    changed = rows > 0 or merged > 0 or updated > 0
+    # drug x condition x property counts; recounted when stored masks changed
+    refresh_leaderboard(engine, rebuild=updated > 0)
+    # drug x month x rating bucket x property counts behind the trend charts
+    refresh_trends(engine, rebuild=updated > 0)
+    # memory-mapped copy the Streamlit apps read instead of querying processed_data
+    publish_snapshot(engine, watermark=get_watermark(engine), force=changed)
+    # search index over the processed tokens, new rows become a new segment
+    update_index(engine)
+    # cached per drug results of the apps are keyed on the data version already,
+    # this also drops them from the memory of running app processes
+    if changed:
+        invalidate_results()
+
+
+def count_pending(engine):
+    """Size and uniqueID range of the raw_data rows above the watermark."""
+    watermark = get_watermark(engine)
+    with engine.connect() as conn:
+        row = conn.execute(
+            text("SELECT COUNT(*), MAX(uniqueID) FROM raw_data WHERE uniqueID > :watermark"),
+            {"watermark": watermark},
+        ).first()
+    return {
+        "watermark": watermark,
+        "pending": int(row[0]),
+        "max_id": int(row[1]) if row[1] is not None else watermark,
+    }
+
+
+def plan_partitions(engine, after_id, until_id, partition_size):
+    """Split (after_id, until_id] into uniqueID ranges of about partition_size rows."""
+    boundary = text("""
+        SELECT uniqueID FROM raw_data
+        WHERE uniqueID > :after_id AND uniqueID <= :until_id
+        ORDER BY uniqueID
+        LIMIT 1 OFFSET :offset
+    """)
+    partitions = []
+    start = after_id
+    with engine.connect() as conn:
+        while start < until_id:
+            end = conn.execute(
+                boundary, {"after_id": start, "until_id": until_id, "offset": partition_size - 1}
+            ).scalar()
+            end = until_id if end is None else int(end)
+            partitions.append({"start": start, "end": end})
+            start = end
+    return partitions
+
+
+def run_partition(start, end, chunk_size=CHUNK_SIZE, workers=DEFAULT_WORKERS,
+                  write_strategy=DEFAULT_STRATEGY, write_batch_size=BATCH_SIZE, run_id=None):
+    """Process raw_data rows with start < uniqueID <= end without touching the watermark.
+
+    With a run_id the chunks already journaled by an earlier attempt of the
+    same run are skipped.
+    """
+    engine = get_engine(write_strategy)
+    if run_id is not None:
+        resume_from = resume_point(engine, run_id, start, end)
+        if resume_from >= end:
+            logging.info(f"partition ({start}, {end}] already committed by run {run_id}")
+            return 0
+        if resume_from > start:
+            logging.info(f"partition ({start}, {end}] resumed after uniqueID {resume_from}")
+        start = resume_from
+    writer = prepare_run(engine, write_strategy, write_batch_size, migrate=False)
+    logging.info(f"partition ({start}, {end}] started")
+    rows, _ = run_streaming(
+        engine, writer, chunk_size, after_id=start, workers=workers,
+        until_id=end, track_watermark=False, run_id=run_id
     )
+    report_stats()
+    writer.report()
+    return rows
 
-    processed_df = data[
-        [
-            "uniqueID",
-            "drugName",
-            "conditions",
-            "review",
-            "rating",
-            "review_date",
-            "usefulCount",
-            "benefit_mentions",
-            "side_effect_mentions",
-        ]
-    ]
 
-    if processed_df.empty:
+def finalize_partitions(engine, run_id, watermark):
+    """Commit the watermark once every partition up to `watermark` is stored.
+
+    Returns the rows stored by the run over all of its attempts.
+    """
+    rows = run_rows(engine, run_id)
+    with engine.begin() as conn:
+        advance_watermark(conn, watermark, rows)
+    finish_run(engine)
+    close_run(engine, run_id)
+    refresh_downstream(engine, rows)
+    return rows
+
+
+def close_empty_run(engine, run_id):
+    """Close a run that found nothing above the watermark; nothing downstream changed."""
+    finish_run(engine)
+    close_run(engine, run_id)
+
+
+def run_preprocessing(mode=INCREMENTAL, streaming=False, chunk_size=CHUNK_SIZE,
+                      workers=DEFAULT_WORKERS, write_strategy=DEFAULT_STRATEGY,
+                      write_batch_size=BATCH_SIZE, run_id=None):
+    """raw_data -> preprocessing -> processed_data
+
+    mode="incremental" only reads raw_data rows above the stored watermark,
+    mode="full" empties processed_data and rebuilds it from scratch (backfills).
+    workers=1 runs the text normalization serially in this process.
+    write_strategy is one of bulk_writer.STRATEGIES, all idempotent on uniqueID.
+
+    Every committed chunk is journaled. If the previous run of the same mode
+    failed (or run_id names an in-flight run) it is resumed: a full rebuild
+    does not empty processed_data again and only chunks above the last
+    committed one are processed.
+    """
+    engine = get_engine(write_strategy)
+
+    # micro-batches (and the partitioned DAG's start/finalize) take the same lock
+    with pipeline_lock(engine) as acquired:
+        if not acquired:
+            raise RuntimeError("another preprocessing run holds the pipeline lock")
+        writer = prepare_run(engine, write_strategy, write_batch_size)
+        return _run_locked(engine, writer, mode, streaming, chunk_size, workers, run_id)
+
+
+def _run_locked(engine, writer, mode, streaming, chunk_size, workers, run_id):
+    run_id, resumed = open_run(engine, mode, run_id)
+    watermark = start_run(engine, mode, resume=resumed)
+    logging.info(f"{mode} run {run_id} started from watermark uniqueID > {watermark}")
+    dedup = new_deduplicator(engine)
+    try:
+        if streaming:
+            logging.info(f"streaming preprocessing started with chunk size {chunk_size}")
+            rows, _ = run_streaming(engine, writer, chunk_size, after_id=watermark,
+                                    workers=workers, run_id=run_id, dedup=dedup)
+        else:
+            rows = run_batch(engine, writer, after_id=watermark, workers=workers,
+                             run_id=run_id, chunk_size=chunk_size, dedup=dedup)
+    except Exception:
+        finish_run(engine, status="failed")
+        close_run(engine, run_id, FAILED)
+        raise
+    report_stats()
+    writer.report()
+    finish_run(engine)
+    close_run(engine, run_id)
+    refresh_downstream(engine, rows)
+
+    if rows == 0:
         print("No new data to process")
         return "No new records"
 
-    processed_df.to_sql(
-        name="processed_data",
-        con=engine,
-        if_exists="append",
-        index=False,
-        chunksize=1000
-    )
-    logging.info('data stored in table processed_data')
+    print(f"Processed {rows} records")
+    if dedup is not None and dedup.duplicates:
+        print(f"{dedup.duplicates} duplicate reviews ({dedup.duplicates / dedup.rows:.1%}) "
+              f"reused already processed text")
+    return f"Processed {rows} records"
+
+
+class MicroBatchStats:
+    """Throughput, backlog and ingest -> availability lag of the micro-batch loop.
+
+    raw_data has no arrival timestamp, so lag is measured from the first poll
+    that saw a row to the commit that made it available in processed_data.
+    """
+
+    def __init__(self, path=METRICS_PATH):
+        self.path = path
+        self.batches = 0
+        self.rows = 0
+        self.seconds = 0.0
+        self.pending_rows = 0
+        self.batch_size = 0
+        self.write_seconds = 0.0
+        self.lag_seconds = 0.0
+        self.max_lag_seconds = 0.0
+        self.paused_polls = 0
+        # (max uniqueID seen, monotonic time it was first seen), oldest first
+        self.seen = deque()
+
+    def observe(self, pending):
+        self.pending_rows = pending["pending"]
+        if pending["pending"] and (not self.seen or pending["max_id"] > self.seen[-1][0]):
+            self.seen.append((pending["max_id"], time.monotonic()))
+
+    def committed(self, watermark, rows, seconds, write_seconds, batch_size):
+        now = time.monotonic()
+        if self.seen:
+            self.lag_seconds = now - self.seen[0][1]
+            self.max_lag_seconds = max(self.max_lag_seconds, self.lag_seconds)
+        while self.seen and self.seen[0][0] <= watermark:
+            self.seen.popleft()
+        self.batches += 1
+        self.rows += rows
+        self.seconds += seconds
+        self.write_seconds = write_seconds
+        self.batch_size = batch_size
+        self.pending_rows = max(0, self.pending_rows - rows)
+        logging.info(
+            f"micro-batch {self.batches}: {rows} rows up to uniqueID {watermark} in "
+            f"{seconds:.2f}s (write {write_seconds:.2f}s), lag {self.lag_seconds:.1f}s, "
+            f"{self.pending_rows} rows pending"
+        )
+        self.save()
+
+    def report(self):
+        rate = self.rows / self.seconds if self.seconds else 0.0
+        return {
+            "batches": self.batches,
+            "rows": self.rows,
+            "rows_per_sec": round(rate, 1),
+            "pending_rows": self.pending_rows,
+            "batch_size": self.batch_size,
+            "last_write_seconds": round(self.write_seconds, 3),
+            "lag_seconds": round(self.lag_seconds, 3),
+            "max_lag_seconds": round(self.max_lag_seconds, 3),
+            "paused_polls": self.paused_polls,
+            "updated": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        }
+
+    def save(self):
+        """Atomically replace the metrics file so readers never see half a snapshot."""
+        if not self.path:
+            return
+        try:
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            tmp = f"{self.path}.tmp"
+            with open(tmp, "w") as f:
+                json.dump(self.report(), f, indent=2)
+            os.replace(tmp, self.path)
+        except OSError as e:
+            logging.info(f"could not write micro-batch metrics to {self.path}: {e}")
+
+
+def adapt_batch_size(batch_size, write_seconds, target=TARGET_WRITE_SECONDS,
+                     min_size=MIN_MICRO_BATCH_SIZE, max_size=MAX_MICRO_BATCH_SIZE):
+    """Backpressure: halve the batch when writes are slow, grow it when they are fast."""
+    if write_seconds > target:
+        return max(min_size, batch_size // 2)
+    if write_seconds < target / 2:
+        return min(max_size, batch_size * 2)
+    return batch_size
 
-    print(f"Processed {len(processed_df)} records")
-    return f"Processed {len(processed_df)} records"
+
+def run_micro_batches(poll_interval=POLL_INTERVAL, batch_size=MICRO_BATCH_SIZE, workers=1,
+                      write_strategy=DEFAULT_STRATEGY, write_batch_size=BATCH_SIZE,
+                      max_batches=None, stats=None):
+    """Long running near-real-time mode: poll raw_data and process small batches.
+
+    Each batch goes through the same stages as the weekly run and is committed
+    with the watermark, so the weekly DAG and this loop share one consistent
+    watermark. While a weekly/backfill run is active (pipeline lock held or a
+    journal run in flight) the loop pauses instead of racing it. When the
+    database is slow the batch size shrinks and the loop waits before the
+    next poll; while there is a backlog it polls again immediately.
+    """
+    engine = get_engine(write_strategy)
+    with pipeline_lock(engine) as acquired:
+        if not acquired:
+            raise RuntimeError("another preprocessing run holds the pipeline lock")
+        writer = prepare_run(engine, write_strategy, write_batch_size)
+    stats = stats or MicroBatchStats()
+    stages = build_stages(workers)
+    # kept for the whole loop, so a text seen in an earlier batch is not processed again
+    dedup = new_deduplicator(engine)
+    last_refresh = time.monotonic()
+    # rows committed since the last downstream refresh, an idle loop skips it
+    unrefreshed_rows = 0
+    logging.info(f"micro-batch mode started: poll every {poll_interval}s, batch size {batch_size}")
+
+    try:
+        while max_batches is None or stats.batches < max_batches:
+            wait = poll_interval
+            with pipeline_lock(engine, timeout=0) as acquired:
+                if not acquired or active_runs(engine):
+                    stats.paused_polls += 1
+                    logging.info("batch preprocessing run in progress, micro-batch paused")
+                    chunk = None
+                else:
+                    pending = count_pending(engine)
+                    stats.observe(pending)
+                    chunk = None
+                    if pending["pending"]:
+                        chunk = next(read_raw_chunks(engine, batch_size, pending["watermark"]), None)
+
+                if chunk is not None:
+                    start = time.perf_counter()
+                    chunk = process_chunk(chunk, stages, dedup=dedup)
+                    write_start = time.perf_counter()
+                    write_chunk(engine, chunk, writer)
+                    write_seconds = time.perf_counter() - write_start
+                    stats.committed(int(chunk["uniqueID"].max()), len(chunk),
+                                    time.perf_counter() - start, write_seconds, batch_size)
+                    unrefreshed_rows += len(chunk)
+
+                    batch_size = adapt_batch_size(batch_size, write_seconds)
+                    if write_seconds > TARGET_WRITE_SECONDS:
+                        # give the database the time the slow write took before polling again
+                        wait = write_seconds
+                    elif stats.pending_rows:
+                        wait = 0
+
+                due = time.monotonic() - last_refresh > DOWNSTREAM_REFRESH_INTERVAL
+                if unrefreshed_rows and due:
+                    refresh_downstream(engine, unrefreshed_rows)
+                    unrefreshed_rows = 0
+                    last_refresh = time.monotonic()
+
+            if wait and (max_batches is None or stats.batches < max_batches):
+                time.sleep(wait)
+    except KeyboardInterrupt:
+        logging.info("micro-batch mode stopped")
+    finally:
+        report_stats()
+        writer.report()
+        stats.save()
+    return stats.report()
 
 
 if __name__ == "__main__":
-    run_preprocessing()
+    parser = argparse.ArgumentParser(description="raw_data -> processed_data preprocessing")
+    parser.add_argument("--mode", choices=RUN_MODES, default=INCREMENTAL,
+                        help="incremental (above the watermark) or full rebuild")
+    parser.add_argument("--streaming", action="store_true",
+                        help="process raw_data in bounded chunks instead of one frame")
+    parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE)
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS,
+                        help="normalization processes (1 = serial, default PREPROCESS_WORKERS)")
+    parser.add_argument("--write-strategy", choices=STRATEGIES, default=DEFAULT_STRATEGY)
+    parser.add_argument("--write-batch-size", type=int, default=BATCH_SIZE)
+    parser.add_argument("--run-id", help="resume this in-flight run (see src/run_journal.py status)")
+    parser.add_argument("--micro-batch", action="store_true",
+                        help="keep running and process new raw_data rows every --poll-interval")
+    parser.add_argument("--poll-interval", type=float, default=POLL_INTERVAL)
+    parser.add_argument("--batch-size", type=int, default=MICRO_BATCH_SIZE,
+                        help="initial micro-batch size, adapted to the write latency")
+    args = parser.parse_args()
+
+    if args.micro_batch:
+        run_micro_batches(poll_interval=args.poll_interval, batch_size=args.batch_size,
+                          workers=args.workers or 1, write_strategy=args.write_strategy,
+                          write_batch_size=args.write_batch_size)
+        sys.exit(0)
+    run_preprocessing(mode=args.mode, streaming=args.streaming,
+                      chunk_size=args.chunk_size, workers=args.workers,
+                      write_strategy=args.write_strategy,
+                      write_batch_size=args.write_batch_size,
+                      run_id=args.run_id)
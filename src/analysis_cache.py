@@ -0,0 +1,251 @@
+import os
+import sys
+import json
+import time
+import sqlite3
+import argparse
+import threading
+from collections import OrderedDict
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from logger import logging
+from ingestion_state import read_state
+
+# Results of the per drug analyses the Streamlit apps run on every rerun.
+# Entries are stored under a version made of the lexicon version and the data
+# version (preprocessing watermark), so a new lexicon or new processed rows
+# never serve an old result. The in-memory LRU is per app process, the sqlite
+# tier is shared by every app process on the host.
+CACHE_PATH = os.getenv(
+    "ANALYSIS_CACHE_PATH",
+    os.path.join(os.path.dirname(__file__), '..', 'cache', 'analysis_cache.sqlite')
+)
+MAX_ENTRIES = int(os.getenv("ANALYSIS_CACHE_SIZE", 256))
+TTL_SECONDS = float(os.getenv("ANALYSIS_CACHE_TTL", 3600))
+# how long a process trusts the data version / invalidation generation it read
+CHECK_SECONDS = float(os.getenv("ANALYSIS_CACHE_CHECK_SECONDS", 5))
+# namespace of get_drug_property_percentages results
+PROPERTY_ANALYSIS = "drug_property_analysis"
+
+_version = {"checked": 0.0, "value": None}
+_version_lock = threading.Lock()
+
+
+def data_version(engine):
+    """Version of processed_data: watermark, row count and last finished run.
+
+    The run's finish time changes on a full rebuild too, where the watermark
+    ends where it started. Re-read at most every CHECK_SECONDS. Read only:
+    before the first run there is no state row and the version is "none".
+    """
+    with _version_lock:
+        now = time.monotonic()
+        if _version["value"] is None or now - _version["checked"] >= CHECK_SECONDS:
+            state = read_state(engine)
+            _version["value"] = "none" if state is None else (
+                f"{state['high_water_mark']}:{state['total_rows']}:{state.get('last_run_finished')}"
+            )
+            _version["checked"] = now
+        return _version["value"]
+
+
+class ResultCache:
+    """Versioned result memoization: bounded in-memory LRU/TTL in front of a sqlite store.
+
+    Values must be JSON serializable. The sqlite tier is an optimisation only,
+    any error there disables it for the process.
+    """
+
+    def __init__(self, namespace, path=CACHE_PATH, max_entries=MAX_ENTRIES, ttl=TTL_SECONDS):
+        self.namespace = namespace
+        self.path = path or None
+        self.max_entries = max_entries
+        self.ttl = ttl
+        # (key, version) -> (stored at, value)
+        self.entries = OrderedDict()
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.generation = None
+        self.checked = 0.0
+        self.last_version = None
+        self._db = None
+        self._lock = threading.RLock()
+
+    def _connect(self):
+        if self._db is None:
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            self._db = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS results ("
+                "namespace TEXT NOT NULL, key TEXT NOT NULL, version TEXT NOT NULL, "
+                "value TEXT NOT NULL, stored REAL NOT NULL, "
+                "PRIMARY KEY (namespace, key, version))"
+            )
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS generations ("
+                "namespace TEXT PRIMARY KEY, generation INTEGER NOT NULL)"
+            )
+        return self._db
+
+    def _disk(self, operation):
+        """Run operation(db) on the sqlite tier, None when it is disabled or fails."""
+        if self.path is None:
+            return None
+        try:
+            db = self._connect()
+            with db:
+                return operation(db)
+        except (sqlite3.Error, OSError) as e:
+            # e.g. a read-only app container that cannot create the cache directory
+            logging.info(f"analysis cache disk tier disabled, {self.path}: {e}")
+            self._db = None
+            self.path = None
+            return None
+
+    def _sync(self):
+        """Drop the memory tier when another process invalidated the cache."""
+        now = time.monotonic()
+        if self.path is None or now - self.checked < CHECK_SECONDS:
+            return
+        self.checked = now
+        row = self._disk(lambda db: db.execute(
+            "SELECT generation FROM generations WHERE namespace = ?", (self.namespace,)
+        ).fetchone())
+        generation = row[0] if row else 0
+        if self.generation is not None and generation != self.generation:
+            self.entries.clear()
+        self.generation = generation
+
+    def _fresh(self, stored):
+        return time.time() - stored < self.ttl
+
+    def get(self, key, version):
+        """(True, value) for a live entry, (False, None) otherwise."""
+        entry_key = (json.dumps(key), version)
+        with self._lock:
+            self._sync()
+            entry = self.entries.get(entry_key)
+            if entry is not None and self._fresh(entry[0]):
+                self.memory_hits += 1
+                self.entries.move_to_end(entry_key)
+                return True, entry[1]
+            if entry is not None:
+                del self.entries[entry_key]
+
+            row = self._disk(lambda db: db.execute(
+                "SELECT value, stored FROM results WHERE namespace = ? AND key = ? AND version = ?",
+                (self.namespace, *entry_key),
+            ).fetchone())
+            if row is not None and self._fresh(row[1]):
+                self.disk_hits += 1
+                value = json.loads(row[0])
+                self._remember(entry_key, row[1], value)
+                return True, value
+            self.misses += 1
+            return False, None
+
+    def _remember(self, entry_key, stored, value):
+        self.entries[entry_key] = (stored, value)
+        self.entries.move_to_end(entry_key)
+        if len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+            self.evictions += 1
+
+    def put(self, key, version, value):
+        entry_key = (json.dumps(key), version)
+        stored = time.time()
+        with self._lock:
+            self._remember(entry_key, stored, value)
+            prune = version != self.last_version
+            self.last_version = version
+
+            def write(db):
+                if prune:
+                    # results of older data / lexicon versions can never be served again
+                    db.execute(
+                        "DELETE FROM results WHERE namespace = ? AND (version != ? OR stored < ?)",
+                        (self.namespace, version, stored - self.ttl),
+                    )
+                db.execute(
+                    "INSERT OR REPLACE INTO results (namespace, key, version, value, stored) "
+                    "VALUES (?, ?, ?, ?, ?)",
+                    (self.namespace, *entry_key, json.dumps(value), stored),
+                )
+            self._disk(write)
+
+    def get_or_compute(self, key, version, compute):
+        found, value = self.get(key, version)
+        if found:
+            return value
+        value = compute()
+        self.put(key, version, value)
+        stats = self.stats()
+        logging.info(f"{self.namespace} cache miss for {key} "
+                     f"({stats['hit_rate']:.1%} hit rate over {stats['lookups']} lookups)")
+        return value
+
+    def invalidate(self):
+        """Drop every entry, in this process and (through the sqlite tier) in the others."""
+        with self._lock:
+            self.entries.clear()
+
+            def clear(db):
+                db.execute("DELETE FROM results WHERE namespace = ?", (self.namespace,))
+                db.execute(
+                    "INSERT OR IGNORE INTO generations (namespace, generation) VALUES (?, 0)",
+                    (self.namespace,),
+                )
+                db.execute(
+                    "UPDATE generations SET generation = generation + 1 WHERE namespace = ?",
+                    (self.namespace,),
+                )
+                return db.execute(
+                    "SELECT generation FROM generations WHERE namespace = ?", (self.namespace,)
+                ).fetchone()[0]
+            self.generation = self._disk(clear)
+
+    def disk_entries(self):
+        rows = self._disk(lambda db: db.execute(
+            "SELECT version, COUNT(*) FROM results WHERE namespace = ? GROUP BY version",
+            (self.namespace,),
+        ).fetchall())
+        return dict(rows or [])
+
+    def stats(self):
+        hits = self.memory_hits + self.disk_hits
+        lookups = hits + self.misses
+        return {
+            "lookups": lookups,
+            "memory_hits": self.memory_hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": round(hits / lookups, 4) if lookups else 0.0,
+            "entries": len(self.entries),
+        }
+
+
+def invalidate_results(namespaces=(PROPERTY_ANALYSIS,)):
+    """Called by the pipeline once processed_data changed."""
+    for namespace in namespaces:
+        ResultCache(namespace).invalidate()
+    logging.info(f"analysis results invalidated: {', '.join(namespaces)}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="cached per drug analysis results")
+    parser.add_argument("command", choices=["stats", "clear"])
+    parser.add_argument("--namespace", default=PROPERTY_ANALYSIS)
+    args = parser.parse_args()
+
+    cache = ResultCache(args.namespace)
+    if args.command == "clear":
+        cache.invalidate()
+        print(f"{args.namespace} results cleared")
+    else:
+        for version, count in cache.disk_entries().items():
+            print(f"{version}: {count} results")
@@ -0,0 +1,163 @@
+import os
+import sys
+import csv
+import time
+import tempfile
+
+import pandas as pd
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from sqlalchemy import text, table, column
+from logger import logging
+from exception import CustomException
+
+PROCESSED_TABLE = "processed_data"
+
+# Every strategy is idempotent on uniqueID (given the unique key created by
+# ensure_unique_key), so a retried or concurrent run never double inserts:
+#   multi_values : multi row INSERT IGNORE ... VALUES (...), (...)
+#   load_data    : LOAD DATA LOCAL INFILE ... REPLACE from a temporary csv (MySQL only)
+#   upsert       : INSERT ... ON DUPLICATE KEY UPDATE (ON CONFLICT DO UPDATE elsewhere)
+STRATEGIES = ("multi_values", "load_data", "upsert")
+DEFAULT_STRATEGY = os.getenv("PROCESSED_WRITE_STRATEGY", "upsert")
+BATCH_SIZE = int(os.getenv("PROCESSED_WRITE_BATCH_SIZE", 1000))
+
+
+def ensure_unique_key(engine, table_name=PROCESSED_TABLE):
+    """Make uniqueID unique in processed_data so re-writes become no-ops/updates."""
+    with engine.begin() as conn:
+        if engine.dialect.name == "mysql":
+            exists = conn.execute(text("""
+                SELECT COUNT(*) FROM information_schema.statistics
+                WHERE table_schema = DATABASE() AND table_name = :table_name
+                  AND column_name = 'uniqueID' AND non_unique = 0
+            """), {"table_name": table_name}).scalar()
+            if exists:
+                return
+            try:
+                conn.execute(text(
+                    f"ALTER TABLE {table_name} ADD UNIQUE KEY uq_{table_name}_uniqueID (uniqueID)"
+                ))
+            except Exception as e:
+                logging.info(f"could not add unique key on {table_name}.uniqueID, "
+                             f"remove duplicate uniqueIDs first")
+                raise CustomException(e, sys)
+        else:
+            conn.execute(text(
+                f"CREATE UNIQUE INDEX IF NOT EXISTS uq_{table_name}_uniqueID "
+                f"ON {table_name} (uniqueID)"
+            ))
+    logging.info(f"unique key on {table_name}.uniqueID in place")
+
+
+def _records(df):
+    """DataFrame -> list of dicts with NaN/NaT as None and numpy/pandas scalars as python."""
+    df = df.copy()
+    for name in df.columns:
+        if pd.api.types.is_datetime64_any_dtype(df[name]):
+            # list(): newer pandas returns a Series with a fresh index here
+            df[name] = pd.Series(list(df[name].dt.to_pydatetime()), index=df.index, dtype=object)
+    return df.astype(object).where(df.notna(), None).to_dict("records")
+
+
+class ProcessedWriter:
+    """Writes processed chunks to processed_data with a selectable bulk strategy."""
+
+    def __init__(self, strategy=DEFAULT_STRATEGY, batch_size=BATCH_SIZE, table_name=PROCESSED_TABLE):
+        if strategy not in STRATEGIES:
+            raise ValueError(f"strategy must be one of {STRATEGIES}, got {strategy!r}")
+        self.strategy = strategy
+        self.batch_size = batch_size
+        self.table_name = table_name
+        self.rows = 0
+        self.seconds = 0.0
+
+    def write(self, conn, df):
+        """Write `df` using `conn` (the caller owns the transaction)."""
+        if df.empty:
+            return 0
+        start = time.perf_counter()
+        strategy = self.strategy
+        if strategy == "load_data" and conn.dialect.name != "mysql":
+            strategy = "multi_values"
+
+        if strategy == "load_data":
+            self._load_data(conn, df)
+        else:
+            self._insert(conn, df, upsert=(strategy == "upsert"))
+
+        elapsed = time.perf_counter() - start
+        self.rows += len(df)
+        self.seconds += elapsed
+        logging.info(
+            f"{strategy}: {len(df)} rows written in {elapsed:.2f}s "
+            f"({len(df) / elapsed if elapsed else 0:.0f} rows/sec)"
+        )
+        return len(df)
+
+    def _statement(self, conn, columns, upsert):
+        target = table(self.table_name, *[column(c) for c in columns])
+        dialect = conn.dialect.name
+        if dialect == "mysql":
+            from sqlalchemy.dialects.mysql import insert
+            stmt = insert(target)
+            if upsert:
+                return stmt, lambda s: s.on_duplicate_key_update(
+                    {c: s.inserted[c] for c in columns if c != "uniqueID"}
+                )
+            return stmt.prefix_with("IGNORE"), None
+        if dialect in ("sqlite", "postgresql", "duckdb"):
+            if dialect == "sqlite":
+                from sqlalchemy.dialects.sqlite import insert
+            else:
+                from sqlalchemy.dialects.postgresql import insert
+            stmt = insert(target)
+            if upsert:
+                return stmt, lambda s: s.on_conflict_do_update(
+                    index_elements=["uniqueID"],
+                    set_={c: s.excluded[c] for c in columns if c != "uniqueID"},
+                )
+            return stmt, lambda s: s.on_conflict_do_nothing(index_elements=["uniqueID"])
+        raise ValueError(f"bulk writes are not supported for dialect {dialect!r}")
+
+    def _insert(self, conn, df, upsert):
+        columns = list(df.columns)
+        stmt, finish = self._statement(conn, columns, upsert)
+        records = _records(df)
+        for i in range(0, len(records), self.batch_size):
+            batch_stmt = stmt.values(records[i:i + self.batch_size])
+            if finish is not None:
+                batch_stmt = finish(batch_stmt)
+            conn.execute(batch_stmt)
+
+    def _load_data(self, conn, df):
+        """MySQL bulk load from a temporary csv; REPLACE keeps it idempotent.
+
+        Needs local_infile enabled on both the server and the client
+        connection (create the engine with connect_args={"local_infile": True}).
+        """
+        columns = ", ".join(df.columns)
+        with tempfile.NamedTemporaryFile("w", suffix=".csv", delete=False, newline="") as f:
+            path = f.name
+            df.to_csv(f, index=False, header=False, na_rep="NULL",
+                      quoting=csv.QUOTE_MINIMAL, lineterminator="\n")
+        try:
+            conn.execute(text(f"""
+                LOAD DATA LOCAL INFILE :path
+                REPLACE INTO TABLE {self.table_name}
+                FIELDS TERMINATED BY ',' OPTIONALLY ENCLOSED BY '"' ESCAPED BY ''
+                LINES TERMINATED BY '\\n'
+                ({columns})
+            """), {"path": path})
+        finally:
+            os.remove(path)
+
+    def report(self):
+        rate = self.rows / self.seconds if self.seconds else 0.0
+        logging.info(
+            f"processed_data writer ({self.strategy}): {self.rows} rows in "
+            f"{self.seconds:.2f}s ({rate:.0f} rows/sec)"
+        )
+        return {"strategy": self.strategy, "rows": self.rows,
+                "seconds": round(self.seconds, 3), "rows_per_sec": round(rate, 1)}
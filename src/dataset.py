@@ -0,0 +1,153 @@
+import os
+import sys
+import argparse
+import threading
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from sqlalchemy import text, bindparam
+from logger import logging
+from snapshot import SNAPSHOT_DIR, load_snapshot
+
+# The columns the apps' overview metrics, sidebar stats and charts use. The
+# review text is left out and fetched per row with fetch_reviews, only for the
+# rows a page actually shows (e.g. the data preview).
+DATASET_COLUMNS = ["uniqueID", "drugName", "conditions", "rating", "usefulCount"]
+
+# Compact dtypes: drugName/conditions repeat a few thousand values over 200K+
+# rows, ratings are 1..10 and the counts are small.
+DTYPES = {
+    "uniqueID": "int64",
+    "drugName": "category",
+    "conditions": "category",
+    "rating": "int8",
+    "usefulCount": "int32",
+    "benefit_mentions": "int16",
+    "side_effect_mentions": "int16",
+    "property_mask": "int64",
+}
+
+# (snapshot version, columns) -> lean frame, one entry per process
+_loaded = {}
+_lock = threading.Lock()
+
+
+def _compact(frame):
+    for name, dtype in DTYPES.items():
+        if name not in frame or frame[name].dtype == dtype:
+            continue
+        if dtype != "category" and frame[name].isna().any():
+            dtype = dtype.capitalize()  # nullable Int8/Int16/... keeps the NULLs
+        frame[name] = frame[name].astype(dtype)
+    return frame
+
+
+def _from_table(table, columns):
+    table = table.select(columns)
+    for i, name in enumerate(table.column_names):
+        # dictionary encoding turns into a pandas Categorical without creating
+        # a Python string per row
+        if DTYPES.get(name) == "category":
+            table = table.set_column(i, name, pc.dictionary_encode(table.column(name)))
+    return _compact(table.to_pandas())
+
+
+def load_dataset(columns=DATASET_COLUMNS, engine=None, snapshot_dir=SNAPSHOT_DIR):
+    """processed_data projected to `columns` with compact dtypes.
+
+    Built from the current snapshot and cached per snapshot version, or read
+    from the database when no snapshot was published yet.
+    """
+    columns = list(columns)
+    try:
+        table, version = load_snapshot(snapshot_dir)
+    except FileNotFoundError:
+        from db import get_engine
+
+        engine = engine or get_engine()
+        query = f"SELECT {', '.join(columns)} FROM processed_data"
+        return _compact(pd.read_sql(query, engine))
+
+    key = (version, tuple(columns))
+    with _lock:
+        frame = _loaded.get(key)
+        if frame is None:
+            frame = _from_table(table, columns)
+            for cached in [k for k in _loaded if k[0] != version]:
+                del _loaded[cached]
+            _loaded[key] = frame
+            logging.info(f"dataset {version} loaded: {len(frame)} rows, "
+                         f"{frame_bytes(frame) / 2**20:.1f} MB")
+    return frame
+
+
+def fetch_reviews(unique_ids, engine=None, snapshot_dir=SNAPSHOT_DIR):
+    """Review text of the given uniqueIDs as a Series indexed by uniqueID."""
+    unique_ids = [int(uid) for uid in unique_ids]
+    if not unique_ids:
+        return pd.Series(dtype=object, name="review")
+    try:
+        table, _ = load_snapshot(snapshot_dir)
+        rows = table.select(["uniqueID", "review"]).filter(
+            pc.is_in(table.column("uniqueID"), value_set=pa.array(unique_ids, pa.int64()))
+        )
+        reviews = rows.to_pandas()
+    except FileNotFoundError:
+        from db import get_engine
+
+        engine = engine or get_engine()
+        query = text(
+            "SELECT uniqueID, review FROM processed_data WHERE uniqueID IN :unique_ids"
+        ).bindparams(bindparam("unique_ids", expanding=True))
+        reviews = pd.read_sql(query, engine, params={"unique_ids": unique_ids})
+    return reviews.set_index("uniqueID")["review"].reindex(unique_ids)
+
+
+def with_reviews(frame, engine=None, snapshot_dir=SNAPSHOT_DIR):
+    """A copy of (a few rows of) a dataset frame with their review text added."""
+    frame = frame.copy()
+    reviews = fetch_reviews(frame["uniqueID"], engine, snapshot_dir)
+    frame["review"] = reviews.to_numpy()
+    return frame
+
+
+def frame_bytes(frame):
+    return int(frame.memory_usage(index=True, deep=True).sum())
+
+
+def memory_report(columns=DATASET_COLUMNS, engine=None, snapshot_dir=SNAPSHOT_DIR):
+    """Memory of the lean dataset against the full processed_data frame the apps used to hold."""
+    try:
+        table, _ = load_snapshot(snapshot_dir)
+        full = table.to_pandas()
+    except FileNotFoundError:
+        from db import get_engine
+
+        engine = engine or get_engine()
+        full = pd.read_sql("SELECT * FROM processed_data", engine)
+    full_bytes = frame_bytes(full)
+    del full
+    lean_bytes = frame_bytes(load_dataset(columns, engine, snapshot_dir))
+    return {
+        "columns": list(columns),
+        "full_mb": round(full_bytes / 2**20, 1),
+        "lean_mb": round(lean_bytes / 2**20, 1),
+        "saved_mb": round((full_bytes - lean_bytes) / 2**20, 1),
+        "saved_pct": round(100 * (1 - lean_bytes / full_bytes), 1) if full_bytes else 0.0,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="lean processed_data dataset for the apps")
+    parser.add_argument("command", choices=["report"])
+    parser.add_argument("--columns", nargs="+", default=DATASET_COLUMNS)
+    parser.add_argument("--snapshot-dir", default=SNAPSHOT_DIR)
+    args = parser.parse_args()
+
+    report = memory_report(args.columns, snapshot_dir=args.snapshot_dir)
+    print(f"full frame {report['full_mb']} MB, lean dataset {report['lean_mb']} MB "
+          f"({report['saved_mb']} MB / {report['saved_pct']}% saved)")
@@ -0,0 +1,201 @@
+import os
+import re
+import sys
+import argparse
+from functools import lru_cache
+
+import pandas as pd
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from sqlalchemy import create_engine, event, text
+from sqlalchemy.exc import DBAPIError
+from dotenv import load_dotenv
+from logger import logging
+from exception import CustomException
+
+# Storage backend used by the pipeline and the apps, chosen with DB_BACKEND:
+#   mysql  : the AWS RDS database (DB_HOST, DB_PORT, DB_USER, DB_PASSWORD, DB_NAME)
+#   sqlite : a local file (DB_PATH), fully offline
+#   duckdb : a local columnar file (DB_PATH), fast aggregate scans
+# Local files are filled from RDS with `python src/db.py mirror`.
+BACKENDS = ("mysql", "sqlite", "duckdb")
+DB_BACKEND = os.getenv("DB_BACKEND", "mysql")
+LOCAL_DB_DIR = os.path.join(os.path.dirname(__file__), '..', 'data')
+MIRROR_CHUNK_SIZE = int(os.getenv("DB_MIRROR_CHUNK_SIZE", 20000))
+
+# The same tables as on RDS, for local backends that start empty
+TABLES = {
+    "raw_data": """
+        CREATE TABLE IF NOT EXISTS raw_data (
+            uniqueID BIGINT NOT NULL PRIMARY KEY,
+            drugName VARCHAR(255),
+            conditions VARCHAR(255),
+            review TEXT,
+            rating INT,
+            date VARCHAR(20),
+            usefulCount INT
+        )
+    """,
+    "processed_data": """
+        CREATE TABLE IF NOT EXISTS processed_data (
+            uniqueID BIGINT NOT NULL,
+            drugName VARCHAR(255),
+            conditions VARCHAR(255),
+            review TEXT,
+            rating INT,
+            review_date DATE,
+            usefulCount INT,
+            benefit_mentions INT,
+            side_effect_mentions INT,
+            property_mask BIGINT,
+            content_hash CHAR(32),
+            canonical_id BIGINT
+        )
+    """,
+}
+
+
+def local_path(backend):
+    return os.path.abspath(os.getenv(
+        "DB_PATH", os.path.join(LOCAL_DB_DIR, f"drug_reviews.{backend}")
+    ))
+
+
+def database_url(backend=None, path=None):
+    backend = backend or DB_BACKEND
+    if backend not in BACKENDS:
+        raise ValueError(f"DB_BACKEND must be one of {BACKENDS}, got {backend!r}")
+    if backend == "mysql":
+        return (
+            f"mysql+pymysql://{os.getenv('DB_USER')}:{os.getenv('DB_PASSWORD')}"
+            f"@{os.getenv('DB_HOST')}:{int(os.getenv('DB_PORT'))}/{os.getenv('DB_NAME')}"
+        )
+    path = path or local_path(backend)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    return f"{backend}:///{path}"
+
+
+def _sqlite_pragmas(dbapi_connection, _):
+    # WAL lets the app read while the pipeline's writer thread commits chunks
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute("PRAGMA busy_timeout=30000")
+    cursor.close()
+    # sqlite has the REGEXP operator but no implementation behind it
+    dbapi_connection.create_function("regexp", 2, _regexp, deterministic=True)
+
+
+@lru_cache(maxsize=256)
+def _compiled(pattern):
+    return re.compile(pattern)
+
+
+def _regexp(pattern, value):
+    return value is not None and _compiled(pattern).search(value) is not None
+
+
+def get_engine(backend=None, path=None, connect_args=None):
+    """Engine for the configured backend; connect_args only apply to MySQL."""
+    load_dotenv()
+    backend = backend or os.getenv("DB_BACKEND", DB_BACKEND)
+    try:
+        url = database_url(backend, path)
+        if backend == "mysql":
+            engine = create_engine(url, pool_pre_ping=True, connect_args=connect_args or {})
+            logging.info("Connected to AWS RDS successfully")
+            return engine
+
+        engine = create_engine(url)
+        if backend == "sqlite":
+            event.listen(engine, "connect", _sqlite_pragmas)
+        ensure_tables(engine)
+        logging.info(f"Connected to local {backend} database {url}")
+        return engine
+    except Exception as e:
+        raise CustomException(e, sys)
+
+
+def table_columns(engine, table_name):
+    """Column names of a table; portable where the dialect has no reflection (duckdb)."""
+    with engine.connect() as conn:
+        return list(conn.execute(text(f"SELECT * FROM {table_name} WHERE 1 = 0")).keys())
+
+
+def add_column(engine, table_name, column, definition):
+    """ALTER TABLE ... ADD COLUMN unless the column exists; True if this call added it.
+
+    Another run may add the column between the check and the ALTER, its
+    duplicate column error is ignored once the column is there.
+    """
+    if column in table_columns(engine, table_name):
+        return False
+    try:
+        with engine.begin() as conn:
+            conn.execute(text(f"ALTER TABLE {table_name} ADD COLUMN {column} {definition}"))
+    except DBAPIError:
+        if column not in table_columns(engine, table_name):
+            raise
+        logging.info(f"column {table_name}.{column} added by a concurrent run")
+        return False
+    logging.info(f"column {table_name}.{column} added")
+    return True
+
+
+def ensure_tables(engine):
+    with engine.begin() as conn:
+        for ddl in TABLES.values():
+            conn.execute(text(ddl))
+
+
+def mirror(source, target, tables=tuple(TABLES), chunk_size=MIRROR_CHUNK_SIZE, full=False):
+    """Copy raw_data / processed_data from `source` into `target` in uniqueID pages.
+
+    Incremental by default: only rows above the target's MAX(uniqueID) are
+    copied. full=True re-copies everything (rows are upserted on uniqueID, so
+    changed rows such as refreshed property masks are updated too).
+    """
+    from bulk_writer import ProcessedWriter, ensure_unique_key
+
+    ensure_tables(target)
+    copied = {}
+    for table_name in tables:
+        ensure_unique_key(target, table_name)
+        writer = ProcessedWriter("upsert", table_name=table_name)
+        with target.connect() as conn:
+            after_id = -1 if full else conn.execute(
+                text(f"SELECT COALESCE(MAX(uniqueID), -1) FROM {table_name}")
+            ).scalar()
+        # only the columns the target has, RDS tables may carry extra ones
+        columns = ", ".join(table_columns(target, table_name))
+        query = text(
+            f"SELECT {columns} FROM {table_name} WHERE uniqueID > :after_id "
+            f"ORDER BY uniqueID LIMIT :chunk_size"
+        )
+        rows = 0
+        while True:
+            chunk = pd.read_sql(query, source, params={"after_id": after_id, "chunk_size": chunk_size})
+            if chunk.empty:
+                break
+            with target.begin() as conn:
+                writer.write(conn, chunk)
+            rows += len(chunk)
+            after_id = int(chunk["uniqueID"].iloc[-1])
+            if len(chunk) < chunk_size:
+                break
+        copied[table_name] = rows
+        logging.info(f"mirrored {rows} {table_name} rows into {target.url}")
+    return copied
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="storage backends")
+    parser.add_argument("command", choices=["mirror"])
+    parser.add_argument("--source", choices=BACKENDS, default="mysql")
+    parser.add_argument("--target", choices=BACKENDS, default="duckdb")
+    parser.add_argument("--path", help="target database file (default DB_PATH or data/)")
+    parser.add_argument("--full", action="store_true", help="re-copy every row")
+    args = parser.parse_args()
+
+    copied = mirror(get_engine(args.source), get_engine(args.target, args.path), full=args.full)
+    print(", ".join(f"{rows} {table} rows" for table, rows in copied.items()) + " mirrored")
@@ -0,0 +1,245 @@
+import os
+import sys
+import argparse
+from datetime import datetime
+
+import pandas as pd
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from sqlalchemy import text, bindparam
+from logger import logging
+from ingestion_state import (
+    STATE_TABLE, FULL_REBUILD, NO_WATERMARK, get_state, get_watermark, advance_watermark, finish_run
+)
+from property_lexicon import medical_properties, current_property_bits, mask_matrix
+
+# drug x condition x property mention counts over every processed review, so
+# cross-drug questions ("drugs for condition X that cause the least
+# drowsiness") are one small aggregate instead of one analysis per drug.
+# Maintained incrementally: its own watermark in ingestion_state tracks the
+# processed_data rows already counted.
+STATS_TABLE = "drug_property_stats"
+LEADERBOARD_PIPELINE = "drug_property_leaderboard"
+# processed_data rows read per page while counting
+COUNT_CHUNK_SIZE = int(os.getenv("LEADERBOARD_CHUNK_SIZE", 50000))
+MIN_REVIEWS = int(os.getenv("LEADERBOARD_MIN_REVIEWS", 20))
+# conditions is part of the key, so a missing condition is stored as ''
+NO_CONDITION = ""
+
+
+def ensure_stats_table(engine):
+    with engine.begin() as conn:
+        conn.execute(text(f"""
+        CREATE TABLE IF NOT EXISTS {STATS_TABLE} (
+            drugName VARCHAR(255) NOT NULL,
+            conditions VARCHAR(255) NOT NULL,
+            property_name VARCHAR(100) NOT NULL,
+            reviews BIGINT NOT NULL,
+            mentions BIGINT NOT NULL,
+            PRIMARY KEY (drugName, conditions, property_name)
+        )
+        """))
+
+
+def count_properties(chunk, bits):
+    """Long (drugName, conditions, property_name, reviews, mentions) counts of a chunk."""
+    chunk = chunk.dropna(subset=["drugName"])
+    matches = mask_matrix(chunk["property_mask"].fillna(0).to_numpy(), bits)
+    matches.index = chunk.index
+    keys = [chunk["drugName"], chunk["conditions"].fillna(NO_CONDITION)]
+    mentions = matches.groupby(keys).sum()
+    reviews = matches.groupby(keys).size()
+    counts = mentions.stack().rename("mentions").reset_index()
+    counts.columns = ["drugName", "conditions", "property_name", "mentions"]
+    counts["reviews"] = reviews.reindex(
+        pd.MultiIndex.from_frame(counts[["drugName", "conditions"]])
+    ).to_numpy()
+    return counts
+
+
+def needs_rebuild(engine, table, pipeline):
+    """Why a rollup of processed_data maintained under `pipeline` has to be recounted, or None."""
+    main = get_state(engine)
+    rollup = get_state(engine, pipeline)
+    with engine.connect() as conn:
+        empty = conn.execute(text(f"SELECT COUNT(*) FROM {table}")).scalar() == 0
+    if empty and rollup["high_water_mark"] > NO_WATERMARK:
+        return "no stats stored yet"
+    started, rebuilt = main.get("last_run_started"), rollup.get("last_run_started")
+    if main.get("last_run_mode") == FULL_REBUILD and started and (
+        not rebuilt or pd.Timestamp(started) > pd.Timestamp(rebuilt)
+    ):
+        return "processed_data was rebuilt"
+    return None
+
+
+def start_rollup_run(engine, table, pipeline, reason=None):
+    """Mark the rollup run as running; a reason empties the table and resets its watermark."""
+    with engine.begin() as conn:
+        if reason:
+            conn.execute(text(f"DELETE FROM {table}"))
+            conn.execute(
+                text(f"""
+                UPDATE {STATE_TABLE}
+                SET high_water_mark = :none, total_rows = 0,
+                    last_run_mode = :mode, last_run_started = :now
+                WHERE pipeline = :pipeline
+                """),
+                {"none": NO_WATERMARK, "mode": FULL_REBUILD, "now": datetime.now(),
+                 "pipeline": pipeline},
+            )
+            logging.info(f"{table} rebuilt from scratch: {reason}")
+        conn.execute(
+            text(f"UPDATE {STATE_TABLE} SET last_run_status = 'running', last_run_rows = 0 "
+                 f"WHERE pipeline = :pipeline"),
+            {"pipeline": pipeline},
+        )
+
+
+def refresh_leaderboard(engine, rebuild=False, chunk_size=COUNT_CHUNK_SIZE):
+    """Add the processed_data rows above the leaderboard watermark to the stats.
+
+    rebuild=True recounts everything, needed when stored masks changed
+    (refresh_property_bits updated rows). A full processed_data rebuild is
+    detected from ingestion_state. Returns the number of rows counted.
+    """
+    ensure_stats_table(engine)
+    bits = current_property_bits(engine)
+    if bits is None:
+        logging.info("property masks not current, leaderboard refresh skipped")
+        return 0
+
+    get_state(engine, LEADERBOARD_PIPELINE)
+    reason = "stored masks changed" if rebuild else needs_rebuild(
+        engine, STATS_TABLE, LEADERBOARD_PIPELINE
+    )
+    start_rollup_run(engine, STATS_TABLE, LEADERBOARD_PIPELINE, reason)
+
+    after_id = get_watermark(engine, LEADERBOARD_PIPELINE)
+    # rows above the pipeline watermark may belong to partitions still running
+    until_id = get_watermark(engine)
+    query = text("""
+        SELECT uniqueID, drugName, conditions, property_mask
+        FROM processed_data
+        WHERE uniqueID > :after_id AND uniqueID <= :until_id
+        ORDER BY uniqueID
+        LIMIT :chunk_size
+    """)
+    counted = 0
+    while after_id < until_id:
+        chunk = pd.read_sql(
+            query, engine,
+            params={"after_id": after_id, "until_id": until_id, "chunk_size": chunk_size}
+        )
+        if chunk.empty:
+            break
+        last_id = int(chunk["uniqueID"].iloc[-1])
+        _add_counts(engine, count_properties(chunk, bits), last_id, len(chunk))
+        counted += len(chunk)
+        after_id = last_id
+        if len(chunk) < chunk_size:
+            break
+    finish_run(engine, pipeline=LEADERBOARD_PIPELINE)
+    if counted:
+        logging.info(f"leaderboard: {counted} reviews counted up to uniqueID {after_id}")
+    return counted
+
+
+def _add_counts(engine, counts, watermark, rows):
+    """Merge counts into the stored ones with the watermark, in one transaction."""
+    select = text(f"""
+        SELECT drugName, conditions, property_name, reviews, mentions
+        FROM {STATS_TABLE} WHERE drugName IN :drugs
+    """).bindparams(bindparam("drugs", expanding=True))
+    delete = text(
+        f"DELETE FROM {STATS_TABLE} WHERE drugName IN :drugs"
+    ).bindparams(bindparam("drugs", expanding=True))
+    insert = text(f"""
+        INSERT INTO {STATS_TABLE} (drugName, conditions, property_name, reviews, mentions)
+        VALUES (:drugName, :conditions, :property_name, :reviews, :mentions)
+    """)
+    key = ["drugName", "conditions", "property_name"]
+    drugs = counts["drugName"].unique().tolist()
+
+    with engine.begin() as conn:
+        for i in range(0, len(drugs), 1000):
+            batch = drugs[i:i + 1000]
+            stored = pd.read_sql(select, conn, params={"drugs": batch})
+            merged = (
+                pd.concat([stored, counts[counts["drugName"].isin(batch)]])
+                .groupby(key, as_index=False)[["reviews", "mentions"]].sum()
+            )
+            conn.execute(delete, {"drugs": batch})
+            conn.execute(insert, merged.astype(object).to_dict("records"))
+        advance_watermark(conn, watermark, rows, LEADERBOARD_PIPELINE)
+
+
+def _condition_filter(condition):
+    return ("AND conditions = :condition", {"condition": condition}) if condition else ("", {})
+
+
+def rank_drugs(engine, property_name, condition=None, min_reviews=MIN_REVIEWS,
+               least=False, limit=10):
+    """Drugs ranked by the share of their reviews mentioning `property_name`.
+
+    condition limits the reviews to one condition, drugs with fewer than
+    min_reviews (matching) reviews are left out. least=True ranks the
+    lowest share first, e.g. the drugs that cause the least drowsiness.
+    """
+    if property_name not in medical_properties:
+        raise ValueError(f"unknown property {property_name!r}")
+    where, params = _condition_filter(condition)
+    query = text(f"""
+        SELECT drugName, SUM(reviews) AS reviews, SUM(mentions) AS mentions
+        FROM {STATS_TABLE}
+        WHERE property_name = :property_name {where}
+        GROUP BY drugName
+        HAVING SUM(reviews) >= :min_reviews
+        ORDER BY 1.0 * SUM(mentions) / SUM(reviews) {"ASC" if least else "DESC"}, SUM(reviews) DESC
+        LIMIT :limit
+    """)
+    ranking = pd.read_sql(query, engine, params={
+        "property_name": property_name, "min_reviews": min_reviews, "limit": limit, **params
+    })
+    ranking["percentage"] = (ranking["mentions"] / ranking["reviews"] * 100).round(1)
+    return ranking
+
+
+def property_matrix(engine, condition=None, min_reviews=MIN_REVIEWS):
+    """drug x property percentage matrix (rows: drugs with >= min_reviews reviews)."""
+    where, params = _condition_filter(condition)
+    query = text(f"""
+        SELECT drugName, property_name, SUM(reviews) AS reviews, SUM(mentions) AS mentions
+        FROM {STATS_TABLE}
+        WHERE 1 = 1 {where}
+        GROUP BY drugName, property_name
+        HAVING SUM(reviews) >= :min_reviews
+    """)
+    stats = pd.read_sql(query, engine, params={"min_reviews": min_reviews, **params})
+    stats["percentage"] = (stats["mentions"] / stats["reviews"] * 100).round(1)
+    matrix = stats.pivot(index="drugName", columns="property_name", values="percentage")
+    return matrix.reindex(columns=[p for p in medical_properties if p in matrix.columns])
+
+
+if __name__ == "__main__":
+    from db import get_engine
+
+    parser = argparse.ArgumentParser(description="cross-drug property leaderboard")
+    parser.add_argument("command", choices=["refresh", "rank"])
+    parser.add_argument("--rebuild", action="store_true", help="recount every processed review")
+    parser.add_argument("--property", choices=list(medical_properties))
+    parser.add_argument("--condition")
+    parser.add_argument("--min-reviews", type=int, default=MIN_REVIEWS)
+    parser.add_argument("--least", action="store_true", help="lowest share first")
+    parser.add_argument("--limit", type=int, default=10)
+    args = parser.parse_args()
+
+    engine = get_engine()
+    if args.command == "refresh":
+        print(f"{refresh_leaderboard(engine, rebuild=args.rebuild)} reviews counted")
+    else:
+        if not args.property:
+            parser.error("rank needs --property")
+        print(rank_drugs(engine, args.property, args.condition, args.min_reviews,
+                         args.least, args.limit).to_string(index=False))
@@ -1,196 +1,286 @@
 import pandas as pd
-import sys, os
+import sys, os, re, time, argparse
 
 sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'src'))
 
-from sqlalchemy import create_engine
-from dotenv import load_dotenv
+from sqlalchemy import text, bindparam
 from logger import logging
 from exception import CustomException
+from db import get_engine
 
-load_dotenv()
+# DATABASE CONNECTION (DB_BACKEND: RDS MySQL or a local sqlite/duckdb mirror)
+engine = get_engine()
+ 
+from property_lexicon import (
+    LEXICON_VERSION, medical_properties, current_property_bits, mask_matrix, get_matcher
+)
+
+# every keyword of medical_properties compiled once into a single-pass matcher
+matcher = get_matcher()
+from review_dedup import DISTINCT_REVIEWS
+from analysis_cache import ResultCache, PROPERTY_ANALYSIS, data_version
+from property_analysis import FORMAT_VERSION, PropertyAnalysis, ConditionShare, render_markdown
+
+# results per (drug, lexicon version, data version), shared by the app processes
+results_cache = ResultCache(PROPERTY_ANALYSIS)
+
+# "python": read the drug's reviews and aggregate here, "sql": push the
+# aggregation down to the database (one small row set back), see
+# compare_analysis_modes
+ANALYSIS_MODES = ("python", "sql")
+ANALYSIS_MODE = os.getenv("PROPERTY_ANALYSIS_MODE", "python")
+
+
+def _cache_version():
+    return f"{FORMAT_VERSION}/{LEXICON_VERSION}/{data_version(engine)}"
 
-# DATABASE CONNECTION
-try:
-    engine = create_engine(
-        f"mysql+pymysql://{os.getenv('DB_USER')}:{os.getenv('DB_PASSWORD')}"
-        f"@{os.getenv('DB_HOST')}:{int(os.getenv('DB_PORT'))}/{os.getenv('DB_NAME')}",
-        pool_pre_ping=True
+
+def get_drug_property_percentages(drug_name, distinct_reviews=False):
+    """distinct_reviews=True counts a text posted several times (e.g. under a
+    brand and a generic name) once, see review_dedup.py
+
+    Returns a PropertyAnalysis, served from results_cache while neither the
+    lexicon nor processed_data changed.
+    """
+    cached = results_cache.get_or_compute(
+        [drug_name, bool(distinct_reviews)], _cache_version(),
+        lambda: analyze_drug_properties(drug_name, distinct_reviews).to_dict(),
     )
-    logging.info("Connected to AWS RDS successfully")
-except Exception as e:
-    raise CustomException(e, sys)
- 
-medical_properties = {
-    # Side Effects - EXPANDED
-    'causes_drowsiness': [
-        'drowsy', 'sleepy', 'tired', 'fatigue', 'fatigued', 'sedation', 'sedated', 
-        'lethargic', 'lethargy', 'sleepiness', 'drowsiness', 'makes me sleep', 
-        'can\'t stay awake', 'falling asleep', 'heavy eyes', 'exhausted', 'worn out',
-        'need to nap', 'daytime sleepiness', 'hard to stay awake', 'zombie', 'zoned out'
-    ],
-    
-    'causes_nausea': [
-        'nausea', 'nauseous', 'sick to stomach', 'queasy', 'queasiness', 'vomiting', 
-        'throw up', 'throwing up', 'puking', 'sick', 'feel sick', 'stomach sick',
-        'upset stomach', 'sick feeling', 'gag', 'gagging', 'retch', 'dry heaves'
-    ],
-    
-    'causes_headache': [
-        'headache', 'migraine', 'head pain', 'head pounding', 'head hurts', 
-        'head throbbing', 'head ache', 'head pressure', 'head splitting',
-        'tension headache', 'cluster headache', 'head pain', 'head discomfort',
-        'head sore', 'head pounding', 'head throbs'
-    ],
-    
-    'causes_dizziness': [
-        'dizzy', 'dizziness', 'lightheaded', 'light-headed', 'vertigo', 'woozy',
-        'unsteady', 'off balance', 'balance problems', 'room spinning',
-        'feel faint', 'faintness', 'dizzy spells', 'vertigo', 'spinning sensation'
-    ],
-    
-    'causes_digestive_issues': [
-        'stomach pain', 'stomach ache', 'abdominal pain', 'diarrhea', 'diarrhoea',
-        'constipation', 'upset stomach', 'indigestion', 'heartburn', 'acid reflux',
-        'bloating', 'bloated', 'gas', 'gassy', 'stomach cramps', 'cramping',
-        'bowel problems', 'digestive issues', 'stomach issues', 'GI problems'
-    ],
-    
-    # Effectiveness - EXPANDED
-    'effective_pain_relief': [
-        'pain relief', 'relieves pain', 'pain gone', 'helps pain', 'eases pain',
-        'pain free', 'no pain', 'pain disappeared', 'pain reduced', 'pain better',
-        'manages pain', 'controls pain', 'pain subsided', 'pain went away',
-        'alleviates pain', 'reduces pain', 'pain diminishing', 'pain decreasing'
-    ],
-    
-    'quick_acting': [
-        'works fast', 'quick relief', 'within minutes', 'immediate', 'fast acting',
-        'acts quickly', 'rapid relief', 'fast working', 'quick results', 'soon after',
-        'minutes later', 'fast effect', 'quick acting', 'speedy relief', 'prompt relief',
-        'almost instantly', 'right away', 'within half hour', '30 minutes'
-    ],
-    
-    'long_lasting': [
-        'lasts long', 'all day', '24 hour', 'extended relief', 'long lasting',
-        'all night', 'through the night', 'lasts hours', 'long duration',
-        'sustained relief', 'continuous relief', 'lasts all day', 'works all day',
-        'extended release', 'time released', 'slow release', 'prolonged effect'
-    ],
-    
-    'highly_effective': [
-        'very effective', 'extremely effective', 'works great', 'excellent results',
-        'amazing results', 'fantastic', 'wonderful', 'outstanding', 'superb',
-        'highly effective', 'very good', 'excellent', 'great results', 'works perfectly',
-        'does the job', 'exactly what I needed', 'perfect solution', 'best ever'
-    ],
-    
-    # Practical Aspects - EXPANDED
-    'easy_to_use': [
-        'easy to take', 'convenient', 'simple', 'user friendly', 'easy to use',
-        'easy administration', 'simple to take', 'no hassle', 'straightforward',
-        'convenient dosing', 'easy dosage', 'simple instructions', 'user-friendly',
-        'easy to swallow', 'easy to remember', 'convenient packaging'
-    ],
-    
-    'cost_issues': [
-        'expensive', 'costly', 'pricey', 'insurance won\'t cover', 'too expensive',
-        'high cost', 'price is high', 'cost too much', 'expensive medication',
-        'can\'t afford', 'pricey prescription', 'cost burden', 'financial strain',
-        'insurance denied', 'co-pay high', 'out of pocket', 'not covered'
-    ],
-    
-    'tolerable': [
-        'well tolerated', 'gentle', 'no side effects', 'smooth', 'easy on stomach',
-        'no problems', 'no issues', 'well tolerated', 'no adverse effects',
-        'no reaction', 'handled well', 'no complications', 'smooth experience',
-        'comfortable', 'no discomfort', 'easy transition'
-    ],
-    
-    # Specific Conditions - EXPANDED
-    'helps_sleep': [
-        'helps sleep', 'sleep better', 'fall asleep', 'improved sleep', 'sleep well',
-        'better sleep', 'sleep through night', 'restful sleep', 'deep sleep',
-        'sleep quality', 'sleep improved', 'easier to sleep', 'sleep aid',
-        'promotes sleep', 'induces sleep', 'sleep enhancement', 'sleep pattern',
-        'no insomnia', 'sleep disturbance gone'
-    ],
-    
-    'reduces_anxiety': [
-        'calms anxiety', 'less anxious', 'reduces stress', 'relaxing', 'calming',
-        'anxiety relief', 'panic attacks reduced', 'anxiousness gone', 'calm feeling',
-        'reduces worry', 'less stressed', 'stress relief', 'anxiety better',
-        'nervousness reduced', 'peaceful', 'serene', 'tranquil', 'at ease'
-    ],
-    
-    'improves_mood': [
-        'improves mood', 'feel better', 'happier', 'mood lift', 'better mood',
-        'mood enhancement', 'depression better', 'less depressed', 'mood improved',
-        'emotional balance', 'stable mood', 'mood elevation', 'positive mood',
-        'outlook improved', 'happier feelings', 'emotional well-being'
-    ],
-    
-    'increases_energy': [
-        'more energy', 'energetic', 'less fatigued', 'pep', 'energy boost',
-        'increased energy', 'less tired', 'vitality', 'energized', 'revitalized',
-        'energy levels up', 'no fatigue', 'renewed energy', 'active again',
-        'productivity improved', 'mental energy', 'physical energy'
-    ]
-}
+    return PropertyAnalysis.from_dict(cached)
+
 
-def get_drug_property_percentages(drug_name):
+def get_drug_profiles(drug_names, distinct_reviews=False):
+    """{drug: PropertyAnalysis} for several drugs, in the given order.
+
+    Cached drugs come from results_cache, the others are analyzed together
+    in one batch (one IN query) and cached.
+    """
+    drug_names = list(dict.fromkeys(drug_names))
+    version = _cache_version()
+    profiles, missing = {}, []
+    for drug in drug_names:
+        found, cached = results_cache.get([drug, bool(distinct_reviews)], version)
+        if found:
+            profiles[drug] = PropertyAnalysis.from_dict(cached)
+        else:
+            missing.append(drug)
+    if missing:
+        for drug, analysis in analyze_drugs(missing, distinct_reviews).items():
+            results_cache.put([drug, bool(distinct_reviews)], version, analysis.to_dict())
+            profiles[drug] = analysis
+    return {drug: profiles[drug] for drug in drug_names}
+
+
+def analyze_drug_properties(drug_name, distinct_reviews=False, mode=None):
+    """get_drug_property_percentages without the cache.
+
+    mode "python" reads the drug's rows and aggregates them here, "sql"
+    lets the database aggregate and only reads the totals back (default
+    PROPERTY_ANALYSIS_MODE).
+    """
     logging.info("get_drug_property_percentages function called")
+    return analyze_drugs([drug_name], distinct_reviews, mode)[drug_name]
 
-    try:
-        query = """
-        SELECT drugName, conditions, review, rating
-        FROM processed_data
-        WHERE drugName = %s
-        """
-        drug_reviews = pd.read_sql(
-            query,
-            engine,
-            params=(drug_name,)
-        )
 
+def analyze_drugs(drug_names, distinct_reviews=False, mode=None):
+    """{drug: PropertyAnalysis} of several drugs from one batch of queries, uncached."""
+    mode = mode or ANALYSIS_MODE
+    if mode not in ANALYSIS_MODES:
+        raise ValueError(f"mode must be one of {ANALYSIS_MODES}, got {mode!r}")
+    drug_names = list(dict.fromkeys(drug_names))
+    try:
+        if mode == "sql":
+            return _analyze_in_sql(drug_names, distinct_reviews)
+        return _analyze_in_python(drug_names, distinct_reviews)
     except Exception as e:
         raise CustomException(e, sys)
 
-    if drug_reviews.empty:
-        return f"No reviews found for {drug_name}"
 
-    results = {}
-    for property_name, keywords in medical_properties.items():
-        pattern = '|'.join(keywords)
-        matches = drug_reviews['review'].str.contains(pattern, case=False, na=False)
-        percentage = (matches.sum() / len(drug_reviews)) * 100
-        results[property_name] = round(percentage, 1)
+def _analysis(drug_name, reviews, avg_rating, counts, condition_counts):
+    """PropertyAnalysis from the aggregates both modes compute."""
+    if not reviews:
+        return PropertyAnalysis(drug_name)
+    return PropertyAnalysis(
+        drug_name=drug_name,
+        reviews=int(reviews),
+        avg_rating=None if pd.isna(avg_rating) else float(avg_rating),
+        counts={prop: int(counts[prop]) for prop in medical_properties},
+        percentages={
+            prop: float(round(counts[prop] / reviews * 100, 1)) for prop in medical_properties
+        },
+        top_conditions=[
+            ConditionShare(condition, int(count), float(round(count / reviews * 100, 1)))
+            for condition, count in condition_counts
+        ],
+    )
 
-    # Top conditions
-    condition_counts = drug_reviews['conditions'].value_counts().head(3)
 
-    output_lines = []
-    output_lines.append(f"**Most Common Conditions for {drug_name}:**")
+def _analyze_in_python(drug_names, distinct_reviews=False):
+    duplicates_filter = f"AND {DISTINCT_REVIEWS}" if distinct_reviews else ""
+    params = {"drug_names": drug_names}
 
-    for condition, count in condition_counts.items():
-        pct = (count / len(drug_reviews)) * 100
-        output_lines.append(f"- {condition}: {count} reviews ({pct:.1f}%)")
+    # property_mask holds the per review properties computed at ingest; it is
+    # only trusted when every bit was computed with the current lexicon
+    bits = current_property_bits(engine)
 
-    output_lines.append("\n**Medical Properties Analysis:**")
+    if bits is not None:
+        query = text(f"""
+        SELECT drugName, conditions, rating, property_mask
+        FROM processed_data
+        WHERE drugName IN :drug_names {duplicates_filter}
+        ORDER BY uniqueID
+        """).bindparams(bindparam("drug_names", expanding=True))
+        drug_reviews = pd.read_sql(query, engine, params=params)
+        if drug_reviews['property_mask'].isna().any():
+            bits = None
+
+    if bits is None:
+        query = text(f"""
+        SELECT drugName, conditions, review, rating
+        FROM processed_data
+        WHERE drugName IN :drug_names {duplicates_filter}
+        ORDER BY uniqueID
+        """).bindparams(bindparam("drug_names", expanding=True))
+        drug_reviews = pd.read_sql(query, engine, params=params)
+
+    # reviews x properties boolean matrix: from the stored masks (no text
+    # scan) or from one matcher pass over each review
+    if bits is not None:
+        matches = mask_matrix(drug_reviews['property_mask'].to_numpy(), bits)
+    else:
+        matches = matcher.matrix(drug_reviews['review'])
+    matches.index = drug_reviews.index
+    by_drug = drug_reviews.groupby('drugName')
+    counts = matches[list(medical_properties)].groupby(drug_reviews['drugName']).sum()
+    reviews = by_drug.size()
+    avg_rating = by_drug['rating'].mean()
+
+    # Top conditions per drug, ties in order of first review (as the GROUP BY of sql mode)
+    conditions = (
+        drug_reviews.dropna(subset=['conditions'])
+        .groupby(['drugName', 'conditions'], sort=False).size().rename('reviews').reset_index()
+        .sort_values(['drugName', 'reviews'], ascending=[True, False], kind='stable')
+        .groupby('drugName').head(3)
+    )
+    top_conditions = {
+        drug: list(zip(group['conditions'], group['reviews']))
+        for drug, group in conditions.groupby('drugName', sort=False)
+    }
+    return {
+        drug: _analysis(drug, reviews.get(drug, 0), avg_rating.get(drug),
+                        counts.loc[drug] if drug in counts.index else None,
+                        top_conditions.get(drug, []))
+        for drug in drug_names
+    }
 
-    for prop, pct in results.items():
-        output_lines.append(
-            f"- {pct}% of reviews mention {prop.replace('_', ' ').title()}"
-        )
 
-    output_lines.append(
-        f"\n**Overall Stats:** {len(drug_reviews)} reviews, "
-        f"Avg rating: {drug_reviews['rating'].mean():.1f}/10"
+def _sql_regex(keywords):
+    """Alternation of the lowercased keywords, only metacharacters escaped so
+    MySQL (ICU), duckdb (RE2) and sqlite (re) read it the same way."""
+    return "|".join(
+        re.sub(r"([.^$*+?()\[\]{}|\\])", r"\\\1", keyword.lower()) for keyword in keywords
     )
 
-    return output_lines
+
+def _regex_match(column, param):
+    if engine.dialect.name == "duckdb":
+        return f"regexp_matches({column}, :{param})"
+    return f"{column} REGEXP :{param}"
+
+
+def _analyze_in_sql(drug_names, distinct_reviews=False, use_masks=True):
+    duplicates_filter = f"AND {DISTINCT_REVIEWS}" if distinct_reviews else ""
+    params = {"drug_names": drug_names}
+    names = list(medical_properties)
+
+    bits = current_property_bits(engine) if use_masks else None
+    if bits is not None:
+        # bit b of property_mask is 0/1 after the shift, summing it counts the reviews
+        sums = [f"SUM((property_mask >> {int(bits[name])}) & 1)" for name in names]
+    else:
+        sums = [
+            f"SUM(CASE WHEN {_regex_match('LOWER(review)', f'p{i}')} THEN 1 ELSE 0 END)"
+            for i in range(len(names))
+        ]
+        params.update({f"p{i}": _sql_regex(medical_properties[name]) for i, name in enumerate(names)})
+
+    totals_query = text(f"""
+    SELECT drugName, COUNT(*), AVG(rating), COUNT(property_mask), {", ".join(sums)}
+    FROM processed_data
+    WHERE drugName IN :drug_names {duplicates_filter}
+    GROUP BY drugName
+    """).bindparams(bindparam("drug_names", expanding=True))
+    # three most reviewed conditions per drug
+    conditions_query = text(f"""
+    SELECT drugName, conditions, reviews FROM (
+        SELECT drugName, conditions, COUNT(*) AS reviews,
+               ROW_NUMBER() OVER (
+                   PARTITION BY drugName ORDER BY COUNT(*) DESC, MIN(uniqueID)
+               ) AS condition_rank
+        FROM processed_data
+        WHERE drugName IN :drug_names AND conditions IS NOT NULL {duplicates_filter}
+        GROUP BY drugName, conditions
+    ) ranked
+    WHERE condition_rank <= 3
+    ORDER BY drugName, condition_rank
+    """).bindparams(bindparam("drug_names", expanding=True))
+    top_conditions = {}
+    with engine.connect() as conn:
+        totals = {row[0]: row[1:] for row in conn.execute(totals_query, params)}
+        # rows written before their mask was computed: match the text instead
+        stale = bits is not None and any(row[2] != row[0] for row in totals.values())
+        if not stale:
+            for drug, condition, count in conn.execute(conditions_query, params):
+                top_conditions.setdefault(drug, []).append((condition, count))
+    if stale:
+        return _analyze_in_sql(drug_names, distinct_reviews, use_masks=False)
+
+    results = {}
+    for drug in drug_names:
+        row = totals.get(drug)
+        if row is None:
+            results[drug] = PropertyAnalysis(drug)
+            continue
+        counts = dict(zip(names, (value or 0 for value in row[3:])))
+        results[drug] = _analysis(drug, row[0], row[1], counts, top_conditions.get(drug, []))
+    return results
+
+
+def compare_analysis_modes(drug_name, distinct_reviews=False, repeat=3):
+    """Run both modes on one drug: do they agree and how long does each take."""
+    results, seconds = {}, {}
+    for mode in ANALYSIS_MODES:
+        timings = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            results[mode] = analyze_drug_properties(drug_name, distinct_reviews, mode=mode)
+            timings.append(time.perf_counter() - start)
+        seconds[mode] = round(min(timings), 4)
+
+    python, sql = (results[mode].to_dict() for mode in ANALYSIS_MODES)
+    differences = [
+        name for name in python
+        if name != "avg_rating" and python[name] != sql[name]
+    ]
+    if (python["avg_rating"] is None) != (sql["avg_rating"] is None) or (
+        python["avg_rating"] is not None and abs(python["avg_rating"] - sql["avg_rating"]) > 1e-9
+    ):
+        differences.append("avg_rating")
+    return {"drug_name": drug_name, "equal": not differences,
+            "differences": differences, "seconds": seconds}
 
 
-# Example usage
 if __name__ == "__main__":
-    print("\n".join(get_drug_property_percentages("Integra")))
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="property analysis of a drug's reviews")
+    parser.add_argument("drugs", nargs="*", default=["Integra"])
+    parser.add_argument("--mode", choices=ANALYSIS_MODES, default=ANALYSIS_MODE)
+    parser.add_argument("--distinct", action="store_true", help="count duplicated texts once")
+    parser.add_argument("--compare", action="store_true",
+                        help="check both modes agree and time them instead")
+    args = parser.parse_args()
+
+    for drug in args.drugs:
+        if args.compare:
+            print(compare_analysis_modes(drug, args.distinct))
+        else:
+            print("\n".join(render_markdown(analyze_drug_properties(drug, args.distinct, args.mode))))
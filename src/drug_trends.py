@@ -0,0 +1,293 @@
+import os
+import sys
+import argparse
+
+import numpy as np
+import pandas as pd
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from sqlalchemy import text, bindparam
+from logger import logging
+from ingestion_state import get_state, get_watermark, advance_watermark, finish_run
+from property_lexicon import medical_properties, current_property_bits, mask_matrix
+from drug_leaderboard import needs_rebuild, start_rollup_run
+
+# drug x month x rating bucket x property counts over every dated processed
+# review, so trend questions ("is drowsiness mentioned more for drug X since
+# 2015") read a few hundred rollup rows instead of scanning the drug's reviews.
+# Maintained incrementally like the leaderboard: its own watermark in
+# ingestion_state tracks the processed_data rows already counted.
+TRENDS_TABLE = "drug_monthly_trends"
+TRENDS_PIPELINE = "drug_monthly_trends"
+# processed_data rows read per page while counting
+COUNT_CHUNK_SIZE = int(os.getenv("TRENDS_CHUNK_SIZE", 50000))
+# (name, lowest rating, highest rating); reviews without a rating are UNRATED
+RATING_BUCKETS = [("negative", 1, 4), ("neutral", 5, 6), ("positive", 7, 10)]
+UNRATED = "unrated"
+# period name -> pandas frequency the monthly rollups are summed up to
+TREND_FREQUENCIES = {"month": "M", "quarter": "Q", "year": "Y"}
+MONTH_FORMAT = "%Y-%m"
+
+
+def ensure_trends_table(engine):
+    with engine.begin() as conn:
+        conn.execute(text(f"""
+        CREATE TABLE IF NOT EXISTS {TRENDS_TABLE} (
+            drugName VARCHAR(255) NOT NULL,
+            month CHAR(7) NOT NULL,
+            rating_bucket VARCHAR(20) NOT NULL,
+            property_name VARCHAR(100) NOT NULL,
+            reviews BIGINT NOT NULL,
+            rating_sum BIGINT NOT NULL,
+            mentions BIGINT NOT NULL,
+            PRIMARY KEY (drugName, month, rating_bucket, property_name)
+        )
+        """))
+
+
+def rating_buckets(ratings):
+    """Bucket name of every rating."""
+    ratings = pd.to_numeric(ratings, errors="coerce").to_numpy(dtype=float)
+    buckets = np.full(len(ratings), UNRATED, dtype=object)
+    for name, low, high in RATING_BUCKETS:
+        buckets[(ratings >= low) & (ratings <= high)] = name
+    return buckets
+
+
+def count_trends(chunk, bits):
+    """Long (drugName, month, rating_bucket, property_name, reviews, rating_sum, mentions) counts of a chunk.
+
+    Reviews without a drug name or a review date are left out. Every
+    property row of a (drug, month, bucket) carries the same reviews and
+    rating_sum.
+    """
+    months = pd.to_datetime(chunk["review_date"], errors="coerce").dt.strftime(MONTH_FORMAT)
+    chunk = chunk.assign(month=months).dropna(subset=["drugName", "month"])
+    key = ["drugName", "month", "rating_bucket"]
+    columns = key + ["property_name", "reviews", "rating_sum", "mentions"]
+    if chunk.empty:
+        return pd.DataFrame(columns=columns)
+
+    chunk = chunk.assign(rating_bucket=rating_buckets(chunk["rating"]))
+    matches = mask_matrix(chunk["property_mask"].fillna(0).to_numpy(), bits)
+    matches.index = chunk.index
+    keys = [chunk[column] for column in key]
+    mentions = matches.groupby(keys).sum()
+    ratings = pd.to_numeric(chunk["rating"], errors="coerce").groupby(keys)
+    counts = mentions.stack().rename("mentions").reset_index()
+    counts.columns = key + ["property_name", "mentions"]
+    index = pd.MultiIndex.from_frame(counts[key])
+    counts["reviews"] = ratings.size().reindex(index).to_numpy()
+    counts["rating_sum"] = ratings.sum().reindex(index).fillna(0).astype("int64").to_numpy()
+    return counts[columns]
+
+
+def refresh_trends(engine, rebuild=False, chunk_size=COUNT_CHUNK_SIZE):
+    """Add the processed_data rows above the trends watermark to the monthly rollups.
+
+    rebuild=True recounts everything, needed when stored masks changed
+    (refresh_property_bits updated rows). A full processed_data rebuild is
+    detected from ingestion_state. Returns the number of rows read.
+    """
+    ensure_trends_table(engine)
+    bits = current_property_bits(engine)
+    if bits is None:
+        logging.info("property masks not current, trends refresh skipped")
+        return 0
+
+    get_state(engine, TRENDS_PIPELINE)
+    reason = "stored masks changed" if rebuild else needs_rebuild(
+        engine, TRENDS_TABLE, TRENDS_PIPELINE
+    )
+    start_rollup_run(engine, TRENDS_TABLE, TRENDS_PIPELINE, reason)
+
+    after_id = get_watermark(engine, TRENDS_PIPELINE)
+    # rows above the pipeline watermark may belong to partitions still running
+    until_id = get_watermark(engine)
+    query = text("""
+        SELECT uniqueID, drugName, rating, review_date, property_mask
+        FROM processed_data
+        WHERE uniqueID > :after_id AND uniqueID <= :until_id
+        ORDER BY uniqueID
+        LIMIT :chunk_size
+    """)
+    counted = 0
+    while after_id < until_id:
+        chunk = pd.read_sql(
+            query, engine,
+            params={"after_id": after_id, "until_id": until_id, "chunk_size": chunk_size}
+        )
+        if chunk.empty:
+            break
+        last_id = int(chunk["uniqueID"].iloc[-1])
+        _add_counts(engine, count_trends(chunk, bits), last_id, len(chunk))
+        counted += len(chunk)
+        after_id = last_id
+        if len(chunk) < chunk_size:
+            break
+    finish_run(engine, pipeline=TRENDS_PIPELINE)
+    if counted:
+        logging.info(f"trends: {counted} reviews counted up to uniqueID {after_id}")
+    return counted
+
+
+def _add_counts(engine, counts, watermark, rows):
+    """Merge counts into the stored ones with the watermark, in one transaction.
+
+    Only the stored months of the chunk's drugs are read back, new rows
+    mostly fall in the latest months.
+    """
+    where = "drugName IN :drugs AND month IN :months"
+    params = [bindparam("drugs", expanding=True), bindparam("months", expanding=True)]
+    select = text(f"""
+        SELECT drugName, month, rating_bucket, property_name, reviews, rating_sum, mentions
+        FROM {TRENDS_TABLE} WHERE {where}
+    """).bindparams(*params)
+    delete = text(f"DELETE FROM {TRENDS_TABLE} WHERE {where}").bindparams(*params)
+    insert = text(f"""
+        INSERT INTO {TRENDS_TABLE}
+            (drugName, month, rating_bucket, property_name, reviews, rating_sum, mentions)
+        VALUES (:drugName, :month, :rating_bucket, :property_name, :reviews, :rating_sum, :mentions)
+    """)
+    key = ["drugName", "month", "rating_bucket", "property_name"]
+    drugs = counts["drugName"].unique().tolist()
+
+    with engine.begin() as conn:
+        for i in range(0, len(drugs), 1000):
+            batch = counts[counts["drugName"].isin(drugs[i:i + 1000])]
+            scope = {"drugs": drugs[i:i + 1000], "months": batch["month"].unique().tolist()}
+            stored = pd.read_sql(select, conn, params=scope)
+            merged = (
+                pd.concat([stored, batch])
+                .groupby(key, as_index=False)[["reviews", "rating_sum", "mentions"]].sum()
+            )
+            conn.execute(delete, scope)
+            conn.execute(insert, merged.astype(object).to_dict("records"))
+        advance_watermark(conn, watermark, rows, TRENDS_PIPELINE)
+
+
+def _month(value):
+    """'YYYY-MM' of a year, month or date ('2015', '2015-06', date(2015, 6, 1))."""
+    return pd.Period(str(value), freq="M").strftime(MONTH_FORMAT)
+
+
+def _period_filter(since, until):
+    """since is inclusive, until exclusive."""
+    where, params = "", {}
+    if since is not None:
+        where += " AND month >= :since"
+        params["since"] = _month(since)
+    if until is not None:
+        where += " AND month < :until"
+        params["until"] = _month(until)
+    return where, params
+
+
+def _periods(months, freq):
+    if freq not in TREND_FREQUENCIES:
+        raise ValueError(f"unknown frequency {freq!r}, expected one of {list(TREND_FREQUENCIES)}")
+    return pd.PeriodIndex(months, freq="M").asfreq(TREND_FREQUENCIES[freq]).astype(str)
+
+
+def property_trends(engine, drug_name, properties=None, since=None, until=None,
+                    freq="month", buckets=None):
+    """Share of a drug's reviews mentioning each property, per period.
+
+    Long frame of (period, property_name, reviews, mentions, percentage),
+    oldest period first; periods without reviews are absent. properties
+    defaults to every property, buckets limits the reviews to some rating
+    buckets (e.g. ["negative"]).
+    """
+    properties = list(properties or medical_properties)
+    unknown = [p for p in properties if p not in medical_properties]
+    if unknown:
+        raise ValueError(f"unknown properties {unknown}")
+    where, params = _period_filter(since, until)
+    query = text(f"""
+        SELECT month, property_name, SUM(reviews) AS reviews, SUM(mentions) AS mentions
+        FROM {TRENDS_TABLE}
+        WHERE drugName = :drug_name AND property_name IN :properties
+          {"AND rating_bucket IN :buckets" if buckets else ""} {where}
+        GROUP BY month, property_name
+    """).bindparams(bindparam("properties", expanding=True))
+    if buckets:
+        query = query.bindparams(bindparam("buckets", expanding=True))
+        params["buckets"] = list(buckets)
+    stats = pd.read_sql(query, engine, params={
+        "drug_name": drug_name, "properties": properties, **params
+    })
+    stats["period"] = _periods(stats["month"], freq)
+    trends = (
+        stats.groupby(["period", "property_name"], as_index=False)[["reviews", "mentions"]].sum()
+        .sort_values(["period", "property_name"], ignore_index=True)
+    )
+    trends["percentage"] = (trends["mentions"] / trends["reviews"] * 100).round(1)
+    return trends
+
+
+def rating_trend(engine, drug_name, since=None, until=None, freq="month"):
+    """A drug's reviews, average rating and rating bucket shares (%) per period."""
+    where, params = _period_filter(since, until)
+    # the counts of a (drug, month, bucket) are repeated on every property row, read one
+    query = text(f"""
+        SELECT month, rating_bucket, SUM(reviews) AS reviews, SUM(rating_sum) AS rating_sum
+        FROM {TRENDS_TABLE}
+        WHERE drugName = :drug_name {where}
+          AND property_name = (SELECT MIN(property_name) FROM {TRENDS_TABLE} WHERE drugName = :drug_name)
+        GROUP BY month, rating_bucket
+    """)
+    stats = pd.read_sql(query, engine, params={"drug_name": drug_name, **params})
+    stats["period"] = _periods(stats["month"], freq)
+    stats["rated"] = stats["reviews"].where(stats["rating_bucket"] != UNRATED, 0)
+    reviews = stats.pivot_table(
+        index="period", columns="rating_bucket", values="reviews", aggfunc="sum", fill_value=0
+    )
+    totals = stats.groupby("period")[["reviews", "rating_sum", "rated"]].sum()
+    trend = totals[["reviews"]].copy()
+    trend["avg_rating"] = (totals["rating_sum"] / totals["rated"].replace(0, np.nan)).round(2)
+    for name, _, _ in RATING_BUCKETS:
+        share = reviews[name] if name in reviews.columns else 0
+        trend[f"{name}_pct"] = (share / totals["reviews"] * 100).round(1)
+    return trend.reset_index()
+
+
+def property_share(engine, drug_name, property_name, since=None, until=None):
+    """Reviews, mentions and percentage of one property over a period (None without reviews)."""
+    trends = property_trends(engine, drug_name, [property_name], since, until, freq="year")
+    reviews, mentions = int(trends["reviews"].sum()), int(trends["mentions"].sum())
+    return {
+        "reviews": reviews,
+        "mentions": mentions,
+        "percentage": round(mentions / reviews * 100, 1) if reviews else None,
+    }
+
+
+if __name__ == "__main__":
+    from db import get_engine
+
+    parser = argparse.ArgumentParser(description="monthly rating and property trends per drug")
+    parser.add_argument("command", choices=["refresh", "trend", "share"])
+    parser.add_argument("--rebuild", action="store_true", help="recount every processed review")
+    parser.add_argument("--drug")
+    parser.add_argument("--property", choices=list(medical_properties))
+    parser.add_argument("--since", help="YYYY or YYYY-MM, inclusive")
+    parser.add_argument("--until", help="YYYY or YYYY-MM, exclusive")
+    parser.add_argument("--freq", choices=list(TREND_FREQUENCIES), default="year")
+    args = parser.parse_args()
+
+    engine = get_engine()
+    if args.command == "refresh":
+        print(f"{refresh_trends(engine, rebuild=args.rebuild)} reviews counted")
+    elif not args.drug:
+        parser.error(f"{args.command} needs --drug")
+    elif args.command == "share":
+        if not args.property:
+            parser.error("share needs --property")
+        print(property_share(engine, args.drug, args.property, args.since, args.until))
+    elif args.property:
+        print(property_trends(engine, args.drug, [args.property], args.since, args.until,
+                              args.freq).to_string(index=False))
+    else:
+        print(rating_trend(engine, args.drug, args.since, args.until,
+                           args.freq).to_string(index=False))
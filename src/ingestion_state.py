@@ -0,0 +1,188 @@
+import os
+import sys
+from contextlib import contextmanager
+from datetime import datetime
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from sqlalchemy import text
+from sqlalchemy.exc import DBAPIError
+from logger import logging
+
+# One row per pipeline in ingestion_state. high_water_mark is the largest
+# raw_data.uniqueID already stored in processed_data, so an incremental run
+# only has to read `uniqueID > high_water_mark` instead of anti-joining
+# against the whole processed_data table. NO_WATERMARK is below every
+# uniqueID (0 included): nothing stored yet.
+STATE_TABLE = "ingestion_state"
+PIPELINE_NAME = "drug_review_preprocessing"
+NO_WATERMARK = -1
+
+INCREMENTAL = "incremental"
+FULL_REBUILD = "full"
+RUN_MODES = (INCREMENTAL, FULL_REBUILD)
+
+# seconds a run waits for the pipeline lock held by another writer
+LOCK_TIMEOUT = int(os.getenv("PREPROCESS_LOCK_TIMEOUT", 300))
+
+
+def ensure_state_table(engine):
+    with engine.begin() as conn:
+        conn.execute(text(f"""
+        CREATE TABLE IF NOT EXISTS {STATE_TABLE} (
+            pipeline VARCHAR(100) NOT NULL PRIMARY KEY,
+            high_water_mark BIGINT NOT NULL DEFAULT -1,
+            total_rows BIGINT NOT NULL DEFAULT 0,
+            last_run_mode VARCHAR(20),
+            last_run_status VARCHAR(20),
+            last_run_rows BIGINT NOT NULL DEFAULT 0,
+            last_run_started DATETIME,
+            last_run_finished DATETIME
+        )
+        """))
+
+
+def get_state(engine, pipeline=PIPELINE_NAME):
+    """Return the state row as a dict, bootstrapping it on first use.
+
+    The first time a pipeline runs against an existing processed_data table
+    the watermark is seeded from MAX(uniqueID), which is the last time the
+    old anti-join has to be paid for.
+    """
+    ensure_state_table(engine)
+    with engine.begin() as conn:
+        row = conn.execute(
+            text(f"SELECT * FROM {STATE_TABLE} WHERE pipeline = :pipeline"),
+            {"pipeline": pipeline},
+        ).mappings().first()
+        if row is not None:
+            return dict(row)
+
+        seed = conn.execute(text(
+            "SELECT COALESCE(MAX(uniqueID), :none), COUNT(*) FROM processed_data"
+        ), {"none": NO_WATERMARK}).first()
+        conn.execute(
+            text(f"""
+            INSERT INTO {STATE_TABLE} (pipeline, high_water_mark, total_rows)
+            VALUES (:pipeline, :watermark, :total)
+            """),
+            {"pipeline": pipeline, "watermark": int(seed[0]), "total": int(seed[1])},
+        )
+        logging.info(f"ingestion state for {pipeline} bootstrapped at uniqueID {seed[0]}")
+        return {"pipeline": pipeline, "high_water_mark": int(seed[0]), "total_rows": int(seed[1])}
+
+
+def read_state(engine, pipeline=PIPELINE_NAME):
+    """The state row as a dict, None when it does not exist yet.
+
+    Read only, for readers such as the apps that must not bootstrap the table.
+    """
+    try:
+        with engine.connect() as conn:
+            row = conn.execute(
+                text(f"SELECT * FROM {STATE_TABLE} WHERE pipeline = :pipeline"),
+                {"pipeline": pipeline},
+            ).mappings().first()
+    except DBAPIError:
+        # no ingestion_state table yet
+        return None
+    return dict(row) if row is not None else None
+
+
+def get_watermark(engine, pipeline=PIPELINE_NAME):
+    return int(get_state(engine, pipeline)["high_water_mark"])
+
+
+def start_run(engine, mode, pipeline=PIPELINE_NAME, resume=False):
+    """Mark a run as started. A full rebuild empties processed_data and resets the watermark.
+
+    resume=True continues an interrupted run: nothing is emptied and the
+    watermark keeps the progress the earlier attempt committed.
+    """
+    if mode not in RUN_MODES:
+        raise ValueError(f"mode must be one of {RUN_MODES}, got {mode!r}")
+
+    get_state(engine, pipeline)
+    with engine.begin() as conn:
+        if mode == FULL_REBUILD and not resume:
+            if engine.dialect.name == "mysql":
+                conn.execute(text("TRUNCATE TABLE processed_data"))
+            else:
+                conn.execute(text("DELETE FROM processed_data"))
+            conn.execute(
+                text(f"""
+                UPDATE {STATE_TABLE}
+                SET high_water_mark = :none, total_rows = 0
+                WHERE pipeline = :pipeline
+                """),
+                {"none": NO_WATERMARK, "pipeline": pipeline},
+            )
+            logging.info("full rebuild: processed_data emptied and watermark reset")
+
+        conn.execute(
+            text(f"""
+            UPDATE {STATE_TABLE}
+            SET last_run_mode = :mode, last_run_status = 'running',
+                last_run_rows = CASE WHEN :resume THEN last_run_rows ELSE 0 END,
+                last_run_started = :now, last_run_finished = NULL
+            WHERE pipeline = :pipeline
+            """),
+            {"mode": mode, "now": datetime.now(), "pipeline": pipeline, "resume": resume},
+        )
+    return get_watermark(engine, pipeline)
+
+
+def advance_watermark(conn, watermark, rows, pipeline=PIPELINE_NAME):
+    """Move the watermark forward inside the caller's transaction.
+
+    Called with the same connection that wrote the rows, so the data and the
+    watermark are committed (or rolled back) together.
+    """
+    conn.execute(
+        text(f"""
+        UPDATE {STATE_TABLE}
+        SET high_water_mark = :watermark,
+            total_rows = total_rows + :rows,
+            last_run_rows = last_run_rows + :rows
+        WHERE pipeline = :pipeline AND high_water_mark < :watermark
+        """),
+        {"watermark": int(watermark), "rows": int(rows), "pipeline": pipeline},
+    )
+
+
+def finish_run(engine, status="success", pipeline=PIPELINE_NAME):
+    with engine.begin() as conn:
+        conn.execute(
+            text(f"""
+            UPDATE {STATE_TABLE}
+            SET last_run_status = :status, last_run_finished = :now
+            WHERE pipeline = :pipeline
+            """),
+            {"status": status, "now": datetime.now(), "pipeline": pipeline},
+        )
+    logging.info(f"ingestion run for {pipeline} finished with status {status}")
+
+
+@contextmanager
+def pipeline_lock(engine, timeout=LOCK_TIMEOUT, pipeline=PIPELINE_NAME):
+    """MySQL named lock (GET_LOCK) serializing the writers of a pipeline.
+
+    Yields True if the lock was acquired within `timeout` seconds. The lock
+    belongs to the connection, so a crashed process never leaves it behind.
+    Other dialects (sqlite, duckdb) have a single writer anyway and always
+    get the lock.
+    """
+    if engine.dialect.name != "mysql":
+        yield True
+        return
+
+    with engine.connect() as conn:
+        acquired = conn.execute(
+            text("SELECT GET_LOCK(:name, :timeout)"),
+            {"name": pipeline, "timeout": timeout},
+        ).scalar() == 1
+        try:
+            yield acquired
+        finally:
+            if acquired:
+                conn.execute(text("SELECT RELEASE_LOCK(:name)"), {"name": pipeline})
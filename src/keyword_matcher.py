@@ -0,0 +1,91 @@
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+
+class KeywordMatcher:
+    """Counts keyword families in one pass over the tokens of each review.
+
+    All phrases of all families are compiled once into a single token trie.
+    The scan walks each review left to right, taking the longest phrase that
+    starts at the current token, Aho-Corasick style. Matches always respect
+    word boundaries: "pain" no longer matches inside "painful". A phrase
+    inside a longer matched phrase is not counted again, so the benefit
+    phrase "pain relief" no longer also counts as the side effect "pain".
+
+    The count per family is the number of distinct keywords of that family
+    found in the review, as before.
+    """
+
+    _END = "__end__"
+
+    def __init__(self, families, normalize=None):
+        self.normalize = normalize or (lambda phrase: phrase.lower().split())
+        self.families = []
+        self.keyword_family = []
+        self.trie = {}
+        for name, keywords in families.items():
+            self.add_family(name, keywords)
+
+    def add_family(self, name, keywords):
+        """Register another family; it is counted in the same pass as the others."""
+        family_id = len(self.families)
+        self.families.append(name)
+        seen = set()
+        for keyword in keywords:
+            tokens = tuple(self.normalize(keyword))
+            if not tokens or tokens in seen:
+                continue
+            seen.add(tokens)
+            node = self.trie
+            for token in tokens:
+                node = node.setdefault(token, {})
+            # the same phrase listed under two families counts for the first one
+            if self._END not in node:
+                node[self._END] = len(self.keyword_family)
+                self.keyword_family.append(family_id)
+
+    @property
+    def columns(self):
+        return list(self.families)
+
+    def match(self, text):
+        """Return the ids of the distinct keywords found in `text`."""
+        tokens = text.split() if isinstance(text, str) else []
+        found = set()
+        trie, end = self.trie, self._END
+        i, n = 0, len(tokens)
+        while i < n:
+            node = trie.get(tokens[i])
+            if node is None:
+                i += 1
+                continue
+            longest, longest_end = node.get(end), i + 1
+            j = i + 1
+            while j < n:
+                node = node.get(tokens[j])
+                if node is None:
+                    break
+                j += 1
+                if end in node:
+                    longest, longest_end = node[end], j
+            if longest is None:
+                i += 1
+            else:
+                found.add(longest)
+                i = longest_end
+        return found
+
+    def count(self, texts):
+        """Keyword counts per family for a whole chunk, one column per family."""
+        texts = list(texts)
+        counts = np.zeros((len(texts), len(self.families)), dtype=np.int16)
+        keyword_family = self.keyword_family
+        for row, text in enumerate(texts):
+            for keyword in self.match(text):
+                counts[row, keyword_family[keyword]] += 1
+        return pd.DataFrame(counts, columns=self.columns)
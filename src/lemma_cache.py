@@ -0,0 +1,161 @@
+import os
+import sys
+import sqlite3
+from collections import OrderedDict
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from logger import logging
+from nltk.stem import WordNetLemmatizer
+
+# On-disk tier shared by every run (and every worker process of a run). In
+# Airflow the cache/ folder is a mounted volume so it survives between the
+# weekly DAG runs.
+CACHE_PATH = os.getenv(
+    "LEMMA_CACHE_PATH",
+    os.path.join(os.path.dirname(__file__), '..', 'cache', 'lemma_cache.sqlite')
+)
+MAX_ENTRIES = int(os.getenv("LEMMA_CACHE_SIZE", 100000))
+
+# hits / misses of the current run, summed over every process
+_run_totals = {"hits": 0, "misses": 0}
+_cache = None
+
+
+def resource_version():
+    """Cache key namespace: a new NLTK or WordNet release invalidates every entry."""
+    import nltk
+    from nltk.corpus import wordnet
+    return f"nltk-{nltk.__version__}/wordnet-{wordnet.get_version()}"
+
+
+class LemmaCache:
+    """token -> lemma memoization: bounded in-memory LRU in front of a sqlite store."""
+
+    def __init__(self, path=CACHE_PATH, max_entries=MAX_ENTRIES, lemmatizer=None, version=None):
+        self.path = path
+        self.max_entries = max_entries
+        self.lemmatizer = lemmatizer or WordNetLemmatizer()
+        self.version = version or resource_version()
+        self.entries = OrderedDict()
+        self.pending = {}
+        self.hits = 0
+        self.misses = 0
+        self.disk_entries = 0
+        self._db = None
+        self._load()
+
+    def _connect(self):
+        if self._db is None:
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            self._db = sqlite3.connect(self.path, timeout=30)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS lemmas ("
+                "version TEXT NOT NULL, token TEXT NOT NULL, lemma TEXT NOT NULL, "
+                "PRIMARY KEY (version, token))"
+            )
+        return self._db
+
+    def _load(self):
+        """Drop entries written under another NLTK/WordNet version and warm the LRU."""
+        try:
+            db = self._connect()
+            with db:
+                db.execute("DELETE FROM lemmas WHERE version != ?", (self.version,))
+            self.disk_entries = db.execute(
+                "SELECT COUNT(*) FROM lemmas WHERE version = ?", (self.version,)
+            ).fetchone()[0]
+            rows = db.execute(
+                "SELECT token, lemma FROM lemmas WHERE version = ? LIMIT ?",
+                (self.version, self.max_entries),
+            )
+            self.entries.update(rows)
+        except (sqlite3.Error, OSError) as e:
+            # the cache is an optimisation only, never fail a run because of it
+            logging.info(f"lemma cache disabled, could not open {self.path}: {e}")
+            self._db = None
+            self.path = None
+
+    def _from_disk(self, token):
+        if self._db is None or self.disk_entries <= self.max_entries:
+            return None
+        row = self._db.execute(
+            "SELECT lemma FROM lemmas WHERE version = ? AND token = ?",
+            (self.version, token),
+        ).fetchone()
+        return row[0] if row else None
+
+    def lemmatize(self, token):
+        entries = self.entries
+        lemma = entries.get(token)
+        if lemma is not None:
+            self.hits += 1
+            entries.move_to_end(token)
+            return lemma
+
+        lemma = self._from_disk(token)
+        if lemma is not None:
+            self.hits += 1
+        else:
+            self.misses += 1
+            lemma = self.lemmatizer.lemmatize(token)
+            self.pending[token] = lemma
+
+        entries[token] = lemma
+        if len(entries) > self.max_entries:
+            entries.popitem(last=False)
+        return lemma
+
+    def flush(self):
+        """Persist lemmas computed since the last flush."""
+        if not self.pending or self.path is None:
+            self.pending.clear()
+            return
+        try:
+            db = self._connect()
+            with db:
+                db.executemany(
+                    "INSERT OR IGNORE INTO lemmas (version, token, lemma) VALUES (?, ?, ?)",
+                    [(self.version, t, l) for t, l in self.pending.items()],
+                )
+            self.disk_entries += len(self.pending)
+        except (sqlite3.Error, OSError) as e:
+            logging.info(f"lemma cache flush failed: {e}")
+        self.pending.clear()
+
+    def take_stats(self):
+        """Return (hits, misses) since the previous call and reset the counters."""
+        stats = (self.hits, self.misses)
+        self.hits = 0
+        self.misses = 0
+        return stats
+
+
+def get_cache():
+    """Process wide cache used by the serial pipeline."""
+    global _cache
+    if _cache is None:
+        _cache = LemmaCache()
+    return _cache
+
+
+def collect_stats(hits, misses):
+    _run_totals["hits"] += hits
+    _run_totals["misses"] += misses
+
+
+def report_stats():
+    """Log and reset the hit/miss counts of the current run."""
+    if _cache is not None:
+        _cache.flush()
+        collect_stats(*_cache.take_stats())
+
+    hits, misses = _run_totals["hits"], _run_totals["misses"]
+    total = hits + misses
+    hit_rate = hits / total if total else 0.0
+    logging.info(f"lemma cache: {hits} hits, {misses} misses ({hit_rate:.1%} hit rate)")
+    print(f"lemma cache: {hits} hits, {misses} misses ({hit_rate:.1%} hit rate)")
+    _run_totals["hits"] = 0
+    _run_totals["misses"] = 0
+    return {"hits": hits, "misses": misses, "hit_rate": round(hit_rate, 4)}
@@ -0,0 +1,184 @@
+import os
+import sys
+import json
+import hashlib
+import argparse
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+import nltk
+from logger import logging
+
+# Pinned, local NLTK data directory. It is filled once by `provision` (at
+# image build time) and only ever read afterwards, so preprocessing runs never
+# touch the network and work on air-gapped workers.
+NLTK_DATA_DIR = os.path.abspath(os.getenv(
+    "NLTK_DATA_DIR",
+    os.path.join(os.path.dirname(__file__), '..', 'nltk_data')
+))
+MANIFEST_FILE = "manifest.json"
+# Committed pins: the nltk version and the sha256 of every package archive.
+# provision only accepts downloads matching them; `lock` rewrites the file
+# (on purpose, after reviewing an upstream change) and the result is committed.
+LOCK_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "nltk_data.lock.json")
+
+# package id -> resource path as used by nltk.data.find
+RESOURCES = {
+    "punkt": "tokenizers/punkt",
+    "punkt_tab": "tokenizers/punkt_tab",
+    "stopwords": "corpora/stopwords",
+    "wordnet": "corpora/wordnet",
+}
+
+_ready_dir = None
+
+
+def _sha256(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _checksums(data_dir):
+    checksums = {}
+    for root, _, files in os.walk(data_dir):
+        for name in files:
+            path = os.path.join(root, name)
+            relative = os.path.relpath(path, data_dir)
+            if relative != MANIFEST_FILE:
+                checksums[relative] = _sha256(path)
+    return checksums
+
+
+def _package_archive(data_dir, package):
+    """The zip nltk.download leaves next to the unpacked package."""
+    return os.path.join(data_dir, os.path.dirname(RESOURCES[package]), f"{package}.zip")
+
+
+def _download(data_dir):
+    """Download every package into data_dir; returns {package: sha256 of its archive}."""
+    os.makedirs(data_dir, exist_ok=True)
+    archives = {}
+    for package in RESOURCES:
+        if not nltk.download(package, download_dir=data_dir, quiet=True, raise_on_error=True):
+            raise RuntimeError(f"could not download NLTK package {package}")
+        archives[package] = _sha256(_package_archive(data_dir, package))
+    return archives
+
+
+def read_lock(lock_path=LOCK_FILE):
+    with open(lock_path) as f:
+        return json.load(f)
+
+
+def lock(data_dir, lock_path=LOCK_FILE):
+    """Pin the installed nltk version and the archives it downloads now (maintainers only)."""
+    pins = {
+        "nltk_version": nltk.__version__,
+        "packages": dict(sorted(_download(data_dir).items())),
+    }
+    with open(lock_path, "w") as f:
+        json.dump(pins, f, indent=2)
+        f.write("\n")
+    logging.info(f"NLTK packages pinned in {lock_path}: {sorted(pins['packages'])}")
+    return pins
+
+
+def provision(data_dir=NLTK_DATA_DIR, lock_path=LOCK_FILE):
+    """One time download into data_dir and write the checksum manifest (image builds only).
+
+    Fails unless the installed nltk and every downloaded archive match the
+    committed lock file.
+    """
+    pins = read_lock(lock_path)
+    if nltk.__version__ != pins["nltk_version"]:
+        raise RuntimeError(
+            f"nltk {nltk.__version__} installed, {lock_path} pins {pins['nltk_version']}"
+        )
+    archives = _download(data_dir)
+    for package, digest in archives.items():
+        expected = pins["packages"].get(package)
+        if expected is None:
+            raise RuntimeError(
+                f"no pinned checksum for NLTK package {package} in {lock_path}, run "
+                f"`python src/nltk_resources.py lock` and commit the file"
+            )
+        if digest != expected:
+            raise RuntimeError(
+                f"NLTK package {package} changed upstream (sha256 {digest}, pinned {expected}), "
+                f"review it and re-lock"
+            )
+
+    manifest = {
+        "nltk_version": nltk.__version__,
+        "resources": sorted(RESOURCES),
+        "packages": archives,
+        "files": _checksums(data_dir),
+    }
+    with open(os.path.join(data_dir, MANIFEST_FILE), "w") as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    logging.info(f"NLTK resources provisioned in {data_dir} ({len(manifest['files'])} files)")
+    return manifest
+
+
+def verify(data_dir=NLTK_DATA_DIR):
+    """Check every file listed in the manifest is present and unchanged."""
+    manifest_path = os.path.join(data_dir, MANIFEST_FILE)
+    if not os.path.exists(manifest_path):
+        raise RuntimeError(
+            f"no NLTK manifest in {data_dir}, run `python src/nltk_resources.py provision` "
+            f"when building the image"
+        )
+    with open(manifest_path) as f:
+        manifest = json.load(f)
+
+    if manifest.get("nltk_version") != nltk.__version__:
+        raise RuntimeError(
+            f"NLTK data in {data_dir} was provisioned with nltk {manifest.get('nltk_version')}, "
+            f"nltk {nltk.__version__} is installed; pin the same version in every image"
+        )
+    missing = set(RESOURCES) - set(manifest["resources"])
+    if missing:
+        raise RuntimeError(f"NLTK data in {data_dir} lacks {sorted(missing)}, re-provision it")
+
+    for relative, expected in manifest["files"].items():
+        path = os.path.join(data_dir, relative)
+        if not os.path.exists(path) or _sha256(path) != expected:
+            raise RuntimeError(f"NLTK data file {path} is missing or corrupted, re-provision it")
+    return manifest
+
+
+def ensure_resources(data_dir=NLTK_DATA_DIR):
+    """Verify the pinned data directory and load the corpora, once per process.
+
+    Never downloads anything: a missing or corrupted directory is an error.
+    """
+    global _ready_dir
+    if _ready_dir == data_dir:
+        return
+    verify(data_dir)
+    if data_dir not in nltk.data.path:
+        nltk.data.path.insert(0, data_dir)
+
+    from nltk.corpus import stopwords, wordnet
+    stopwords.words("english")
+    wordnet.ensure_loaded()
+    _ready_dir = data_dir
+    logging.info(f"NLTK resources loaded from {data_dir}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="manage the pinned NLTK data directory")
+    parser.add_argument("command", choices=["provision", "verify", "lock"])
+    parser.add_argument("--data-dir", default=NLTK_DATA_DIR)
+    args = parser.parse_args()
+
+    if args.command == "lock":
+        print(lock(args.data_dir))
+        sys.exit(0)
+    if args.command == "provision":
+        provision(args.data_dir)
+    verify(args.data_dir)
+    print(f"NLTK data in {args.data_dir} verified")
@@ -0,0 +1,86 @@
+import os
+import sys
+import atexit
+from concurrent.futures import ProcessPoolExecutor
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from logger import logging
+from nltk_resources import ensure_resources
+from text_normalizer import TextNormalizer
+from lemma_cache import LemmaCache, collect_stats
+
+# PREPROCESS_WORKERS=1 keeps everything in the calling process (serial fallback,
+# easier to debug and profile)
+WORKERS = int(os.getenv("PREPROCESS_WORKERS", os.cpu_count() or 1))
+BATCH_SIZE = int(os.getenv("PREPROCESS_BATCH_SIZE", 1000))
+
+# per process normalizer (stopword set + cached lemmatizer), built once by init_worker
+_normalizer = None
+_lemma_cache = None
+
+_pool = None
+_pool_workers = None
+
+
+def init_worker():
+    global _normalizer, _lemma_cache
+    ensure_resources()
+    _lemma_cache = LemmaCache()
+    _normalizer = TextNormalizer(lemmatize=_lemma_cache.lemmatize)
+
+
+def normalize_batch(texts):
+    """Normalize a batch and return it with the lemma cache (hits, misses) it produced.
+
+    New lemmas are written to the shared on-disk cache after every batch so
+    other workers and later runs can reuse them.
+    """
+    if _normalizer is None:
+        init_worker()
+    reviews = [_normalizer.normalize(t) for t in texts]
+    _lemma_cache.flush()
+    return reviews, _lemma_cache.take_stats()
+
+
+def get_pool(workers=WORKERS):
+    """Return a process pool that stays alive across chunks of the same run."""
+    global _pool, _pool_workers
+    if _pool is None or _pool_workers != workers:
+        shutdown_pool()
+        _pool = ProcessPoolExecutor(max_workers=workers, initializer=init_worker)
+        _pool_workers = workers
+        logging.info(f"preprocessing process pool started with {workers} workers")
+    return _pool
+
+
+def shutdown_pool():
+    global _pool, _pool_workers
+    if _pool is not None:
+        _pool.shutdown()
+        _pool = None
+        _pool_workers = None
+
+
+atexit.register(shutdown_pool)
+
+
+def normalize_reviews(reviews, workers=WORKERS, batch_size=BATCH_SIZE):
+    """Normalize reviews across a process pool, keeping the input order.
+
+    Reviews are split into contiguous batches and `map` returns the batches
+    in submission order, so the output is identical to the serial path no
+    matter how the work is scheduled.
+    """
+    reviews = list(reviews)
+    if workers <= 1 or len(reviews) <= batch_size:
+        results = [normalize_batch(reviews)]
+    else:
+        batches = [reviews[i:i + batch_size] for i in range(0, len(reviews), batch_size)]
+        results = get_pool(workers).map(normalize_batch, batches)
+
+    normalized = []
+    for batch, stats in results:
+        normalized.extend(batch)
+        collect_stats(*stats)
+    return normalized
@@ -0,0 +1,100 @@
+import json
+from dataclasses import dataclass, field, asdict
+
+import pandas as pd
+
+# Result of the per drug property analysis. The analyzer returns this object
+# and the apps read its fields; markdown is only produced by render_markdown.
+# to_dict() is plain JSON types, so it is what gets cached or sent over an API.
+
+# part of the cache version, bump when the fields change
+FORMAT_VERSION = 1
+
+
+@dataclass
+class ConditionShare:
+    name: str
+    reviews: int
+    percentage: float
+
+
+@dataclass
+class PropertyAnalysis:
+    drug_name: str
+    reviews: int = 0
+    avg_rating: float = None
+    # property name -> reviews mentioning it / share of the reviews (0..100, 1 decimal)
+    counts: dict = field(default_factory=dict)
+    percentages: dict = field(default_factory=dict)
+    # the most common conditions, most reviewed first
+    top_conditions: list = field(default_factory=list)
+
+    @property
+    def empty(self):
+        return self.reviews == 0
+
+    def to_dict(self):
+        return asdict(self)
+
+    @classmethod
+    def from_dict(cls, data):
+        data = dict(data)
+        data["top_conditions"] = [
+            condition if isinstance(condition, ConditionShare) else ConditionShare(**condition)
+            for condition in data.get("top_conditions", [])
+        ]
+        return cls(**data)
+
+    def to_json(self):
+        return json.dumps(self.to_dict(), separators=(",", ":"))
+
+    @classmethod
+    def from_json(cls, payload):
+        return cls.from_dict(json.loads(payload))
+
+    def to_msgpack(self):
+        import msgpack  # optional, only needed by API consumers that ask for it
+
+        return msgpack.packb(self.to_dict())
+
+    @classmethod
+    def from_msgpack(cls, payload):
+        import msgpack
+
+        return cls.from_dict(msgpack.unpackb(payload))
+
+
+def property_label(name):
+    return name.replace("_", " ").title()
+
+
+def render_markdown(analysis):
+    """The markdown lines get_drug_property_percentages used to return."""
+    if analysis.empty:
+        return [f"No reviews found for {analysis.drug_name}"]
+
+    lines = [f"**Most Common Conditions for {analysis.drug_name}:**"]
+    for condition in analysis.top_conditions:
+        lines.append(f"- {condition.name}: {condition.reviews} reviews ({condition.percentage:.1f}%)")
+
+    lines.append("\n**Medical Properties Analysis:**")
+    for prop, pct in analysis.percentages.items():
+        lines.append(f"- {pct}% of reviews mention {property_label(prop)}")
+
+    rating = "n/a" if analysis.avg_rating is None else f"{analysis.avg_rating:.1f}"
+    lines.append(f"\n**Overall Stats:** {analysis.reviews} reviews, Avg rating: {rating}/10")
+    return lines
+
+
+def comparison_frame(analyses):
+    """Side-by-side table of several analyses: one column per drug."""
+    columns = {}
+    for analysis in analyses:
+        top = analysis.top_conditions[0].name if analysis.top_conditions else "N/A"
+        rating = None if analysis.avg_rating is None else round(analysis.avg_rating, 1)
+        column = {"Reviews": analysis.reviews, "Avg rating": rating, "Top condition": top}
+        column.update({
+            f"{property_label(prop)} (%)": pct for prop, pct in analysis.percentages.items()
+        })
+        columns[analysis.drug_name] = column
+    return pd.DataFrame(columns)
@@ -0,0 +1,469 @@
+import os
+import re
+import sys
+import json
+import hashlib
+import argparse
+
+import numpy as np
+import pandas as pd
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from sqlalchemy import text
+from sqlalchemy.exc import DBAPIError
+from logger import logging
+from db import add_column
+from ingestion_state import NO_WATERMARK
+
+medical_properties = {
+    # Side Effects - EXPANDED
+    'causes_drowsiness': [
+        'drowsy', 'sleepy', 'tired', 'fatigue', 'fatigued', 'sedation', 'sedated', 
+        'lethargic', 'lethargy', 'sleepiness', 'drowsiness', 'makes me sleep', 
+        'can\'t stay awake', 'falling asleep', 'heavy eyes', 'exhausted', 'worn out',
+        'need to nap', 'daytime sleepiness', 'hard to stay awake', 'zombie', 'zoned out'
+    ],
+    
+    'causes_nausea': [
+        'nausea', 'nauseous', 'sick to stomach', 'queasy', 'queasiness', 'vomiting', 
+        'throw up', 'throwing up', 'puking', 'sick', 'feel sick', 'stomach sick',
+        'upset stomach', 'sick feeling', 'gag', 'gagging', 'retch', 'dry heaves'
+    ],
+    
+    'causes_headache': [
+        'headache', 'migraine', 'head pain', 'head pounding', 'head hurts', 
+        'head throbbing', 'head ache', 'head pressure', 'head splitting',
+        'tension headache', 'cluster headache', 'head pain', 'head discomfort',
+        'head sore', 'head pounding', 'head throbs'
+    ],
+    
+    'causes_dizziness': [
+        'dizzy', 'dizziness', 'lightheaded', 'light-headed', 'vertigo', 'woozy',
+        'unsteady', 'off balance', 'balance problems', 'room spinning',
+        'feel faint', 'faintness', 'dizzy spells', 'vertigo', 'spinning sensation'
+    ],
+    
+    'causes_digestive_issues': [
+        'stomach pain', 'stomach ache', 'abdominal pain', 'diarrhea', 'diarrhoea',
+        'constipation', 'upset stomach', 'indigestion', 'heartburn', 'acid reflux',
+        'bloating', 'bloated', 'gas', 'gassy', 'stomach cramps', 'cramping',
+        'bowel problems', 'digestive issues', 'stomach issues', 'GI problems'
+    ],
+    
+    # Effectiveness - EXPANDED
+    'effective_pain_relief': [
+        'pain relief', 'relieves pain', 'pain gone', 'helps pain', 'eases pain',
+        'pain free', 'no pain', 'pain disappeared', 'pain reduced', 'pain better',
+        'manages pain', 'controls pain', 'pain subsided', 'pain went away',
+        'alleviates pain', 'reduces pain', 'pain diminishing', 'pain decreasing'
+    ],
+    
+    'quick_acting': [
+        'works fast', 'quick relief', 'within minutes', 'immediate', 'fast acting',
+        'acts quickly', 'rapid relief', 'fast working', 'quick results', 'soon after',
+        'minutes later', 'fast effect', 'quick acting', 'speedy relief', 'prompt relief',
+        'almost instantly', 'right away', 'within half hour', '30 minutes'
+    ],
+    
+    'long_lasting': [
+        'lasts long', 'all day', '24 hour', 'extended relief', 'long lasting',
+        'all night', 'through the night', 'lasts hours', 'long duration',
+        'sustained relief', 'continuous relief', 'lasts all day', 'works all day',
+        'extended release', 'time released', 'slow release', 'prolonged effect'
+    ],
+    
+    'highly_effective': [
+        'very effective', 'extremely effective', 'works great', 'excellent results',
+        'amazing results', 'fantastic', 'wonderful', 'outstanding', 'superb',
+        'highly effective', 'very good', 'excellent', 'great results', 'works perfectly',
+        'does the job', 'exactly what I needed', 'perfect solution', 'best ever'
+    ],
+    
+    # Practical Aspects - EXPANDED
+    'easy_to_use': [
+        'easy to take', 'convenient', 'simple', 'user friendly', 'easy to use',
+        'easy administration', 'simple to take', 'no hassle', 'straightforward',
+        'convenient dosing', 'easy dosage', 'simple instructions', 'user-friendly',
+        'easy to swallow', 'easy to remember', 'convenient packaging'
+    ],
+    
+    'cost_issues': [
+        'expensive', 'costly', 'pricey', 'insurance won\'t cover', 'too expensive',
+        'high cost', 'price is high', 'cost too much', 'expensive medication',
+        'can\'t afford', 'pricey prescription', 'cost burden', 'financial strain',
+        'insurance denied', 'co-pay high', 'out of pocket', 'not covered'
+    ],
+    
+    'tolerable': [
+        'well tolerated', 'gentle', 'no side effects', 'smooth', 'easy on stomach',
+        'no problems', 'no issues', 'well tolerated', 'no adverse effects',
+        'no reaction', 'handled well', 'no complications', 'smooth experience',
+        'comfortable', 'no discomfort', 'easy transition'
+    ],
+    
+    # Specific Conditions - EXPANDED
+    'helps_sleep': [
+        'helps sleep', 'sleep better', 'fall asleep', 'improved sleep', 'sleep well',
+        'better sleep', 'sleep through night', 'restful sleep', 'deep sleep',
+        'sleep quality', 'sleep improved', 'easier to sleep', 'sleep aid',
+        'promotes sleep', 'induces sleep', 'sleep enhancement', 'sleep pattern',
+        'no insomnia', 'sleep disturbance gone'
+    ],
+    
+    'reduces_anxiety': [
+        'calms anxiety', 'less anxious', 'reduces stress', 'relaxing', 'calming',
+        'anxiety relief', 'panic attacks reduced', 'anxiousness gone', 'calm feeling',
+        'reduces worry', 'less stressed', 'stress relief', 'anxiety better',
+        'nervousness reduced', 'peaceful', 'serene', 'tranquil', 'at ease'
+    ],
+    
+    'improves_mood': [
+        'improves mood', 'feel better', 'happier', 'mood lift', 'better mood',
+        'mood enhancement', 'depression better', 'less depressed', 'mood improved',
+        'emotional balance', 'stable mood', 'mood elevation', 'positive mood',
+        'outlook improved', 'happier feelings', 'emotional well-being'
+    ],
+    
+    'increases_energy': [
+        'more energy', 'energetic', 'less fatigued', 'pep', 'energy boost',
+        'increased energy', 'less tired', 'vitality', 'energized', 'revitalized',
+        'energy levels up', 'no fatigue', 'renewed energy', 'active again',
+        'productivity improved', 'mental energy', 'physical energy'
+    ]
+}
+
+
+# Every processed_data row stores the properties its review mentions as a
+# bitmask (property_mask). The property_lexicon table records which bit each
+# property owns and the hash of the keywords the stored bits were computed
+# with, so a lexicon change only recomputes the bits of the properties that
+# changed.
+LEXICON_TABLE = "property_lexicon"
+MASK_COLUMN = "property_mask"
+REFRESH_CHUNK_SIZE = 5000
+
+
+def keywords_hash(keywords):
+    return hashlib.sha256(json.dumps(sorted(set(keywords))).encode()).hexdigest()
+
+
+def lexicon_hashes(properties=None):
+    properties = medical_properties if properties is None else properties
+    return {name: keywords_hash(keywords) for name, keywords in properties.items()}
+
+
+def lexicon_version(properties=None):
+    """Short hash identifying the whole lexicon."""
+    hashes = lexicon_hashes(properties)
+    payload = json.dumps(sorted(hashes.items())).encode()
+    return hashlib.sha256(payload).hexdigest()[:12]
+
+
+LEXICON_VERSION = lexicon_version()
+
+
+def _trie_pattern(trie):
+    """Regex of a character trie: shared prefixes are matched once and the
+    longest keyword wins, since a shorter one only ends in an optional group."""
+    branches = [re.escape(ch) + _trie_pattern(child) for ch, child in sorted(trie.items()) if ch]
+    if not branches:
+        return ""
+    pattern = branches[0] if len(branches) == 1 else "(?:" + "|".join(branches) + ")"
+    if "" in trie:
+        pattern = f"(?:{pattern})?"
+    return pattern
+
+
+class PropertyMatcher:
+    """Every keyword of the lexicon compiled into one regex, evaluated in a
+    single pass per review.
+
+    Same semantics as searching each property's keywords separately
+    (case-insensitive substring match, keywords taken literally). The
+    pattern is a lookahead, so it reports the longest keyword starting at
+    every position of the review; a keyword hidden inside a longer match
+    ("pain" in "pain relief") is recovered through `implied`, which maps
+    each keyword to the properties of every keyword it contains.
+
+    Arrow backed string columns (pandas' default string dtype with pyarrow)
+    are matched in C++ instead, one vectorized pass per property over the
+    same escaped keywords, which beats any per review Python loop.
+    """
+
+    def __init__(self, properties=None):
+        properties = medical_properties if properties is None else properties
+        self.names = list(properties)
+        if len(self.names) > 63:
+            raise ValueError("a property mask holds at most 63 properties")
+
+        owners = {}
+        for i, name in enumerate(self.names):
+            for keyword in properties[name]:
+                keyword = keyword.lower()
+                owners[keyword] = owners.get(keyword, 0) | (1 << i)
+        self.implied = {}
+        for keyword in owners:
+            implied = 0
+            for other, mask in owners.items():
+                if other in keyword:
+                    implied |= mask
+            self.implied[keyword] = implied
+
+        trie = {}
+        for keyword in owners:
+            node = trie
+            for ch in keyword:
+                node = node.setdefault(ch, {})
+            node[""] = {}
+        self.pattern = re.compile(f"(?=({_trie_pattern(trie)}))")
+        self.property_patterns = [
+            "|".join(re.escape(keyword.lower()) for keyword in properties[name])
+            for name in self.names
+        ]
+
+    def mask(self, review):
+        """Properties mentioned by one review, bit i for self.names[i]."""
+        if not isinstance(review, str):
+            return 0
+        mask = 0
+        for keyword in set(self.pattern.findall(review.lower())):
+            mask |= self.implied[keyword]
+        return mask
+
+    def masks(self, reviews):
+        dtype = getattr(reviews, "dtype", None)
+        if isinstance(dtype, pd.ArrowDtype) or getattr(dtype, "storage", None) == "pyarrow":
+            return self._arrow_masks(reviews)
+        reviews = list(reviews)
+        return np.fromiter((self.mask(r) for r in reviews), dtype=np.int64, count=len(reviews))
+
+    def _arrow_masks(self, reviews):
+        import pyarrow as pa
+        import pyarrow.compute as pc
+
+        lowered = pc.utf8_lower(pa.array(reviews))
+        masks = np.zeros(len(lowered), dtype=np.int64)
+        for i, pattern in enumerate(self.property_patterns):
+            hit = pc.match_substring_regex(lowered, pattern).fill_null(False)
+            masks[hit.to_numpy(zero_copy_only=False)] |= np.int64(1) << i
+        return masks
+
+    def matrix(self, reviews):
+        """reviews x properties boolean frame."""
+        masks = self.masks(reviews)
+        hits = (masks[:, None] >> np.arange(len(self.names), dtype=np.int64)) & 1 == 1
+        return pd.DataFrame(hits, columns=self.names)
+
+
+_matcher = None
+
+
+def get_matcher():
+    global _matcher
+    if _matcher is None:
+        _matcher = PropertyMatcher()
+    return _matcher
+
+
+def default_bits(properties=None):
+    properties = medical_properties if properties is None else properties
+    return {name: bit for bit, name in enumerate(properties)}
+
+
+def compute_masks(reviews, bits, properties=None):
+    """Bitmask of the properties mentioned by each review (int64 array).
+
+    properties limits the result to those properties' bits.
+    """
+    matcher = get_matcher()
+    names = list(bits) if properties is None else list(properties)
+    found = matcher.masks(reviews)
+    masks = np.zeros(len(found), dtype=np.int64)
+    for i, name in enumerate(matcher.names):
+        if name in names:
+            masks[(found >> i) & 1 == 1] |= np.int64(1) << bits[name]
+    return masks
+
+
+def mask_matrix(masks, bits):
+    """reviews x properties boolean frame from an array of masks."""
+    masks = np.asarray(masks, dtype=np.int64)
+    return pd.DataFrame(
+        {name: (masks >> bit) & 1 == 1 for name, bit in bits.items()}
+    )
+
+
+# ---------------------------------------------------------------------------
+# Database side
+# ---------------------------------------------------------------------------
+
+def ensure_lexicon_schema(engine):
+    with engine.begin() as conn:
+        conn.execute(text(f"""
+        CREATE TABLE IF NOT EXISTS {LEXICON_TABLE} (
+            property_name VARCHAR(100) NOT NULL PRIMARY KEY,
+            bit INT NOT NULL,
+            keywords_hash CHAR(64) NOT NULL
+        )
+        """))
+    add_column(engine, "processed_data", MASK_COLUMN, "BIGINT NULL")
+
+
+def stored_lexicon(engine):
+    """{property_name: (bit, keywords_hash)} as recorded in property_lexicon."""
+    with engine.connect() as conn:
+        rows = conn.execute(text(
+            f"SELECT property_name, bit, keywords_hash FROM {LEXICON_TABLE}"
+        )).fetchall()
+    return {name: (int(bit), h) for name, bit, h in rows}
+
+
+def property_bits(engine):
+    """Bit of every current property; new properties get the lowest free bit.
+
+    Existing bits are never moved, so stored masks stay valid. New
+    properties are recorded with an empty hash, which marks their bit as
+    not computed yet for existing rows.
+    """
+    ensure_lexicon_schema(engine)
+    stored = stored_lexicon(engine)
+    bits = {name: stored[name][0] for name in medical_properties if name in stored}
+    used = {bit for bit, _ in stored.values()}
+    new = [name for name in medical_properties if name not in stored]
+    for name in new:
+        bit = next(b for b in range(63) if b not in used)
+        used.add(bit)
+        bits[name] = bit
+    if new:
+        with engine.begin() as conn:
+            for name in new:
+                conn.execute(
+                    text(f"INSERT INTO {LEXICON_TABLE} (property_name, bit, keywords_hash) "
+                         f"VALUES (:name, :bit, '')"),
+                    {"name": name, "bit": bits[name]},
+                )
+        logging.info(f"property bits assigned for {new}")
+    return {name: bits[name] for name in medical_properties}
+
+
+def load_property_bits(engine):
+    """Bits property_bits recorded, read only (partition tasks never write the lexicon)."""
+    try:
+        stored = stored_lexicon(engine)
+    except DBAPIError:
+        stored = {}  # no lexicon table yet
+    missing = [name for name in medical_properties if name not in stored]
+    if missing:
+        raise RuntimeError(f"no bit recorded for {missing}, property_bits has to run first")
+    return {name: stored[name][0] for name in medical_properties}
+
+
+def current_property_bits(engine):
+    """{property: bit} when every stored bit was computed with the current
+    keywords, None while the maintenance job still has work to do."""
+    try:
+        stored = stored_lexicon(engine)
+    except Exception:
+        return None
+    current = lexicon_hashes()
+    if set(stored) != set(current) or any(stored[n][1] != h for n, h in current.items()):
+        return None
+    return {name: stored[name][0] for name in medical_properties}
+
+
+def masks_are_current(engine):
+    return current_property_bits(engine) is not None
+
+
+def refresh_property_bits(engine, chunk_size=REFRESH_CHUNK_SIZE):
+    """Maintenance job: bring every stored mask in line with the current lexicon.
+
+    Only the bits of properties whose keywords changed (or that were added
+    or removed) are recomputed; rows without a mask yet get all bits.
+    Returns the number of rows updated.
+    """
+    bits = property_bits(engine)
+    stored = stored_lexicon(engine)
+    current = lexicon_hashes()
+    changed = [name for name in medical_properties if stored[name][1] != current[name]]
+    removed = [name for name in stored if name not in current]
+
+    keep = ~np.int64(0)
+    for name in changed:
+        keep &= ~(np.int64(1) << bits[name])
+    for name in removed:
+        keep &= ~(np.int64(1) << stored[name][0])
+
+    missing_query = text(
+        f"SELECT uniqueID FROM processed_data WHERE {MASK_COLUMN} IS NULL LIMIT 1"
+    )
+    with engine.connect() as conn:
+        has_missing = conn.execute(missing_query).first() is not None
+    if not changed and not removed and not has_missing:
+        logging.info(f"property masks up to date (lexicon {LEXICON_VERSION})")
+        return 0
+
+    logging.info(f"refreshing property bits: changed={changed} removed={removed} "
+                 f"missing masks={has_missing}")
+    select = text(f"""
+        SELECT uniqueID, review, {MASK_COLUMN}
+        FROM processed_data
+        WHERE uniqueID > :after_id
+        ORDER BY uniqueID
+        LIMIT :chunk_size
+    """)
+    update = text(f"UPDATE processed_data SET {MASK_COLUMN} = :mask WHERE uniqueID = :uid")
+    after_id, updated = NO_WATERMARK, 0
+    while True:
+        chunk = pd.read_sql(select, engine, params={"after_id": after_id, "chunk_size": chunk_size})
+        if chunk.empty:
+            break
+        after_id = int(chunk["uniqueID"].iloc[-1])
+
+        old = chunk[MASK_COLUMN]
+        missing = old.isna().to_numpy()
+        masks = old.fillna(0).astype(np.int64).to_numpy() & keep
+        if changed:
+            masks |= compute_masks(chunk["review"], bits, properties=changed)
+        if missing.any():
+            masks[missing] = compute_masks(chunk.loc[missing, "review"], bits)
+
+        rows = [
+            {"mask": int(m), "uid": int(u)}
+            for m, u, o, miss in zip(masks, chunk["uniqueID"], old, missing)
+            if miss or int(o) != int(m)
+        ]
+        if rows:
+            with engine.begin() as conn:
+                conn.execute(update, rows)
+        updated += len(rows)
+        if len(chunk) < chunk_size:
+            break
+
+    with engine.begin() as conn:
+        for name in changed:
+            conn.execute(
+                text(f"UPDATE {LEXICON_TABLE} SET keywords_hash = :h WHERE property_name = :name"),
+                {"h": current[name], "name": name},
+            )
+        for name in removed:
+            conn.execute(
+                text(f"DELETE FROM {LEXICON_TABLE} WHERE property_name = :name"), {"name": name}
+            )
+    logging.info(f"property masks refreshed for {updated} rows (lexicon {LEXICON_VERSION})")
+    return updated
+
+
+if __name__ == "__main__":
+    from db import get_engine
+
+    parser = argparse.ArgumentParser(description="property bitmask maintenance")
+    parser.add_argument("command", choices=["refresh", "status"])
+    args = parser.parse_args()
+
+    engine = get_engine()
+    if args.command == "refresh":
+        print(f"{refresh_property_bits(engine)} rows updated")
+    else:
+        print(f"lexicon {LEXICON_VERSION}, masks current: {masks_are_current(engine)}")
@@ -0,0 +1,238 @@
+import os
+import sys
+import time
+import hashlib
+import argparse
+from collections import OrderedDict
+
+import pandas as pd
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from sqlalchemy import text, bindparam
+from sqlalchemy.exc import DBAPIError
+from logger import logging
+from db import add_column
+from text_normalizer import clean_text
+
+# The corpus carries many verbatim duplicate reviews (e.g. the same text filed
+# under a brand and a generic name). Every processed column that is derived
+# from the review text (lemmatized review, keyword counts, property mask) only
+# depends on clean_text(review), so a review whose cleaned text was already
+# processed reuses that output instead of going through the stages again.
+#
+# processed_data.content_hash is the hash of the cleaned text and canonical_id
+# the uniqueID of the row whose output was reused (itself for the first
+# occurrence). Analytics count a duplicated review once with
+# DISTINCT_REVIEWS, or as-is without it.
+HASH_COLUMN = "content_hash"
+CANONICAL_COLUMN = "canonical_id"
+DEDUP_COLUMNS = [HASH_COLUMN, CANONICAL_COLUMN]
+# columns copied from the canonical row to its duplicates
+REUSED_COLUMNS = ["review", "benefit_mentions", "side_effect_mentions", "property_mask"]
+DISTINCT_REVIEWS = f"({CANONICAL_COLUMN} IS NULL OR {CANONICAL_COLUMN} = uniqueID)"
+
+DEDUP_ENABLED = os.getenv("PREPROCESS_DEDUP", "1") == "1"
+# processed outputs kept in memory by a run, beyond that they are looked up again
+MAX_ENTRIES = int(os.getenv("PREPROCESS_DEDUP_CACHE_SIZE", 200000))
+LOOKUP_BATCH_SIZE = 1000
+
+
+def content_hash(review):
+    """Hash of the normalized review text (32 hex chars)."""
+    return hashlib.blake2b(clean_text(review).encode(), digest_size=16).hexdigest()
+
+
+def ensure_dedup_schema(engine):
+    add_column(engine, "processed_data", HASH_COLUMN, "CHAR(32) NULL")
+    add_column(engine, "processed_data", CANONICAL_COLUMN, "BIGINT NULL")
+
+    if engine.dialect.name != "mysql":
+        with engine.begin() as conn:
+            conn.execute(text(
+                f"CREATE INDEX IF NOT EXISTS ix_processed_data_content_hash "
+                f"ON processed_data ({HASH_COLUMN})"
+            ))
+        return
+    if _hash_index_exists(engine):
+        return
+    try:
+        with engine.begin() as conn:
+            conn.execute(text(
+                f"CREATE INDEX ix_processed_data_content_hash ON processed_data ({HASH_COLUMN})"
+            ))
+    except DBAPIError:
+        # created by a concurrent run between the check and the CREATE
+        if not _hash_index_exists(engine):
+            raise
+
+
+def _hash_index_exists(engine):
+    with engine.connect() as conn:
+        return bool(conn.execute(text("""
+            SELECT COUNT(*) FROM information_schema.statistics
+            WHERE table_schema = DATABASE() AND table_name = 'processed_data'
+              AND index_name = 'ix_processed_data_content_hash'
+        """)).scalar())
+
+
+class ReviewDeduplicator:
+    """Splits the reviews whose processed output is already known off a chunk.
+
+    Known outputs come from the earlier chunks of the run (kept in memory,
+    they may not be committed yet) or from the canonical rows already stored
+    in processed_data.
+    """
+
+    def __init__(self, engine, max_entries=MAX_ENTRIES):
+        self.engine = engine
+        self.max_entries = max_entries
+        # content hash -> (canonical uniqueID, review, benefit, side effect, mask)
+        self.outputs = OrderedDict()
+        self.rows = 0
+        self.duplicates = 0
+        self.seconds = 0.0
+
+    def _remember(self, hash_, output):
+        self.outputs[hash_] = output
+        self.outputs.move_to_end(hash_)
+        if len(self.outputs) > self.max_entries:
+            self.outputs.popitem(last=False)
+
+    def _lookup(self, hashes):
+        """Outputs of the stored canonical rows of `hashes` (lowest uniqueID wins)."""
+        query = text(f"""
+            SELECT {HASH_COLUMN}, uniqueID, {", ".join(REUSED_COLUMNS)}
+            FROM processed_data
+            WHERE {HASH_COLUMN} IN :hashes AND uniqueID = {CANONICAL_COLUMN}
+            ORDER BY uniqueID
+        """).bindparams(bindparam("hashes", expanding=True))
+        for i in range(0, len(hashes), LOOKUP_BATCH_SIZE):
+            stored = pd.read_sql(query, self.engine, params={"hashes": hashes[i:i + LOOKUP_BATCH_SIZE]})
+            for row in stored.drop_duplicates(HASH_COLUMN).itertuples(index=False):
+                self._remember(row[0], tuple(row[1:]))
+
+    def split(self, chunk):
+        """(rows to process, duplicate rows) of a raw chunk; both carry content_hash."""
+        start = time.perf_counter()
+        chunk = chunk.copy()
+        chunk[HASH_COLUMN] = [content_hash(review) for review in chunk["review"]]
+
+        unknown = [h for h in chunk[HASH_COLUMN].unique() if h not in self.outputs]
+        if unknown:
+            self._lookup(unknown)
+
+        known = chunk[HASH_COLUMN].isin(self.outputs.keys()).to_numpy()
+        # the first occurrence of a new text is processed, later ones in the chunk reuse it
+        repeated = chunk[HASH_COLUMN].duplicated().to_numpy()
+        duplicate = known | repeated
+        self.rows += len(chunk)
+        self.duplicates += int(duplicate.sum())
+        self.seconds += time.perf_counter() - start
+        return chunk[~duplicate], chunk[duplicate]
+
+    def merge(self, processed, rows, duplicates):
+        """Processed rows plus the duplicates filled from their canonical rows, in uniqueID order.
+
+        `rows` and `duplicates` are the frames split() returned; `processed`
+        is `rows` after the pipeline stages.
+        """
+        start = time.perf_counter()
+        columns = list(processed.columns) + DEDUP_COLUMNS
+        processed = processed.copy()
+        processed[HASH_COLUMN] = processed["uniqueID"].map(rows.set_index("uniqueID")[HASH_COLUMN])
+        processed[CANONICAL_COLUMN] = processed["uniqueID"]
+        outputs = {
+            row[0]: tuple(row[1:])
+            for row in processed[[HASH_COLUMN, "uniqueID"] + REUSED_COLUMNS].itertuples(index=False)
+        }
+
+        if not duplicates.empty:
+            duplicates = duplicates.copy()
+            reused = [outputs.get(h) or self.outputs[h] for h in duplicates[HASH_COLUMN]]
+            duplicates[CANONICAL_COLUMN] = [output[0] for output in reused]
+            for i, name in enumerate(REUSED_COLUMNS, start=1):
+                duplicates[name] = [output[i] for output in reused]
+            processed = pd.concat([processed, duplicates[columns]], ignore_index=True)
+            processed = processed.sort_values("uniqueID", ignore_index=True)
+
+        for hash_, output in outputs.items():
+            self._remember(hash_, output)
+        self.seconds += time.perf_counter() - start
+        return processed[columns]
+
+    def report(self, processing_seconds=0.0):
+        """Dedup ratio and the stage time it saved, given the stage seconds spent on the processed rows."""
+        processed = self.rows - self.duplicates
+        per_row = processing_seconds / processed if processed else 0.0
+        saved = self.duplicates * per_row - self.seconds
+        report = {
+            "rows": self.rows,
+            "duplicates": self.duplicates,
+            "dedup_ratio": round(self.duplicates / self.rows, 4) if self.rows else 0.0,
+            "seconds": round(self.seconds, 3),
+            "saved_seconds": round(saved, 3),
+        }
+        logging.info(
+            f"dedup: {self.duplicates}/{self.rows} reviews reused an already processed "
+            f"text ({report['dedup_ratio']:.1%}), saved ~{saved:.1f}s of stage time"
+        )
+        return report
+
+
+def merge_canonicals(engine):
+    """Leave a single canonical row per text.
+
+    Runs that process in parallel (DAG partitions) can each take a copy of
+    the same text as canonical; the copies are re-pointed at the lowest of
+    those rows. Returns the number of texts whose canonical row changed.
+    """
+    with engine.connect() as conn:
+        groups = conn.execute(text(f"""
+            SELECT {HASH_COLUMN}, MIN(uniqueID)
+            FROM processed_data
+            WHERE uniqueID = {CANONICAL_COLUMN}
+            GROUP BY {HASH_COLUMN}
+            HAVING COUNT(*) > 1
+        """)).fetchall()
+    if groups:
+        with engine.begin() as conn:
+            conn.execute(
+                text(f"UPDATE processed_data SET {CANONICAL_COLUMN} = :canonical "
+                     f"WHERE {HASH_COLUMN} = :hash"),
+                [{"canonical": int(canonical), "hash": hash_} for hash_, canonical in groups],
+            )
+        logging.info(f"canonical rows merged for {len(groups)} duplicated texts")
+    return len(groups)
+
+
+def dedup_stats(engine):
+    """How many stored reviews are copies of another review's text."""
+    with engine.connect() as conn:
+        row = conn.execute(text(f"""
+            SELECT COUNT(*),
+                   SUM(CASE WHEN {DISTINCT_REVIEWS} THEN 1 ELSE 0 END),
+                   SUM(CASE WHEN {HASH_COLUMN} IS NULL THEN 1 ELSE 0 END)
+            FROM processed_data
+        """)).first()
+    rows, distinct, unhashed = (int(value or 0) for value in row)
+    return {
+        "rows": rows,
+        "distinct_reviews": distinct,
+        "duplicates": rows - distinct,
+        "dedup_ratio": round((rows - distinct) / rows, 4) if rows else 0.0,
+        "rows_without_hash": unhashed,
+    }
+
+
+if __name__ == "__main__":
+    from db import get_engine
+
+    parser = argparse.ArgumentParser(description="duplicate reviews in processed_data")
+    parser.add_argument("command", choices=["stats", "merge"])
+    args = parser.parse_args()
+
+    engine = get_engine()
+    if args.command == "merge":
+        print(f"{merge_canonicals(engine)} duplicated texts re-linked to their lowest uniqueID")
+    print(dedup_stats(engine))
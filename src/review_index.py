@@ -0,0 +1,501 @@
+import os
+import re
+import sys
+import glob
+import json
+import argparse
+import threading
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from sqlalchemy import text
+from logger import logging
+from ingestion_state import FULL_REBUILD, NO_WATERMARK, get_state, get_watermark
+from snapshot import SNAPSHOT_DIR
+
+# Inverted index over the processed (stopword free, lemmatized) review tokens
+# of processed_data, for free-text search without scanning every review.
+#
+# The index is a list of immutable segments, one .npz file each, listed by
+# manifest.json (swapped with os.replace like the snapshot pointer). After a
+# preprocessing run the rows above the index watermark become a new segment;
+# once too many small segments pile up they are merged into one. A segment
+# holds, per term, the delta-encoded local doc numbers of its postings, the
+# term frequencies and the delta-encoded token positions, each in the
+# narrowest unsigned dtype that fits. Positions count processed tokens, so a
+# phrase query matches the phrase after the same normalization.
+#
+# Property lookups deliberately stay on property_mask: the lexicon keywords
+# are matched as case-insensitive substrings of the original review text
+# (property_lexicon, the REGEXP fallback of the analyzer), which stopword
+# removal and lemmatization make impossible to reproduce over these tokens.
+INDEX_DIR = os.path.abspath(os.getenv(
+    "REVIEW_INDEX_DIR", os.path.join(SNAPSHOT_DIR, "review_index")
+))
+MANIFEST_FILE = "manifest.json"
+# bump when the segment layout changes, older indexes are rebuilt
+INDEX_FORMAT = 1
+READ_CHUNK_SIZE = int(os.getenv("REVIEW_INDEX_CHUNK_SIZE", 50000))
+# segments below SEGMENT_SIZE reviews are merged once there are more than
+# MAX_SMALL_SEGMENTS of them (micro-batches each add a small one)
+SEGMENT_SIZE = int(os.getenv("REVIEW_INDEX_SEGMENT_SIZE", 100000))
+MAX_SMALL_SEGMENTS = int(os.getenv("REVIEW_INDEX_MAX_SMALL_SEGMENTS", 4))
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+# manifest version -> ReviewIndex, one entry per process
+_loaded = {}
+_lock = threading.Lock()
+_normalizer = None
+
+
+def normalize_query(text_):
+    """Tokens of a query after the preprocessing normalization of the reviews."""
+    global _normalizer
+    if _normalizer is None:
+        from nltk_resources import ensure_resources
+        from text_normalizer import TextNormalizer
+
+        ensure_resources()
+        _normalizer = TextNormalizer()
+    from text_normalizer import clean_text
+
+    return _normalizer.tokenize_and_remove_stopwords(clean_text(text_)).split()
+
+
+def _narrow(values):
+    values = np.asarray(values, dtype=np.int64)
+    return values.astype(np.min_scalar_type(int(values.max()) if len(values) else 0))
+
+
+def _pack(strings):
+    return np.frombuffer(json.dumps(list(strings)).encode(), dtype=np.uint8)
+
+
+def _unpack(array):
+    return json.loads(array.tobytes().decode())
+
+
+def _undelta(gaps, sizes):
+    """Values of consecutive delta-encoded groups of the given sizes."""
+    gaps = gaps.astype(np.int64)
+    values = np.cumsum(gaps)
+    if not len(values):
+        return values
+    starts = np.cumsum(sizes) - sizes
+    nonempty = sizes > 0
+    base = np.zeros(len(sizes), dtype=np.int64)
+    base[nonempty] = values[starts[nonempty]] - gaps[starts[nonempty]]
+    return values - np.repeat(base, sizes)
+
+
+class Segment:
+    """Postings of a contiguous uniqueID range of reviews."""
+
+    def __init__(self, arrays):
+        self.doc_ids = arrays["doc_ids"]
+        self.doc_len = arrays["doc_len"].astype(np.int64)
+        self.drugs = _unpack(arrays["drugs"])
+        self.drug_codes = arrays["drug_codes"]
+        self.conditions = _unpack(arrays["conditions"])
+        self.condition_codes = arrays["condition_codes"]
+        self.terms = _unpack(arrays["terms"])
+        self.term_ids = {term: i for i, term in enumerate(self.terms)}
+        self.term_offsets = arrays["term_offsets"]
+        self.doc_gaps = arrays["doc_gaps"]
+        self.tf = arrays["tf"]
+        self.pos_gaps = arrays["pos_gaps"]
+        self.token_offsets = np.concatenate([[0], np.cumsum(self.tf, dtype=np.int64)])
+
+    @property
+    def size(self):
+        return len(self.doc_ids)
+
+    @classmethod
+    def build(cls, frame):
+        """Segment of a (uniqueID, drugName, conditions, review) frame sorted by uniqueID."""
+        vocab = {}
+        token_terms = []
+        lengths = np.zeros(len(frame), dtype=np.int64)
+        for i, review in enumerate(frame["review"]):
+            tokens = review.split() if isinstance(review, str) else []
+            lengths[i] = len(tokens)
+            token_terms.extend(vocab.setdefault(token, len(vocab)) for token in tokens)
+        drug_codes, drugs = pd.factorize(frame["drugName"].fillna(""))
+        condition_codes, conditions = pd.factorize(frame["conditions"].fillna(""))
+        return cls.from_tokens(
+            frame["uniqueID"].to_numpy(dtype=np.int64), drug_codes, list(drugs),
+            condition_codes, list(conditions), lengths,
+            np.asarray(token_terms, dtype=np.int64), list(vocab),
+        )
+
+    @classmethod
+    def from_tokens(cls, doc_ids, drug_codes, drugs, condition_codes, conditions,
+                    lengths, token_terms, terms):
+        """Segment from the term id of every token, in doc then position order."""
+        n_docs, n_tokens = len(doc_ids), len(token_terms)
+        doc = np.repeat(np.arange(n_docs, dtype=np.int64), lengths)
+        pos = np.arange(n_tokens, dtype=np.int64) - np.repeat(np.cumsum(lengths) - lengths, lengths)
+
+        order = np.argsort(token_terms, kind="stable")
+        term, doc, pos = token_terms[order], doc[order], pos[order]
+        new_posting = np.ones(n_tokens, dtype=bool)
+        new_posting[1:] = (term[1:] != term[:-1]) | (doc[1:] != doc[:-1])
+        starts = np.flatnonzero(new_posting)
+        posting_term, posting_doc = term[starts], doc[starts]
+
+        doc_gaps = posting_doc.copy()
+        same_term = posting_term[1:] == posting_term[:-1]
+        doc_gaps[1:][same_term] -= posting_doc[:-1][same_term]
+        pos_gaps = pos.copy()
+        pos_gaps[1:][~new_posting[1:]] -= pos[:-1][~new_posting[1:]]
+
+        return cls({
+            "doc_ids": np.asarray(doc_ids, dtype=np.int64),
+            "doc_len": _narrow(lengths),
+            "drugs": _pack(drugs),
+            "drug_codes": np.asarray(drug_codes, dtype=np.int32),
+            "conditions": _pack(conditions),
+            "condition_codes": np.asarray(condition_codes, dtype=np.int32),
+            "terms": _pack(terms),
+            "term_offsets": np.searchsorted(posting_term, np.arange(len(terms) + 1)).astype(np.int64),
+            "doc_gaps": _narrow(doc_gaps),
+            "tf": _narrow(np.diff(np.append(starts, n_tokens))),
+            "pos_gaps": _narrow(pos_gaps),
+        })
+
+    def arrays(self):
+        return {
+            "doc_ids": self.doc_ids,
+            "doc_len": _narrow(self.doc_len),
+            "drugs": _pack(self.drugs),
+            "drug_codes": self.drug_codes,
+            "conditions": _pack(self.conditions),
+            "condition_codes": self.condition_codes,
+            "terms": _pack(self.terms),
+            "term_offsets": self.term_offsets,
+            "doc_gaps": self.doc_gaps,
+            "tf": self.tf,
+            "pos_gaps": self.pos_gaps,
+        }
+
+    def postings(self, term):
+        """(local doc numbers, term frequencies) of a term, empty if absent."""
+        i = self.term_ids.get(term)
+        if i is None:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+        a, b = self.term_offsets[i], self.term_offsets[i + 1]
+        return np.cumsum(self.doc_gaps[a:b], dtype=np.int64), self.tf[a:b].astype(np.int64)
+
+    def positions(self, term):
+        """(local doc number, position) of every occurrence of a term."""
+        docs, tf = self.postings(term)
+        if not len(docs):
+            return docs, docs
+        i = self.term_ids[term]
+        a, b = self.token_offsets[self.term_offsets[i]], self.token_offsets[self.term_offsets[i + 1]]
+        return np.repeat(docs, tf), _undelta(self.pos_gaps[a:b], tf)
+
+    def token_terms(self):
+        """Term id of every token in doc then position order (inverse of from_tokens)."""
+        postings = np.diff(self.term_offsets)
+        tf = self.tf.astype(np.int64)
+        docs = _undelta(self.doc_gaps, postings)
+        term = np.repeat(np.repeat(np.arange(len(self.terms)), postings), tf)
+        doc = np.repeat(docs, tf)
+        pos = _undelta(self.pos_gaps, tf)
+        return term[np.lexsort((pos, doc))]
+
+    def filter(self, drug=None, condition=None):
+        """Boolean mask of the docs of a drug / condition, None without a filter."""
+        mask = None
+        for value, names, codes in ((drug, self.drugs, self.drug_codes),
+                                    (condition, self.conditions, self.condition_codes)):
+            if value is None:
+                continue
+            hit = codes == names.index(value) if value in names else np.zeros(self.size, dtype=bool)
+            mask = hit if mask is None else mask & hit
+        return mask
+
+    def phrase(self, tokens):
+        """Boolean mask of the docs containing the tokens as consecutive processed tokens."""
+        mask = np.zeros(self.size, dtype=bool)
+        if not tokens or any(token not in self.term_ids for token in tokens):
+            return mask
+        if len(tokens) == 1:
+            mask[self.postings(tokens[0])[0]] = True
+            return mask
+        keys = None
+        for offset, token in enumerate(tokens):
+            doc, pos = self.positions(token)
+            # occurrences that could start the phrase at pos - offset
+            start = pos - offset
+            found = (doc[start >= 0] << 32) | start[start >= 0]
+            keys = found if keys is None else np.intersect1d(keys, found, assume_unique=True)
+            if not len(keys):
+                return mask
+        mask[np.unique(keys >> 32)] = True
+        return mask
+
+    @classmethod
+    def merge(cls, segments):
+        """One segment with the reviews of `segments` (in uniqueID order)."""
+        terms = {}
+        token_terms, drugs, conditions = [], [], []
+        for segment in segments:
+            mapping = np.array([terms.setdefault(t, len(terms)) for t in segment.terms], dtype=np.int64)
+            token_terms.append(mapping[segment.token_terms()] if len(mapping) else np.empty(0, np.int64))
+            drugs.append(np.asarray(segment.drugs, dtype=object)[segment.drug_codes])
+            conditions.append(np.asarray(segment.conditions, dtype=object)[segment.condition_codes])
+        drug_codes, drug_names = pd.factorize(np.concatenate(drugs))
+        condition_codes, condition_names = pd.factorize(np.concatenate(conditions))
+        return cls.from_tokens(
+            np.concatenate([s.doc_ids for s in segments]), drug_codes, list(drug_names),
+            condition_codes, list(condition_names),
+            np.concatenate([s.doc_len for s in segments]),
+            np.concatenate(token_terms), list(terms),
+        )
+
+
+class ReviewIndex:
+    """BM25 search and phrase queries over every segment."""
+
+    def __init__(self, segments, manifest=None):
+        self.segments = segments
+        self.manifest = manifest or {}
+        self.docs = sum(segment.size for segment in segments)
+        tokens = sum(int(segment.doc_len.sum()) for segment in segments)
+        self.avgdl = tokens / self.docs if self.docs else 0.0
+
+    def document_frequency(self, term):
+        return sum(len(segment.postings(term)[0]) for segment in self.segments)
+
+    def _idf(self, term):
+        df = self.document_frequency(term)
+        return np.log(1 + (self.docs - df + 0.5) / (df + 0.5))
+
+    def _allowed(self, segment, drug, condition, phrases):
+        allowed = segment.filter(drug, condition)
+        for tokens in phrases:
+            found = segment.phrase(tokens)
+            allowed = found if allowed is None else allowed & found
+        return allowed
+
+    def search(self, query, drug=None, condition=None, limit=10):
+        """Reviews ranked by BM25 for the query terms.
+
+        Quoted parts of the query ("weight gain") must appear as a phrase;
+        drug / condition restrict the reviews searched. Returns uniqueID,
+        score, drugName and conditions, best first.
+        """
+        phrases = [normalize_query(p) for p in re.findall(r'"([^"]*)"', query)]
+        phrases = [tokens for tokens in phrases if tokens]
+        terms = set(normalize_query(re.sub(r'"[^"]*"', " ", query)))
+        terms.update(token for tokens in phrases for token in tokens)
+        idf = {term: self._idf(term) for term in terms}
+
+        hits = []
+        for segment in self.segments:
+            allowed = self._allowed(segment, drug, condition, phrases)
+            scores = np.zeros(segment.size)
+            for term in terms:
+                docs, tf = segment.postings(term)
+                norm = BM25_K1 * (1 - BM25_B + BM25_B * segment.doc_len[docs] / self.avgdl)
+                scores[docs] += idf[term] * tf * (BM25_K1 + 1) / (tf + norm)
+            matched = scores > 0
+            if allowed is not None:
+                matched &= allowed
+            candidates = np.flatnonzero(matched)
+            if len(candidates) > limit:
+                # keep the reviews tied with the limit-th score, ties go by uniqueID below
+                kth = -np.partition(-scores[candidates], limit - 1)[limit - 1]
+                candidates = candidates[scores[candidates] >= kth]
+            for doc in candidates:
+                hits.append((int(segment.doc_ids[doc]), float(scores[doc]),
+                             segment.drugs[segment.drug_codes[doc]],
+                             segment.conditions[segment.condition_codes[doc]]))
+
+        results = pd.DataFrame(hits, columns=["uniqueID", "score", "drugName", "conditions"])
+        results = results.sort_values(["score", "uniqueID"], ascending=[False, True])
+        return results.head(limit).reset_index(drop=True)
+
+    def phrase(self, phrase, drug=None, condition=None):
+        """uniqueIDs of the reviews containing the phrase."""
+        return self._matching([normalize_query(phrase)], drug, condition)
+
+    def _matching(self, alternatives, drug, condition):
+        """uniqueIDs of the reviews containing any of the token phrases."""
+        ids = []
+        for segment in self.segments:
+            found = np.zeros(segment.size, dtype=bool)
+            for tokens in alternatives:
+                found |= segment.phrase(tokens)
+            allowed = segment.filter(drug, condition)
+            if allowed is not None:
+                found &= allowed
+            ids.append(segment.doc_ids[found])
+        return np.concatenate(ids) if ids else np.empty(0, dtype=np.int64)
+
+
+def read_manifest(index_dir=INDEX_DIR):
+    try:
+        with open(os.path.join(index_dir, MANIFEST_FILE)) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+def _write_manifest(index_dir, manifest):
+    path = os.path.join(index_dir, MANIFEST_FILE)
+    tmp = f"{path}.tmp"
+    with open(tmp, "w") as f:
+        json.dump(manifest, f, indent=2)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+
+def _load_segment(index_dir, name):
+    with np.load(os.path.join(index_dir, name)) as arrays:
+        return Segment(dict(arrays))
+
+
+def load_index(index_dir=INDEX_DIR):
+    """The current index, cached per manifest version (FileNotFoundError if none was built)."""
+    manifest = read_manifest(index_dir)
+    if manifest is None:
+        raise FileNotFoundError(f"no review index built in {index_dir}")
+    with _lock:
+        index = _loaded.get(manifest["version"])
+        if index is None:
+            segments = [_load_segment(index_dir, s["file"]) for s in manifest["segments"]]
+            index = ReviewIndex(segments, manifest)
+            _loaded.clear()
+            _loaded[manifest["version"]] = index
+            logging.info(f"review index {manifest['version']} loaded: {index.docs} reviews, "
+                         f"{len(segments)} segments")
+    return index
+
+
+def _needs_rebuild(engine, manifest):
+    if manifest is None:
+        return "no index built yet"
+    if manifest.get("format") != INDEX_FORMAT:
+        return "index format changed"
+    main = get_state(engine)
+    started = main.get("last_run_started")
+    if main.get("last_run_mode") == FULL_REBUILD and started and (
+        pd.Timestamp(started) > pd.Timestamp(manifest["rebuilt"])
+    ):
+        return "processed_data was rebuilt"
+    return None
+
+
+def _save_segment(index_dir, segment):
+    name = f"segment-{int(segment.doc_ids[0])}-{int(segment.doc_ids[-1])}-{datetime.now():%Y%m%dT%H%M%S%f}.npz"
+    np.savez(os.path.join(index_dir, name), **segment.arrays())
+    return {"file": name, "first_id": int(segment.doc_ids[0]), "last_id": int(segment.doc_ids[-1]),
+            "docs": segment.size, "tokens": int(segment.doc_len.sum())}
+
+
+def update_index(engine, index_dir=INDEX_DIR, rebuild=False, chunk_size=READ_CHUNK_SIZE):
+    """Index the processed_data rows above the index watermark; returns the rows indexed.
+
+    A full processed_data rebuild (or rebuild=True) re-indexes everything.
+    """
+    os.makedirs(index_dir, exist_ok=True)
+    manifest = read_manifest(index_dir)
+    previous = manifest or {}
+    reason = "requested" if rebuild else _needs_rebuild(engine, manifest)
+    if reason:
+        logging.info(f"review index rebuilt from scratch: {reason}")
+        manifest = {"format": INDEX_FORMAT, "watermark": NO_WATERMARK, "segments": [],
+                    "rebuilt": datetime.now().isoformat()}
+
+    after_id = manifest["watermark"]
+    # rows above the pipeline watermark may belong to partitions still running
+    until_id = get_watermark(engine)
+    if until_id <= after_id and not reason:
+        return 0
+
+    query = text("""
+        SELECT uniqueID, drugName, conditions, review
+        FROM processed_data
+        WHERE uniqueID > :after_id AND uniqueID <= :until_id
+        ORDER BY uniqueID
+        LIMIT :chunk_size
+    """)
+    segments = list(manifest["segments"])
+    indexed = 0
+    while after_id < until_id:
+        chunk = pd.read_sql(
+            query, engine,
+            params={"after_id": after_id, "until_id": until_id, "chunk_size": chunk_size}
+        )
+        if chunk.empty:
+            break
+        segments.append(_save_segment(index_dir, Segment.build(chunk)))
+        indexed += len(chunk)
+        after_id = int(chunk["uniqueID"].iloc[-1])
+        if len(chunk) < chunk_size:
+            break
+
+    small = [s for s in segments if s["docs"] < SEGMENT_SIZE]
+    if len(small) > MAX_SMALL_SEGMENTS:
+        merged = Segment.merge([_load_segment(index_dir, s["file"]) for s in small])
+        segments = [s for s in segments if s["docs"] >= SEGMENT_SIZE] + [_save_segment(index_dir, merged)]
+        segments.sort(key=lambda s: s["first_id"])
+        logging.info(f"review index: {len(small)} small segments merged")
+
+    live = {s["file"] for s in segments}
+    created = datetime.now()
+    manifest.update({
+        "version": f"{created:%Y%m%dT%H%M%S%f}-{until_id}",
+        "watermark": until_id,
+        "segments": segments,
+        "docs": sum(s["docs"] for s in segments),
+        "tokens": sum(s["tokens"] for s in segments),
+        "created": created.isoformat(timespec="seconds"),
+        # dropped by this update, deleted by the next one so that a reader
+        # still loading the previous manifest finds its files
+        "retired": [s["file"] for s in previous.get("segments", []) if s["file"] not in live],
+    })
+    _write_manifest(index_dir, manifest)
+    keep = live | set(manifest["retired"])
+    for path in glob.glob(os.path.join(index_dir, "segment-*.npz")):
+        if os.path.basename(path) not in keep:
+            os.remove(path)
+    logging.info(f"review index: {indexed} reviews indexed up to uniqueID {until_id}, "
+                 f"{manifest['docs']} reviews in {len(segments)} segments")
+    return indexed
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="inverted index over the processed reviews")
+    parser.add_argument("command", choices=["update", "search", "phrase", "status"])
+    parser.add_argument("query", nargs="?", help="search terms (quote phrases) or a phrase")
+    parser.add_argument("--rebuild", action="store_true", help="re-index every processed review")
+    parser.add_argument("--drug")
+    parser.add_argument("--condition")
+    parser.add_argument("--limit", type=int, default=10)
+    parser.add_argument("--index-dir", default=INDEX_DIR)
+    args = parser.parse_args()
+
+    if args.command == "update":
+        from db import get_engine
+
+        print(f"{update_index(get_engine(), args.index_dir, rebuild=args.rebuild)} reviews indexed")
+    elif args.command == "status":
+        print(read_manifest(args.index_dir) or f"no index in {args.index_dir}")
+    elif not args.query:
+        parser.error(f"{args.command} needs a query")
+    elif args.command == "search":
+        index = load_index(args.index_dir)
+        print(index.search(args.query, args.drug, args.condition, args.limit).to_string(index=False))
+    else:
+        index = load_index(args.index_dir)
+        print(f"{len(index.phrase(args.query, args.drug, args.condition))} reviews")
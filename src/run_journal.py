@@ -0,0 +1,249 @@
+import os
+import sys
+import argparse
+from datetime import datetime, timedelta
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from sqlalchemy import text
+from logger import logging
+from ingestion_state import PIPELINE_NAME
+
+# Run journal: one row per preprocessing run and one row per chunk it has
+# committed. A chunk row is written in the same transaction as the chunk's
+# processed_data rows, so after a crash the journal says exactly which uniqueID
+# ranges are already stored and a retried run only redoes the rest.
+RUNS_TABLE = "preprocessing_runs"
+CHUNKS_TABLE = "preprocessing_run_chunks"
+
+RUNNING = "running"
+FAILED = "failed"
+SUCCESS = "success"
+CLEARED = "cleared"
+# a run in one of these states is resumed by the next run of the same mode
+IN_FLIGHT = (RUNNING, FAILED)
+ACTIVE_RUN_MAX_AGE = int(os.getenv("PREPROCESS_RUN_MAX_AGE_HOURS", 12))
+
+
+def ensure_journal_tables(engine):
+    with engine.begin() as conn:
+        conn.execute(text(f"""
+        CREATE TABLE IF NOT EXISTS {RUNS_TABLE} (
+            run_id VARCHAR(250) NOT NULL PRIMARY KEY,
+            pipeline VARCHAR(100) NOT NULL,
+            mode VARCHAR(20) NOT NULL,
+            status VARCHAR(20) NOT NULL,
+            attempts INT NOT NULL DEFAULT 1,
+            started DATETIME,
+            finished DATETIME
+        )
+        """))
+        # chunk_start is the exclusive lower bound the chunk was read from,
+        # chunk_end the largest uniqueID in it: the chunk covers (start, end]
+        conn.execute(text(f"""
+        CREATE TABLE IF NOT EXISTS {CHUNKS_TABLE} (
+            run_id VARCHAR(250) NOT NULL,
+            chunk_start BIGINT NOT NULL,
+            chunk_end BIGINT NOT NULL,
+            row_count INT NOT NULL,
+            committed DATETIME,
+            PRIMARY KEY (run_id, chunk_start)
+        )
+        """))
+
+
+def in_flight_runs(engine, pipeline=PIPELINE_NAME):
+    ensure_journal_tables(engine)
+    with engine.connect() as conn:
+        rows = conn.execute(
+            text(f"""
+            SELECT r.run_id, r.mode, r.status, r.attempts, r.started,
+                   COUNT(c.chunk_start) AS chunks, COALESCE(SUM(c.row_count), 0) AS row_count,
+                   MAX(c.chunk_end) AS last_uniqueID
+            FROM {RUNS_TABLE} r
+            LEFT JOIN {CHUNKS_TABLE} c ON c.run_id = r.run_id
+            WHERE r.pipeline = :pipeline AND r.status IN (:running, :failed)
+            GROUP BY r.run_id, r.mode, r.status, r.attempts, r.started
+            ORDER BY r.started DESC
+            """),
+            {"pipeline": pipeline, "running": RUNNING, "failed": FAILED},
+        ).mappings().all()
+    return [dict(row) for row in rows]
+
+
+def active_runs(engine, max_age_hours=ACTIVE_RUN_MAX_AGE, pipeline=PIPELINE_NAME):
+    """Runs currently executing. A run still marked running after max_age_hours
+    is assumed to have died without closing and is ignored."""
+    ensure_journal_tables(engine)
+    since = datetime.now() - timedelta(hours=max_age_hours)
+    with engine.connect() as conn:
+        rows = conn.execute(
+            text(f"""
+            SELECT run_id FROM {RUNS_TABLE}
+            WHERE pipeline = :pipeline AND status = :running AND started > :since
+            """),
+            {"pipeline": pipeline, "running": RUNNING, "since": since},
+        ).all()
+    return [row[0] for row in rows]
+
+
+def open_run(engine, mode, run_id=None, pipeline=PIPELINE_NAME):
+    """Start a run, or resume the in-flight one. Returns (run_id, resumed).
+
+    Without a run_id the latest in-flight run of the pipeline is resumed if it
+    has the same mode; an in-flight run of another mode is marked cleared.
+    Airflow passes its own run_id, so task retries resume the same run.
+    """
+    ensure_journal_tables(engine)
+    with engine.begin() as conn:
+        if run_id is None:
+            latest = conn.execute(
+                text(f"""
+                SELECT run_id, mode FROM {RUNS_TABLE}
+                WHERE pipeline = :pipeline AND status IN (:running, :failed)
+                ORDER BY started DESC LIMIT 1
+                """),
+                {"pipeline": pipeline, "running": RUNNING, "failed": FAILED},
+            ).first()
+            if latest is not None and latest[1] == mode:
+                run_id = latest[0]
+            elif latest is not None:
+                conn.execute(
+                    text(f"UPDATE {RUNS_TABLE} SET status = :cleared WHERE run_id = :run_id"),
+                    {"cleared": CLEARED, "run_id": latest[0]},
+                )
+                logging.info(f"in-flight {latest[1]} run {latest[0]} abandoned for a {mode} run")
+
+        existing = None
+        if run_id is not None:
+            existing = conn.execute(
+                text(f"SELECT status FROM {RUNS_TABLE} WHERE run_id = :run_id"),
+                {"run_id": run_id},
+            ).first()
+
+        if existing is not None and existing[0] in IN_FLIGHT:
+            conn.execute(
+                text(f"""
+                UPDATE {RUNS_TABLE}
+                SET status = :running, attempts = attempts + 1, finished = NULL
+                WHERE run_id = :run_id
+                """),
+                {"running": RUNNING, "run_id": run_id},
+            )
+            logging.info(f"resuming run {run_id}")
+            return run_id, True
+
+        if existing is not None:
+            # finished or cleared: the id is reused for a fresh run
+            conn.execute(text(f"DELETE FROM {CHUNKS_TABLE} WHERE run_id = :run_id"),
+                         {"run_id": run_id})
+            conn.execute(text(f"DELETE FROM {RUNS_TABLE} WHERE run_id = :run_id"),
+                         {"run_id": run_id})
+
+        now = datetime.now()
+        run_id = run_id or f"{mode}__{now:%Y%m%dT%H%M%S%f}"
+        conn.execute(
+            text(f"""
+            INSERT INTO {RUNS_TABLE} (run_id, pipeline, mode, status, started)
+            VALUES (:run_id, :pipeline, :mode, :running, :now)
+            """),
+            {"run_id": run_id, "pipeline": pipeline, "mode": mode,
+             "running": RUNNING, "now": now},
+        )
+    logging.info(f"run {run_id} started")
+    return run_id, False
+
+
+def record_chunk(conn, run_id, chunk_start, chunk_end, rows):
+    """Journal a committed chunk inside the caller's (write) transaction."""
+    conn.execute(
+        text(f"""
+        INSERT INTO {CHUNKS_TABLE} (run_id, chunk_start, chunk_end, row_count, committed)
+        VALUES (:run_id, :chunk_start, :chunk_end, :rows, :now)
+        """),
+        {"run_id": run_id, "chunk_start": int(chunk_start), "chunk_end": int(chunk_end),
+         "rows": int(rows), "now": datetime.now()},
+    )
+
+
+def resume_point(engine, run_id, start, end):
+    """Largest uniqueID such that (start, point] is fully committed by run_id.
+
+    Walks the journaled chunks overlapping (start, end] from the bottom and
+    stops at the first gap, so chunks committed out of order are never
+    mistaken for a contiguous prefix.
+    """
+    ensure_journal_tables(engine)
+    with engine.connect() as conn:
+        chunks = conn.execute(
+            text(f"""
+            SELECT chunk_start, chunk_end FROM {CHUNKS_TABLE}
+            WHERE run_id = :run_id AND chunk_end > :start AND chunk_start < :end
+            ORDER BY chunk_start
+            """),
+            {"run_id": run_id, "start": int(start), "end": int(end)},
+        ).all()
+
+    point = start
+    for chunk_start, chunk_end in chunks:
+        if chunk_start > point:
+            break
+        point = max(point, min(int(chunk_end), end))
+    return point
+
+
+def run_rows(engine, run_id):
+    """Rows committed by run_id over all of its attempts."""
+    with engine.connect() as conn:
+        return int(conn.execute(
+            text(f"SELECT COALESCE(SUM(row_count), 0) FROM {CHUNKS_TABLE} WHERE run_id = :run_id"),
+            {"run_id": run_id},
+        ).scalar())
+
+
+def close_run(engine, run_id, status=SUCCESS):
+    """Mark a run finished. A successful run's chunk rows are no longer needed."""
+    with engine.begin() as conn:
+        conn.execute(
+            text(f"""
+            UPDATE {RUNS_TABLE} SET status = :status, finished = :now
+            WHERE run_id = :run_id
+            """),
+            {"status": status, "now": datetime.now(), "run_id": run_id},
+        )
+        if status == SUCCESS:
+            conn.execute(text(f"DELETE FROM {CHUNKS_TABLE} WHERE run_id = :run_id"),
+                         {"run_id": run_id})
+    logging.info(f"run {run_id} closed with status {status}")
+
+
+def clear_run(engine, run_id):
+    """Forget an in-flight run so the next run starts over instead of resuming it."""
+    close_run(engine, run_id, CLEARED)
+    with engine.begin() as conn:
+        conn.execute(text(f"DELETE FROM {CHUNKS_TABLE} WHERE run_id = :run_id"),
+                     {"run_id": run_id})
+
+
+if __name__ == "__main__":
+    from db import get_engine
+
+    parser = argparse.ArgumentParser(description="inspect or clear in-flight preprocessing runs")
+    parser.add_argument("command", choices=["status", "clear"])
+    parser.add_argument("--run-id", help="run to clear (default: every in-flight run)")
+    args = parser.parse_args()
+
+    engine = get_engine()
+    runs = in_flight_runs(engine)
+    if args.command == "status":
+        if not runs:
+            print("no in-flight runs")
+        for run in runs:
+            print(f"{run['run_id']}: {run['mode']} {run['status']}, attempt {run['attempts']}, "
+                  f"{run['chunks']} chunks / {run['row_count']} rows committed, "
+                  f"last uniqueID {run['last_uniqueID']}")
+    else:
+        run_ids = [args.run_id] if args.run_id else [run["run_id"] for run in runs]
+        for run_id in run_ids:
+            clear_run(engine, run_id)
+            print(f"run {run_id} cleared")
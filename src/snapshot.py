@@ -0,0 +1,180 @@
+import os
+import sys
+import json
+import glob
+import argparse
+import threading
+from datetime import datetime
+
+import pandas as pd
+import pyarrow as pa
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from sqlalchemy import text
+from logger import logging
+
+# Versioned, read-only copies of processed_data in the Arrow IPC file format
+# (uncompressed, so readers can memory-map them). `current.json` points at the
+# latest one and is swapped with os.replace, so a reader sees either the old
+# or the new snapshot, never a half written one. Every app process on a host
+# maps the same file and shares it through the OS page cache.
+SNAPSHOT_DIR = os.path.abspath(os.getenv(
+    "PROCESSED_SNAPSHOT_DIR",
+    os.path.join(os.path.dirname(__file__), '..', 'snapshots')
+))
+POINTER_FILE = "current.json"
+KEEP_SNAPSHOTS = int(os.getenv("PROCESSED_SNAPSHOT_KEEP", 3))
+EXPORT_CHUNK_SIZE = int(os.getenv("PROCESSED_SNAPSHOT_CHUNK_SIZE", 20000))
+
+SCHEMA = pa.schema([
+    ("uniqueID", pa.int64()),
+    ("drugName", pa.string()),
+    ("conditions", pa.string()),
+    ("review", pa.string()),
+    ("rating", pa.int64()),
+    ("review_date", pa.date32()),
+    ("usefulCount", pa.int64()),
+    ("benefit_mentions", pa.int64()),
+    ("side_effect_mentions", pa.int64()),
+    ("property_mask", pa.int64()),
+])
+
+# version -> memory-mapped table, one entry per process
+_loaded = {}
+_lock = threading.Lock()
+
+
+def _record_batch(chunk):
+    chunk = chunk.copy()
+    chunk["review_date"] = pd.to_datetime(chunk["review_date"], errors="coerce").dt.date
+    for name in SCHEMA.names:
+        if name not in chunk:
+            chunk[name] = None
+    table = pa.Table.from_pandas(chunk[SCHEMA.names], schema=SCHEMA, preserve_index=False)
+    return table.to_batches()
+
+
+def read_pointer(snapshot_dir=SNAPSHOT_DIR):
+    """Metadata of the current snapshot, or None if nothing was published yet."""
+    try:
+        with open(os.path.join(snapshot_dir, POINTER_FILE)) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+def _replace_json(path, payload):
+    tmp = f"{path}.tmp"
+    with open(tmp, "w") as f:
+        json.dump(payload, f, indent=2)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+
+def _prune(snapshot_dir, keep, current):
+    files = sorted(glob.glob(os.path.join(snapshot_dir, "processed_data-*.arrow")))
+    for path in files[:-keep] if keep > 0 else files:
+        if os.path.basename(path) != current:
+            # readers that still map an old file keep it alive until they close it
+            os.remove(path)
+
+
+def publish_snapshot(engine, snapshot_dir=SNAPSHOT_DIR, chunk_size=EXPORT_CHUNK_SIZE,
+                     keep=KEEP_SNAPSHOTS, watermark=None, force=True):
+    """Export processed_data to a new snapshot file and make it the current one.
+
+    force=False keeps the current snapshot when current.json already records
+    `watermark`, i.e. no row was committed since it was exported.
+    """
+    current = read_pointer(snapshot_dir)
+    if not force and current is not None and watermark is not None and (
+        current.get("watermark") == watermark
+    ):
+        logging.info(f"processed_data snapshot {current['version']} is current, not republished")
+        return current
+    os.makedirs(snapshot_dir, exist_ok=True)
+    created = datetime.now()
+    version = f"{created:%Y%m%dT%H%M%S%f}"
+    if watermark is not None:
+        version = f"{version}-{watermark}"
+    name = f"processed_data-{version}.arrow"
+    path = os.path.join(snapshot_dir, name)
+    tmp = f"{path}.tmp"
+
+    query = text(f"""
+        SELECT {", ".join(SCHEMA.names)} FROM processed_data
+        WHERE uniqueID > :after_id
+        ORDER BY uniqueID
+        LIMIT :chunk_size
+    """)
+    rows = 0
+    after_id = -1
+    with pa.OSFile(tmp, "wb") as sink, pa.ipc.new_file(sink, SCHEMA) as writer:
+        while True:
+            chunk = pd.read_sql(query, engine, params={"after_id": after_id, "chunk_size": chunk_size})
+            if chunk.empty:
+                break
+            for batch in _record_batch(chunk):
+                writer.write_batch(batch)
+            rows += len(chunk)
+            after_id = int(chunk["uniqueID"].iloc[-1])
+            if len(chunk) < chunk_size:
+                break
+    os.replace(tmp, path)
+
+    pointer = {
+        "version": version,
+        "file": name,
+        "rows": rows,
+        "watermark": watermark,
+        "created": created.isoformat(timespec="seconds"),
+    }
+    _replace_json(os.path.join(snapshot_dir, POINTER_FILE), pointer)
+    _prune(snapshot_dir, keep, name)
+    logging.info(f"processed_data snapshot {version} published ({rows} rows)")
+    return pointer
+
+
+def load_snapshot(snapshot_dir=SNAPSHOT_DIR):
+    """Memory-map the current snapshot as an Arrow table; returns (table, version).
+
+    The table is cached per version, so a call is one small json read unless
+    a new snapshot was published since the previous call.
+    """
+    pointer = read_pointer(snapshot_dir)
+    if pointer is None:
+        raise FileNotFoundError(f"no processed_data snapshot published in {snapshot_dir}")
+    version = pointer["version"]
+
+    with _lock:
+        table = _loaded.get(version)
+        if table is None:
+            source = pa.memory_map(os.path.join(snapshot_dir, pointer["file"]), "r")
+            table = pa.ipc.open_file(source).read_all()
+            _loaded.clear()
+            _loaded[version] = table
+            logging.info(f"processed_data snapshot {version} mapped ({table.num_rows} rows)")
+    return table, version
+
+
+def load_snapshot_frame(columns=None, snapshot_dir=SNAPSHOT_DIR):
+    """Current snapshot as a DataFrame backed by the mapped Arrow buffers (no copy)."""
+    table, _ = load_snapshot(snapshot_dir)
+    if columns is not None:
+        table = table.select(columns)
+    return table.to_pandas(types_mapper=pd.ArrowDtype)
+
+
+if __name__ == "__main__":
+    from db import get_engine
+
+    parser = argparse.ArgumentParser(description="processed_data Arrow snapshots")
+    parser.add_argument("command", choices=["publish", "status"])
+    parser.add_argument("--snapshot-dir", default=SNAPSHOT_DIR)
+    args = parser.parse_args()
+
+    if args.command == "publish":
+        publish_snapshot(get_engine(), args.snapshot_dir)
+    print(read_pointer(args.snapshot_dir) or f"no snapshot in {args.snapshot_dir}")
@@ -1,26 +1,19 @@
 import pandas as pd
 import os
 import sys
+from concurrent.futures import ThreadPoolExecutor
 
 # Add src to path
 sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'src'))
 
 from dotenv import load_dotenv
-from sqlalchemy import create_engine
+from sqlalchemy import text, bindparam
 from logger import logging
+from db import get_engine
 
 load_dotenv()
 
-
-try:
-    engine = create_engine(
-        f"mysql+pymysql://{os.getenv('DB_USER')}:{os.getenv('DB_PASSWORD')}"
-        f"@{os.getenv('DB_HOST')}:{int(os.getenv('DB_PORT'))}/{os.getenv('DB_NAME')}",
-        pool_pre_ping=True
-    )
-    logging.info("Connected to AWS RDS successfully")
-except Exception as e:
-    raise Exception(e, sys)
+engine = get_engine()
 
 from langchain_groq import ChatGroq
 llm = ChatGroq(
@@ -34,36 +27,49 @@ from langchain.text_splitter import RecursiveCharacterTextSplitter
 
 
 
+# reviews read per drug, of which MAX_REVIEWS are sampled for the summary
+REVIEWS_PER_DRUG = 200
+MAX_REVIEWS = 80
+# drugs summarized at the same time by call_summarizations (LLM calls are I/O bound)
+SUMMARY_WORKERS = int(os.getenv("SUMMARY_WORKERS", 4))
+
+
 def get_combined_reviews(drug_name):
-    logging.info(f"Fetching reviews for {drug_name} from AWS RDS")
+    return get_combined_reviews_many([drug_name])[drug_name]
+
+
+def get_combined_reviews_many(drug_names):
+    """{drug: combined review text} of several drugs from one IN query ("" without reviews)."""
+    logging.info(f"Fetching reviews for {', '.join(drug_names)} from AWS RDS")
 
     try:
-        query = """
-        SELECT review
-        FROM processed_data
-        WHERE drugName = %s
-        LIMIT 200
-        """
-
-        drug_reviews = pd.read_sql(
+        query = text("""
+        SELECT drugName, review FROM (
+            SELECT drugName, review,
+                   ROW_NUMBER() OVER (PARTITION BY drugName ORDER BY uniqueID) AS review_rank
+            FROM processed_data
+            WHERE drugName IN :drug_names
+        ) ranked
+        WHERE review_rank <= :per_drug
+        ORDER BY drugName, review_rank
+        """).bindparams(bindparam("drug_names", expanding=True))
+
+        reviews = pd.read_sql(
             query,
             engine,
-            params=(drug_name,)
+            params={"drug_names": list(drug_names), "per_drug": REVIEWS_PER_DRUG}
         )
 
     except Exception as e:
         raise Exception(e, sys)
 
-    if drug_reviews.empty:
-        return ""
-
-    max_reviews = 80
-    if len(drug_reviews) > max_reviews:
-        drug_reviews = drug_reviews.sample(n=max_reviews, random_state=42)
-
-    combined_text = " ".join(drug_reviews["review"].astype(str))
+    combined = {drug: "" for drug in drug_names}
+    for drug, drug_reviews in reviews.groupby("drugName", sort=False):
+        if len(drug_reviews) > MAX_REVIEWS:
+            drug_reviews = drug_reviews.sample(n=MAX_REVIEWS, random_state=42)
+        combined[drug] = " ".join(drug_reviews["review"].astype(str))
 
-    return combined_text
+    return combined
 
 
 map_template = """
@@ -127,5 +133,28 @@ def call_summarization(drug_name):
     return summarize_drug_reviews(drug_name, text)
 
 
+def call_summarizations(drug_names, max_workers=SUMMARY_WORKERS):
+    """{drug: summary} of several drugs: reviews read in one query, summaries run concurrently.
+
+    A drug whose summary failed maps to the exception instead, so one
+    failure does not hide the other summaries.
+    """
+    texts = get_combined_reviews_many(drug_names)
+    summaries = {drug: f"No reviews found for {drug}" for drug, text in texts.items() if not text}
+    pending = [drug for drug, text in texts.items() if text]
+    if not pending:
+        return summaries
+
+    with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(pending)))) as pool:
+        futures = {drug: pool.submit(summarize_drug_reviews, drug, texts[drug]) for drug in pending}
+        for drug, future in futures.items():
+            try:
+                summaries[drug] = future.result()
+            except Exception as e:
+                logging.info(f"summarization of {drug} failed: {e}")
+                summaries[drug] = e
+    return {drug: summaries[drug] for drug in texts}
+
+
 if __name__ == "__main__":
     print(call_summarization("Integra"))
\ No newline at end of file
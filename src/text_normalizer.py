@@ -0,0 +1,145 @@
+import os
+import re
+import sys
+import time
+import argparse
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from logger import logging
+from nltk.corpus import stopwords
+from nltk.stem import WordNetLemmatizer
+from nltk.tokenize import word_tokenize
+
+TOKENIZER_MODES = ("punkt", "regex", "whitespace")
+# regex/whitespace only make sense on text that went through clean_text
+DEFAULT_TOKENIZER = os.getenv("PREPROCESS_TOKENIZER", "regex")
+
+_CLEAN_PATTERN = re.compile(r'&#?\w+;|http\S+|[^a-zA-Z\s]')
+_WORD_PATTERN = re.compile(r'[a-z]+')
+
+# The only rules of NLTK's word tokenizer that can fire on text reduced to
+# lowercase letters and single spaces are its MacIntyre contractions, so the
+# fast tokenizers apply the same splits to stay identical to the punkt path.
+CONTRACTION_SPLITS = {
+    "cannot": ("can", "not"),
+    "gimme": ("gim", "me"),
+    "gonna": ("gon", "na"),
+    "gotta": ("got", "ta"),
+    "lemme": ("lem", "me"),
+    "wanna": ("wan", "na"),
+}
+
+
+def clean_text(text):
+    if not isinstance(text, str):
+        return ""
+    text = text.lower()
+    text = _CLEAN_PATTERN.sub('', text)
+    text = ' '.join(text.split())
+    return text
+
+
+def _split_contractions(words):
+    tokens = []
+    for word in words:
+        split = CONTRACTION_SPLITS.get(word)
+        if split is None:
+            tokens.append(word)
+        else:
+            tokens.extend(split)
+    return tokens
+
+
+class TextNormalizer:
+    """Stopword removal + lemmatization with the NLTK resources built once.
+
+    tokenizer="punkt" is the original word_tokenize path, "regex" and
+    "whitespace" are fast paths for text that already went through clean_text.
+    """
+
+    def __init__(self, tokenizer=DEFAULT_TOKENIZER, lemmatize=None):
+        if tokenizer not in TOKENIZER_MODES:
+            raise ValueError(f"tokenizer must be one of {TOKENIZER_MODES}, got {tokenizer!r}")
+        self.tokenizer = tokenizer
+        self.stop_words = frozenset(stopwords.words("english"))
+        self.lemmatize = lemmatize or WordNetLemmatizer().lemmatize
+
+    def tokenize(self, text):
+        if not text:
+            return []
+        if self.tokenizer == "punkt":
+            return word_tokenize(text)
+        if self.tokenizer == "regex":
+            return _split_contractions(_WORD_PATTERN.findall(text))
+        return _split_contractions(text.split())
+
+    def remove_stopwords(self, tokens):
+        stop_words = self.stop_words
+        return [t for t in tokens if t not in stop_words and len(t) > 2]
+
+    def lemmatize_tokens(self, tokens):
+        lemmatize = self.lemmatize
+        return " ".join(lemmatize(t) for t in tokens)
+
+    def tokenize_and_remove_stopwords(self, text):
+        """Same output as Text_preprocessing.tokenize_and_remove_stopwords."""
+        return self.lemmatize_tokens(self.remove_stopwords(self.tokenize(text)))
+
+    def normalize(self, text):
+        """clean -> tokenize -> stopword removal -> lemmatize for a raw review."""
+        return self.tokenize_and_remove_stopwords(clean_text(text))
+
+
+def compare_with_punkt(texts, tokenizer):
+    """Return the cleaned texts whose tokens differ from the punkt path."""
+    reference = TextNormalizer("punkt")
+    candidate = TextNormalizer(tokenizer)
+    mismatches = []
+    for text in texts:
+        cleaned = clean_text(text)
+        if reference.tokenize(cleaned) != candidate.tokenize(cleaned):
+            mismatches.append(cleaned)
+    return mismatches
+
+
+def benchmark(texts, modes=TOKENIZER_MODES, repeat=3):
+    """Per review cost (microseconds) of tokenize+stopwords+lemmatize for each mode."""
+    cleaned = [clean_text(t) for t in texts]
+    results = {}
+    for mode in modes:
+        normalizer = TextNormalizer(mode)
+        best = None
+        for _ in range(repeat):
+            start = time.perf_counter()
+            for text in cleaned:
+                normalizer.tokenize_and_remove_stopwords(text)
+            elapsed = time.perf_counter() - start
+            best = elapsed if best is None else min(best, elapsed)
+        results[mode] = {
+            "us_per_review": round(best / max(len(cleaned), 1) * 1e6, 2),
+            "mismatches_vs_punkt": len(compare_with_punkt(texts, mode)) if mode != "punkt" else 0,
+        }
+        logging.info(f"tokenizer {mode}: {results[mode]}")
+    return results
+
+
+if __name__ == "__main__":
+    import pandas as pd
+    from db import get_engine
+
+    parser = argparse.ArgumentParser(description="benchmark the tokenizer modes on raw_data reviews")
+    parser.add_argument("--sample", type=int, default=5000)
+    parser.add_argument("--csv", help="read reviews from a csv (column 'review') instead of raw_data")
+    args = parser.parse_args()
+
+    if args.csv:
+        reviews = pd.read_csv(args.csv, usecols=["review"], nrows=args.sample)["review"].tolist()
+    else:
+        reviews = pd.read_sql(
+            f"SELECT review FROM raw_data LIMIT {int(args.sample)}", get_engine()
+        )["review"].tolist()
+
+    for mode, result in benchmark(reviews).items():
+        print(f"{mode:>10}: {result['us_per_review']:>8} us/review, "
+              f"{result['mismatches_vs_punkt']} mismatches vs punkt")
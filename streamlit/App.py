@@ -1,5 +1,4 @@
 import streamlit as st
-import pandas as pd
 import sys
 import os
 # Add the src folder to Python path
@@ -10,12 +9,15 @@ from src.logger import logging
 
 
 from src.drug_property_analyzer import get_drug_property_percentages
+from src.property_analysis import render_markdown
 from src.summarization import call_summarization
+from src.dataset import load_dataset
 
 # Load data
 logging.info('dataset reading started for our Streamlit App')
 try:
-    data = pd.read_csv(r'D:\HEALTHCARE_NLP_GEN-AI_PROJECT\data\final_drug_review_data.csv')
+    # categorical drugName/conditions from the processed_data snapshot (see src/dataset.py)
+    data = load_dataset(columns=['drugName', 'conditions'])
     logging.info('data reading completed')
 except Exception as e:
     raise CustomException(e ,sys)
@@ -60,7 +62,7 @@ def function():
     with col1:
         st.metric("Total Drugs", len(data['drugName'].unique()))
     with col2:
-        st.metric("Total Conditions", len(data['condition'].unique()))
+        st.metric("Total Conditions", len(data['conditions'].unique()))
     with col3:
         st.metric("Total Reviews", len(data))
 
@@ -80,7 +82,7 @@ def function():
 
         # 🔹 Drug property analysis section
         st.markdown(f"<div class='big-info'>🧪 Drug Property Analysis of <b>{input_drugname}</b></div>", unsafe_allow_html=True)
-        st.markdown(f"<div class='small-success'>{'<br>'.join(get_drug_property_percentages(input_drugname))}</div>", unsafe_allow_html=True)
+        st.markdown(f"<div class='small-success'>{'<br>'.join(render_markdown(get_drug_property_percentages(input_drugname)))}</div>", unsafe_allow_html=True)
 
         # 🔹 Summary section
         st.markdown(f"<div class='big-info'>📝 Summary of Reviews on <b>{input_drugname}</b></div>", unsafe_allow_html=True)
@@ -3,33 +3,23 @@ import pandas as pd
 import sys
 import os
 from pathlib import Path
-from sqlalchemy import create_engine
 
 # Add the src folder to Python path
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
 from src.logger import logging
-from src.drug_property_analyzer import get_drug_property_percentages
-from src.summarization import call_summarization
+from src.drug_property_analyzer import get_drug_property_percentages, get_drug_profiles, engine
+from src.drug_trends import property_trends, rating_trend, TREND_FREQUENCIES
+from src.property_analysis import property_label, comparison_frame
+from src.summarization import call_summarization, call_summarizations
+from src.dataset import load_dataset, with_reviews
 
 # Load data
 logging.info('dataset reading started for our Streamlit App')
 try:
-    engine = create_engine(
-        f"mysql+pymysql://{os.getenv('DB_USER')}:{os.getenv('DB_PASSWORD')}"
-        f"@{os.getenv('DB_HOST')}:{int(os.getenv('DB_PORT'))}/{os.getenv('DB_NAME')}",
-        pool_pre_ping=True
-    )
-    logging.info("Connected to AWS RDS successfully")
-except Exception as e:
-    raise Exception(e, sys)
-
-try:
-    query = """
-    SELECT *
-    FROM processed_data
-    """
-    data = pd.read_sql(query, engine)
-    logging.info("Dataset reading completed from AWS RDS to summarize the review")
+    # only the columns the pages aggregate over, with categorical/small-int
+    # dtypes; review text is fetched per row for the preview (see src/dataset.py)
+    data = load_dataset()
+    logging.info("Dataset loading completed")
 except Exception as e:
     raise Exception(e, sys)
 
@@ -343,34 +333,12 @@ st.markdown("""
     </style>
 """, unsafe_allow_html=True)
 
-def parse_property_data(property_results):
-    """Parse the property results into conditions and medical properties"""
-    conditions = []
-    properties = []
-    
-    for result in property_results:
-        if "Most Common Conditions for" in result:
-            # This is a header, skip
-            continue
-        elif "reviews (" in result and "%" in result:
-            # This is a condition line
-            if ":" in result:
-                condition_part = result.split(":")[0].strip()
-                stats_part = result.split(":")[1].strip()
-                conditions.append({
-                    'name': condition_part,
-                    'stats': stats_part
-                })
-        elif "mention" in result:
-            # This is a medical property line
-            properties.append(result)
-    
-    return conditions, properties
-
-def create_property_analysis(input_drugname, property_results):
+def create_property_analysis(input_drugname, analysis):
     """Create a cleaner, text-based property analysis section"""
-    
-    conditions, properties = parse_property_data(property_results)
+
+    if analysis.empty:
+        st.warning(f"No reviews found for {input_drugname}")
+        return
     
     st.markdown(f"""
         <div class='property-container'>
@@ -380,7 +348,7 @@ def create_property_analysis(input_drugname, property_results):
     """, unsafe_allow_html=True)
 
     # 🎯 Most Common Conditions (Simple Text Style)
-    if conditions:
+    if analysis.top_conditions:
         st.markdown("""
             <div style="
                 background: linear-gradient(135deg, #181c25, #222c38);
@@ -392,7 +360,7 @@ def create_property_analysis(input_drugname, property_results):
                 <h3 style="color:#FF6B6B; margin-bottom:1rem;">🎯 Most Common Conditions</h3>
         """, unsafe_allow_html=True)
 
-        for condition in conditions:
+        for condition in analysis.top_conditions:
             st.markdown(f"""
                 <div style="
                     background: rgba(255,255,255,0.05);
@@ -401,15 +369,15 @@ def create_property_analysis(input_drugname, property_results):
                     border-radius: 8px;
                     border-left: 3px solid #FF6B6B;
                 ">
-                    <strong style="color:#FAFAFA;">{condition['name']}</strong><br>
-                    <span style="color:#BBBBBB; font-size:0.95rem;">{condition['stats']}</span>
+                    <strong style="color:#FAFAFA;">{condition.name}</strong><br>
+                    <span style="color:#BBBBBB; font-size:0.95rem;">{condition.reviews} reviews ({condition.percentage:.1f}%)</span>
                 </div>
             """, unsafe_allow_html=True)
 
         st.markdown("</div>", unsafe_allow_html=True)
 
     # ⚡ Medical Properties & Side Effects (Simple Text Style)
-    if properties:
+    if analysis.percentages:
         st.markdown("""
             <div style="
                 background: linear-gradient(135deg, #181c25, #222c38);
@@ -421,7 +389,7 @@ def create_property_analysis(input_drugname, property_results):
                 <h3 style="color:#00D4AA; margin-bottom:1rem;">⚡ Medical Properties & Side Effects</h3>
         """, unsafe_allow_html=True)
 
-        for prop in properties:
+        for prop, pct in analysis.percentages.items():
             st.markdown(f"""
                 <div style="
                     background: rgba(255,255,255,0.05);
@@ -430,7 +398,7 @@ def create_property_analysis(input_drugname, property_results):
                     border-radius: 8px;
                     border-left: 3px solid #00D4AA;
                 ">
-                    <span style="color:#FAFAFA;">{prop}</span><br>
+                    <span style="color:#FAFAFA;">{pct}% of reviews mention {property_label(prop)}</span><br>
                     <span style="color:#BBBBBB; font-size:0.9rem;">Based on patient reviews and clinical feedback</span>
                 </div>
             """, unsafe_allow_html=True)
@@ -440,6 +408,48 @@ def create_property_analysis(input_drugname, property_results):
     st.markdown("</div>", unsafe_allow_html=True)
 
 
+def create_trend_section(input_drugname, analysis):
+    """Property mention and rating trends, read from the monthly rollups only"""
+
+    st.markdown("""
+        <div class='analysis-section'>
+            <h3 style='color: #FF6B6B;'>📈 Trends Over Time</h3>
+    """, unsafe_allow_html=True)
+
+    # the drug's most mentioned properties first
+    percentages = analysis.percentages if analysis is not None else {}
+    ranked = sorted(percentages, key=percentages.get, reverse=True)
+    col1, col2 = st.columns([3, 1])
+    with col1:
+        properties = st.multiselect(
+            "Properties:",
+            ranked,
+            default=ranked[:3],
+            format_func=property_label,
+            key="trend_properties"
+        )
+    with col2:
+        freq = st.radio("Period:", list(TREND_FREQUENCIES), index=2, key="trend_freq")
+
+    if properties:
+        trends = property_trends(engine, input_drugname, properties, freq=freq)
+        if trends.empty:
+            st.info(f"No dated reviews for {input_drugname}")
+        else:
+            st.markdown("**% of reviews mentioning each property**")
+            st.line_chart(
+                trends.assign(property_name=trends["property_name"].map(property_label))
+                .pivot(index="period", columns="property_name", values="percentage")
+            )
+
+    ratings = rating_trend(engine, input_drugname, freq=freq)
+    if not ratings.empty:
+        st.markdown("**Average rating**")
+        st.line_chart(ratings.set_index("period")["avg_rating"])
+
+    st.markdown("</div>", unsafe_allow_html=True)
+
+
 def create_summary_section(input_drugname, summary_text):
     """Create a beautifully formatted summary section"""
     
@@ -616,7 +626,7 @@ def introduction_page():
     # Sample Data Preview
     st.markdown('<h2 class="section-title">🔍 Data Preview</h2>', unsafe_allow_html=True)
     
-    sample_data = data[['drugName', 'conditions', 'rating', 'review', 'usefulCount']].head(10)
+    sample_data = with_reviews(data.head(10))[['drugName', 'conditions', 'rating', 'review', 'usefulCount']]
     st.dataframe(sample_data, use_container_width=True)
     
     # Top Drugs by Review Count
@@ -682,6 +692,10 @@ def analysis_page():
         key="drug_selector"
     )
 
+    if st.sidebar.button("⚖️ Compare Drugs", use_container_width=True):
+        st.session_state.page = "comparison"
+        st.rerun()
+
     if input_drugname:
         drug_data = data[data['drugName'] == input_drugname]
         total_reviews = len(drug_data)
@@ -712,9 +726,10 @@ def analysis_page():
         # =====================================
         # 1️⃣ PROPERTY ANALYSIS (FIRST)
         # =====================================
+        property_analysis = None
         try:
-            property_results = get_drug_property_percentages(input_drugname)
-            create_property_analysis(input_drugname, property_results)
+            property_analysis = get_drug_property_percentages(input_drugname)
+            create_property_analysis(input_drugname, property_analysis)
         except Exception as e:
             st.error(f"Error in drug property analysis: {str(e)}")
 
@@ -742,7 +757,9 @@ def analysis_page():
                     <h3 style='color: #FF6B6B;'>🎯 Top Conditions</h3>
             """, unsafe_allow_html=True)
 
-            condition_counts = drug_info['conditions'].value_counts().head(5)
+            # a categorical counts every condition, keep the ones this drug has
+            condition_counts = drug_info['conditions'].value_counts()
+            condition_counts = condition_counts[condition_counts > 0].head(5)
 
             st.dataframe(
                 condition_counts.reset_index().rename(
@@ -754,6 +771,14 @@ def analysis_page():
 
             st.markdown("</div>", unsafe_allow_html=True)
 
+        # =====================================
+        # 📈 TRENDS (monthly rollups, no review scan)
+        # =====================================
+        try:
+            create_trend_section(input_drugname, property_analysis)
+        except Exception as e:
+            st.error(f"Error in trend analysis: {str(e)}")
+
         # =====================================
         # 3️⃣ SUMMARY (LAST - WITH LOADING)
         # =====================================
@@ -774,6 +799,78 @@ def analysis_page():
         st.info("👈 Please select a drug from the sidebar to begin analysis.")
 
 
+MAX_COMPARED_DRUGS = 6
+
+
+def comparison_page():
+    """Side-by-side comparison of several drugs"""
+
+    st.markdown('<h1 class="main-title">⚖️ Drug Comparison</h1>', unsafe_allow_html=True)
+
+    col1, col2 = st.columns([1, 5])
+    with col1:
+        if st.button("⬅ Back to Analysis"):
+            st.session_state.page = "analysis"
+            st.rerun()
+
+    st.markdown("---")
+
+    drug_names = sorted(data['drugName'].unique().tolist())
+    selected = st.multiselect(
+        f"Choose up to {MAX_COMPARED_DRUGS} drugs to compare:",
+        drug_names,
+        max_selections=MAX_COMPARED_DRUGS,
+        key="comparison_selector"
+    )
+
+    if len(selected) < 2:
+        st.info("Select at least two drugs to compare them side by side.")
+        return
+
+    # every drug's profile from one batched query (cached per drug)
+    try:
+        profiles = get_drug_profiles(selected)
+    except Exception as e:
+        st.error(f"Error in drug comparison: {str(e)}")
+        return
+
+    st.markdown("""
+        <div class='analysis-section'>
+            <h3 style='color: #FF6B6B;'>📋 Side-by-Side Profile</h3>
+    """, unsafe_allow_html=True)
+    st.dataframe(comparison_frame(profiles.values()), use_container_width=True)
+    st.markdown("</div>", unsafe_allow_html=True)
+
+    st.markdown("""
+        <div class='analysis-section'>
+            <h3 style='color: #FF6B6B;'>⚡ Property Mentions (% of reviews)</h3>
+    """, unsafe_allow_html=True)
+    mentions = pd.DataFrame({
+        drug: {property_label(prop): pct for prop, pct in analysis.percentages.items()}
+        for drug, analysis in profiles.items()
+    })
+    st.bar_chart(mentions)
+    st.markdown("</div>", unsafe_allow_html=True)
+
+    # summaries of every drug generated concurrently
+    with st.spinner("Generating AI-powered summaries... Please wait ⏳"):
+        try:
+            summaries = call_summarizations(selected)
+        except Exception as e:
+            st.error(f"Error in summarization: {str(e)}")
+            return
+
+    for column, drug in zip(st.columns(len(selected)), selected):
+        with column:
+            st.markdown(f"<h3 style='color: #FF6B6B;'>{drug}</h3>", unsafe_allow_html=True)
+            if isinstance(summaries[drug], Exception):
+                st.error(f"Error in summarization: {str(summaries[drug])}")
+            else:
+                st.markdown(summaries[drug])
+
+    logging.info('Streamlit comparison page worked Correctly')
+
+
 def main():
     """Main function to handle page navigation"""
     
@@ -786,6 +883,8 @@ def main():
         introduction_page()
     elif st.session_state.page == "analysis":
         analysis_page()
+    elif st.session_state.page == "comparison":
+        comparison_page()
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
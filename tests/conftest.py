@@ -0,0 +1,70 @@
+import os
+import sys
+import tempfile
+
+import numpy as np
+import pandas as pd
+import pytest
+
+# Unit tests run offline against temporary sqlite databases. The module level
+# paths of src/ (caches, snapshots, the analyzer's engine) are read at import,
+# so they are pointed at a scratch directory before anything is imported.
+# tests/test.py is the deployment smoke test and is run on its own.
+SCRATCH_DIR = tempfile.mkdtemp(prefix="drug_review_tests_")
+os.environ.update({
+    "DB_BACKEND": "sqlite",
+    "DB_PATH": os.path.join(SCRATCH_DIR, "default.sqlite"),
+    "ANALYSIS_CACHE_PATH": os.path.join(SCRATCH_DIR, "analysis_cache.sqlite"),
+    "LEMMA_CACHE_PATH": os.path.join(SCRATCH_DIR, "lemma_cache.sqlite"),
+    "PROCESSED_SNAPSHOT_DIR": os.path.join(SCRATCH_DIR, "snapshots"),
+    "REVIEW_INDEX_DIR": os.path.join(SCRATCH_DIR, "review_index"),
+})
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from db import get_engine
+from ingestion_state import get_state, advance_watermark
+from property_lexicon import property_bits, refresh_property_bits, compute_masks
+
+
+@pytest.fixture
+def engine(tmp_path):
+    """Empty local database with the raw_data and processed_data tables."""
+    return get_engine("sqlite", str(tmp_path / "drug_reviews.sqlite"))
+
+
+DRUGS = ["Sertraline", "Zoloft", "Ibuprofen", "Melatonin"]
+CONDITIONS = ["Depression", "Pain", "Insomnia", None]
+PHRASES = [
+    "made me drowsy", "no side effects", "terrible headache", "works great", "felt dizzy",
+    "pain relief within minutes", "upset stomach", "it is fine", "lasts all day",
+]
+
+
+@pytest.fixture
+def store_processed(engine):
+    """Writes random processed_data rows with current property masks and moves
+    the preprocessing watermark past them, as a committed run would."""
+    bits = property_bits(engine)
+    refresh_property_bits(engine)
+    get_state(engine)
+
+    def store(first_id, count, seed=0):
+        rng = np.random.default_rng(seed)
+        reviews = [" and ".join(rng.choice(PHRASES, rng.integers(1, 4))) for _ in range(count)]
+        rows = pd.DataFrame({
+            "uniqueID": np.arange(first_id, first_id + count),
+            "drugName": rng.choice(DRUGS, count),
+            "conditions": rng.choice(np.array(CONDITIONS, dtype=object), count),
+            "review": reviews,
+            "rating": rng.choice([1, 3, 5, 6, 8, 10, None], count),
+            "review_date": pd.to_datetime("2015-01-01")
+            + pd.to_timedelta(rng.integers(0, 900, count), unit="D"),
+            "property_mask": compute_masks(reviews, bits),
+        })
+        with engine.begin() as conn:
+            rows.to_sql("processed_data", conn, if_exists="append", index=False)
+            advance_watermark(conn, rows["uniqueID"].max(), count)
+        return rows
+
+    return store
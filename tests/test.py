@@ -1,9 +1,12 @@
 import os
 import sys
 import pandas as pd
-from sqlalchemy import create_engine, text
+from sqlalchemy import inspect, text
 from dotenv import load_dotenv
 
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'src'))
+from db import get_engine
+
 def fail(message, error=None):
     print(f"TEST FAILED: {message}")
     if error:
@@ -15,14 +18,15 @@ def ok(message):
 
 load_dotenv()
 
-required_envs = [
-    "DB_HOST",
-    "DB_PORT",
-    "DB_USER",
-    "DB_PASSWORD",
-    "DB_NAME",
-    "GROQ_API_KEY",
-]
+required_envs = ["GROQ_API_KEY"]
+if os.getenv("DB_BACKEND", "mysql") == "mysql":
+    required_envs = [
+        "DB_HOST",
+        "DB_PORT",
+        "DB_USER",
+        "DB_PASSWORD",
+        "DB_NAME",
+    ] + required_envs
 
 for var in required_envs:
     if not os.getenv(var):
@@ -30,11 +34,7 @@ for var in required_envs:
     ok(f"{var} loaded")
 
 try:
-    engine = create_engine(
-        f"mysql+pymysql://{os.getenv('DB_USER')}:{os.getenv('DB_PASSWORD')}"
-        f"@{os.getenv('DB_HOST')}:{int(os.getenv('DB_PORT'))}/{os.getenv('DB_NAME')}",
-        pool_pre_ping=True
-    )
+    engine = get_engine()
 
     with engine.connect() as conn:
         conn.execute(text("SELECT 1"))
@@ -45,8 +45,7 @@ except Exception as e:
 
 
 try:
-    tables_df = pd.read_sql("SHOW TABLES", engine)
-    tables = tables_df.iloc[:, 0].tolist()
+    tables = inspect(engine).get_table_names()
 
     for table in ["raw_data", "processed_data"]:
         if table not in tables:
@@ -0,0 +1,119 @@
+import time
+
+import pytest
+from sqlalchemy import inspect
+
+import analysis_cache
+from analysis_cache import ResultCache, data_version, invalidate_results
+from ingestion_state import STATE_TABLE, get_state
+
+
+@pytest.fixture(autouse=True)
+def no_check_delay(monkeypatch):
+    # every lookup re-reads the invalidation generation and the data version
+    monkeypatch.setattr(analysis_cache, "CHECK_SECONDS", 0)
+    monkeypatch.setitem(analysis_cache._version, "value", None)
+
+
+@pytest.fixture
+def cache_path(tmp_path):
+    return str(tmp_path / "analysis_cache.sqlite")
+
+
+def test_lru_evicts_the_least_recently_used_entry():
+    cache = ResultCache("lru", path=None, max_entries=2)
+    cache.put("a", "v1", 1)
+    cache.put("b", "v1", 2)
+    assert cache.get("a", "v1") == (True, 1)
+    cache.put("c", "v1", 3)
+    assert cache.get("b", "v1") == (False, None)
+    assert cache.get("a", "v1") == (True, 1)
+    assert cache.get("c", "v1") == (True, 3)
+    assert cache.stats()["evictions"] == 1
+
+
+def test_entries_expire_after_the_ttl(cache_path):
+    cache = ResultCache("ttl", path=cache_path, ttl=0.05)
+    cache.put(["drug", True], "v1", {"reviews": 3})
+    assert cache.get(["drug", True], "v1") == (True, {"reviews": 3})
+    time.sleep(0.1)
+    # neither the memory nor the disk tier serves it anymore
+    assert cache.get(["drug", True], "v1") == (False, None)
+    assert ResultCache("ttl", path=cache_path, ttl=0.05).get(["drug", True], "v1") == (False, None)
+
+
+def test_other_versions_miss():
+    cache = ResultCache("version", path=None)
+    cache.put("a", "v1", 1)
+    assert cache.get("a", "v2") == (False, None)
+
+
+def test_disk_tier_is_shared_between_processes(cache_path):
+    ResultCache("shared", path=cache_path).put("a", "v1", [1, 2])
+    other = ResultCache("shared", path=cache_path)
+    assert other.get("a", "v1") == (True, [1, 2])
+    assert other.get("a", "v1") == (True, [1, 2])
+    assert (other.disk_hits, other.memory_hits) == (1, 1)
+    # namespaces do not see each other's entries
+    assert ResultCache("other", path=cache_path).get("a", "v1") == (False, None)
+
+
+def test_new_version_prunes_older_disk_entries(cache_path):
+    cache = ResultCache("prune", path=cache_path)
+    cache.put("a", "v1", 1)
+    cache.put("b", "v1", 2)
+    cache.put("a", "v2", 3)
+    assert cache.disk_entries() == {"v2": 1}
+
+
+def test_invalidation_reaches_other_processes(cache_path):
+    app = ResultCache("generation", path=cache_path)
+    app.put("a", "v1", 1)
+    assert app.get("a", "v1") == (True, 1)
+
+    pipeline = ResultCache("generation", path=cache_path)
+    pipeline.invalidate()
+    assert pipeline.generation == 1
+    # the entry is gone from the app's memory, not only from disk
+    assert app.get("a", "v1") == (False, None)
+    assert app.generation == 1
+
+
+def test_invalidate_results_bumps_every_namespace():
+    invalidate_results(("first", "second"))
+    invalidate_results(("first",))
+    generations = {}
+    for namespace in ("first", "second"):
+        cache = ResultCache(namespace)
+        cache._sync()
+        generations[namespace] = cache.generation
+    assert generations == {"first": 2, "second": 1}
+
+
+def test_unusable_disk_tier_falls_back_to_memory(tmp_path):
+    blocker = tmp_path / "file"
+    blocker.write_text("")
+    cache = ResultCache("memory", path=str(blocker / "cache.sqlite"))
+    cache.put("a", "v1", 1)
+    assert cache.get("a", "v1") == (True, 1)
+    assert cache.path is None
+
+
+def test_get_or_compute_computes_once():
+    cache = ResultCache("compute", path=None)
+    calls = []
+    compute = lambda: calls.append(1) or {"value": len(calls)}
+    assert cache.get_or_compute("a", "v1", compute) == {"value": 1}
+    assert cache.get_or_compute("a", "v1", compute) == {"value": 1}
+    assert len(calls) == 1
+    assert cache.stats()["hit_rate"] == 0.5
+
+
+def test_data_version_is_read_only(engine):
+    assert data_version(engine) == "none"
+    assert STATE_TABLE not in inspect(engine).get_table_names()
+
+
+def test_data_version_follows_the_state(engine):
+    state = get_state(engine)
+    assert data_version(engine) == f"{state['high_water_mark']}:{state['total_rows']}:None"
@@ -0,0 +1,38 @@
+import pytest
+from sqlalchemy import text
+
+import drug_property_analyzer
+from conftest import DRUGS
+
+
+@pytest.fixture
+def analyzer(engine, monkeypatch, store_processed):
+    monkeypatch.setattr(drug_property_analyzer, "engine", engine)
+    store_processed(0, 300)
+    return drug_property_analyzer
+
+
+def test_sql_mode_equals_python_mode(analyzer):
+    for drug in DRUGS + ["Unknown"]:
+        comparison = analyzer.compare_analysis_modes(drug, repeat=1)
+        assert comparison["equal"], comparison["differences"]
+
+
+def test_modes_agree_when_masks_are_missing(analyzer, engine):
+    # rows written before their mask was computed are matched on the text
+    with engine.begin() as conn:
+        conn.execute(text("UPDATE processed_data SET property_mask = NULL WHERE uniqueID % 7 = 0"))
+    for drug in DRUGS:
+        comparison = analyzer.compare_analysis_modes(drug, repeat=1)
+        assert comparison["equal"], comparison["differences"]
+
+
+def test_modes_agree_on_distinct_reviews(analyzer, engine):
+    with engine.begin() as conn:
+        conn.execute(text("UPDATE processed_data SET canonical_id = uniqueID"))
+        conn.execute(text("UPDATE processed_data SET canonical_id = 0 WHERE uniqueID % 5 = 0 AND uniqueID > 0"))
+    for drug in DRUGS:
+        comparison = analyzer.compare_analysis_modes(drug, distinct_reviews=True, repeat=1)
+        assert comparison["equal"], comparison["differences"]
+    counted = analyzer.analyze_drugs(DRUGS, distinct_reviews=True, mode="sql")
+    assert sum(analysis.reviews for analysis in counted.values()) == 300 - 59
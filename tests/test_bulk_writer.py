@@ -0,0 +1,75 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from db import get_engine
+from bulk_writer import ProcessedWriter, ensure_unique_key
+
+
+@pytest.fixture(params=["sqlite", "duckdb"])
+def keyed_engine(request, tmp_path):
+    if request.param == "duckdb":
+        pytest.importorskip("duckdb_engine")
+    engine = get_engine(request.param, str(tmp_path / f"drug_reviews.{request.param}"))
+    ensure_unique_key(engine)
+    ensure_unique_key(engine)
+    return engine
+
+
+def chunk(ids, benefit=1):
+    return pd.DataFrame({
+        "uniqueID": ids,
+        "drugName": "Drug",
+        "rating": [np.nan if uid % 3 == 0 else 8 for uid in ids],
+        "review_date": [pd.NaT if uid % 4 == 0 else pd.Timestamp("2016-03-01") for uid in ids],
+        "benefit_mentions": benefit,
+    })
+
+
+def write(engine, writer, df):
+    with engine.begin() as conn:
+        return writer.write(conn, df)
+
+
+def stored(engine):
+    return pd.read_sql(
+        "SELECT uniqueID, rating, review_date, benefit_mentions FROM processed_data ORDER BY uniqueID",
+        engine,
+    )
+
+
+@pytest.mark.parametrize("strategy", ["multi_values", "load_data"])
+def test_rewrites_are_ignored(keyed_engine, strategy):
+    writer = ProcessedWriter(strategy, batch_size=3)
+    assert write(keyed_engine, writer, chunk(range(10))) == 10
+    write(keyed_engine, writer, chunk(range(5, 15), benefit=2))
+    rows = stored(keyed_engine)
+    assert rows["uniqueID"].tolist() == list(range(15))
+    assert rows["benefit_mentions"].tolist() == [1] * 10 + [2] * 5
+
+
+def test_upsert_replaces_rewritten_rows(keyed_engine):
+    writer = ProcessedWriter("upsert", batch_size=4)
+    write(keyed_engine, writer, chunk(range(10)))
+    write(keyed_engine, writer, chunk(range(5, 15), benefit=2))
+    rows = stored(keyed_engine)
+    assert rows["uniqueID"].tolist() == list(range(15))
+    assert rows["benefit_mentions"].tolist() == [1] * 5 + [2] * 10
+    assert writer.report()["rows"] == 20
+
+
+def test_missing_values_are_stored_as_null(keyed_engine):
+    write(keyed_engine, ProcessedWriter("upsert"), chunk(range(5)))
+    rows = stored(keyed_engine)
+    assert rows["rating"].isna().tolist() == [True, False, False, True, False]
+    assert rows["review_date"].isna().tolist() == [True, False, False, False, True]
+    assert str(pd.Timestamp(rows["review_date"].iloc[1]).date()) == "2016-03-01"
+
+
+def test_empty_chunks_write_nothing(keyed_engine):
+    assert write(keyed_engine, ProcessedWriter("upsert"), chunk([])) == 0
+
+
+def test_unknown_strategy():
+    with pytest.raises(ValueError):
+        ProcessedWriter("copy")
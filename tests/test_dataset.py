@@ -0,0 +1,63 @@
+import pytest
+
+from dataset import load_dataset, fetch_reviews, with_reviews, memory_report
+from snapshot import publish_snapshot
+
+COLUMNS = ["uniqueID", "drugName", "conditions", "rating"]
+
+
+@pytest.fixture
+def snapshot_dir(tmp_path):
+    return str(tmp_path / "snapshots")
+
+
+@pytest.fixture
+def rows(store_processed):
+    return store_processed(0, 60, seed=4)
+
+
+def check_lean(frame, rows):
+    assert frame["uniqueID"].tolist() == rows["uniqueID"].tolist()
+    assert str(frame["drugName"].dtype) == "category"
+    assert str(frame["rating"].dtype) == "Int8"  # nullable: some ratings are missing
+    assert frame["drugName"].astype(str).tolist() == rows["drugName"].tolist()
+    assert frame["conditions"].isna().tolist() == rows["conditions"].isna().tolist()
+    assert frame["rating"].isna().tolist() == rows["rating"].isna().tolist()
+    assert frame["rating"].sum() == rows["rating"].dropna().sum()
+
+
+def test_database_fallback_without_a_snapshot(engine, rows, snapshot_dir):
+    check_lean(load_dataset(COLUMNS, engine, snapshot_dir), rows)
+
+
+def test_snapshot_frame_is_cached_per_version(engine, store_processed, rows, snapshot_dir):
+    publish_snapshot(engine, snapshot_dir, watermark=59)
+    frame = load_dataset(COLUMNS, engine, snapshot_dir)
+    check_lean(frame, rows)
+    assert load_dataset(COLUMNS, engine, snapshot_dir) is frame
+
+    store_processed(60, 5, seed=5)
+    publish_snapshot(engine, snapshot_dir, watermark=64)
+    assert len(load_dataset(COLUMNS, engine, snapshot_dir)) == 65
+
+
+@pytest.mark.parametrize("published", [False, True])
+def test_reviews_are_fetched_in_the_requested_order(engine, rows, snapshot_dir, published):
+    if published:
+        publish_snapshot(engine, snapshot_dir, watermark=59)
+    wanted = [42, 3, 17, 1000]
+    reviews = fetch_reviews(wanted, engine, snapshot_dir)
+    assert reviews.index.tolist() == wanted
+    assert reviews.iloc[:3].tolist() == rows.set_index("uniqueID")["review"].loc[wanted[:3]].tolist()
+    assert reviews.isna().tolist() == [False, False, False, True]
+    assert fetch_reviews([], engine, snapshot_dir).empty
+
+    preview = with_reviews(load_dataset(COLUMNS, engine, snapshot_dir).head(3), engine, snapshot_dir)
+    assert preview["review"].tolist() == rows["review"].head(3).tolist()
+
+
+def test_memory_report(engine, rows, snapshot_dir):
+    publish_snapshot(engine, snapshot_dir, watermark=59)
+    report = memory_report(COLUMNS, engine, snapshot_dir)
+    assert report["columns"] == COLUMNS
+    assert report["saved_pct"] > 0
@@ -0,0 +1,87 @@
+import pandas as pd
+import pytest
+from sqlalchemy import text
+
+from ingestion_state import STATE_TABLE, PIPELINE_NAME, FULL_REBUILD, start_run, get_watermark
+from property_lexicon import medical_properties
+from drug_leaderboard import (
+    STATS_TABLE, LEADERBOARD_PIPELINE, NO_CONDITION, refresh_leaderboard, rank_drugs,
+)
+
+
+def stats(engine):
+    return pd.read_sql(
+        f"SELECT * FROM {STATS_TABLE} ORDER BY drugName, conditions, property_name", engine
+    )
+
+
+def recount(rows):
+    """Leaderboard rows counted straight from processed_data rows."""
+    rows = rows.assign(conditions=rows["conditions"].fillna(NO_CONDITION))
+    counts = []
+    for name in medical_properties:
+        mentioned = rows["review"].map(
+            lambda review: any(keyword.lower() in review for keyword in medical_properties[name])
+        )
+        grouped = mentioned.groupby([rows["drugName"], rows["conditions"]])
+        counts.append(pd.DataFrame({
+            "property_name": name, "reviews": grouped.size(), "mentions": grouped.sum(),
+        }).reset_index())
+    return (
+        pd.concat(counts)[["drugName", "conditions", "property_name", "reviews", "mentions"]]
+        .sort_values(["drugName", "conditions", "property_name"], ignore_index=True)
+    )
+
+
+def test_incremental_counts_equal_a_full_recount(engine, store_processed):
+    batches = [store_processed(0, 150, seed=1)]
+    assert refresh_leaderboard(engine, chunk_size=40) == 150
+    batches += [store_processed(150, 70, seed=2), store_processed(220, 90, seed=3)]
+    assert refresh_leaderboard(engine, chunk_size=40) == 160
+    assert refresh_leaderboard(engine) == 0
+    incremental = stats(engine)
+
+    assert refresh_leaderboard(engine, rebuild=True) == 310
+    pd.testing.assert_frame_equal(incremental, stats(engine))
+    pd.testing.assert_frame_equal(
+        incremental, recount(pd.concat(batches, ignore_index=True)), check_dtype=False
+    )
+    assert get_watermark(engine, LEADERBOARD_PIPELINE) == 309
+
+
+def test_rows_above_the_pipeline_watermark_wait(engine, store_processed):
+    store_processed(0, 50)
+    # a partition still running has already written rows the watermark does not cover
+    store_processed(50, 30, seed=1)
+    with engine.begin() as conn:
+        conn.execute(text(f"UPDATE {STATE_TABLE} SET high_water_mark = 49 WHERE pipeline = :pipeline"),
+                     {"pipeline": PIPELINE_NAME})
+    assert refresh_leaderboard(engine) == 50
+    assert stats(engine)["reviews"].sum() == 50 * len(medical_properties)
+
+
+def test_processed_data_rebuild_is_recounted(engine, store_processed):
+    store_processed(0, 100)
+    refresh_leaderboard(engine)
+
+    start_run(engine, FULL_REBUILD)
+    rows = store_processed(0, 40, seed=5)
+    assert refresh_leaderboard(engine) == 40
+    pd.testing.assert_frame_equal(stats(engine), recount(rows), check_dtype=False)
+
+
+def test_rank_drugs_orders_by_share(engine, store_processed):
+    rows = store_processed(0, 400)
+    refresh_leaderboard(engine)
+    drowsy = rows.assign(hit=rows["review"].str.contains("drowsy")).groupby("drugName")["hit"].mean()
+
+    ranking = rank_drugs(engine, "causes_drowsiness", min_reviews=1)
+    assert ranking["drugName"].tolist() == drowsy.sort_values(ascending=False).index.tolist()
+    assert ranking["percentage"].tolist() == (drowsy.sort_values(ascending=False) * 100).round(1).tolist()
+    least = rank_drugs(engine, "causes_drowsiness", min_reviews=1, least=True)
+    assert least["drugName"].tolist() == ranking["drugName"].tolist()[::-1]
+
+
+def test_rank_drugs_rejects_unknown_properties(engine):
+    with pytest.raises(ValueError):
+        rank_drugs(engine, "cures_everything")
@@ -0,0 +1,71 @@
+import pandas as pd
+import pytest
+
+from drug_trends import (
+    TRENDS_TABLE, TRENDS_PIPELINE, refresh_trends, property_trends, rating_trend, property_share,
+)
+from ingestion_state import get_watermark
+
+
+def trends(engine):
+    return pd.read_sql(
+        f"SELECT * FROM {TRENDS_TABLE} ORDER BY drugName, month, rating_bucket, property_name", engine
+    )
+
+
+@pytest.fixture
+def rows(engine, store_processed):
+    """Three batches of processed rows, counted incrementally in small chunks."""
+    batches = [store_processed(0, 150, seed=1)]
+    refresh_trends(engine, chunk_size=40)
+    batches += [store_processed(150, 70, seed=2), store_processed(220, 90, seed=3)]
+    refresh_trends(engine, chunk_size=40)
+    return pd.concat(batches, ignore_index=True)
+
+
+def test_incremental_rollups_equal_a_full_recount(engine, rows):
+    assert refresh_trends(engine) == 0
+    assert get_watermark(engine, TRENDS_PIPELINE) == 309
+    incremental = trends(engine)
+    assert refresh_trends(engine, rebuild=True) == 310
+    pd.testing.assert_frame_equal(incremental, trends(engine))
+
+
+def test_property_share_matches_the_reviews(engine, rows):
+    zoloft = rows[(rows["drugName"] == "Zoloft") & (rows["review_date"] >= "2016-01-01")
+                  & (rows["review_date"] < "2017-01-01")]
+    mentions = int(zoloft["review"].str.contains("headache").sum())
+    assert property_share(engine, "Zoloft", "causes_headache", since="2016", until="2017") == {
+        "reviews": len(zoloft),
+        "mentions": mentions,
+        "percentage": round(mentions / len(zoloft) * 100, 1),
+    }
+    assert property_share(engine, "Unknown", "causes_headache")["percentage"] is None
+
+
+def test_periods_sum_up_the_months(engine, rows):
+    monthly = property_trends(engine, "Zoloft", ["causes_drowsiness"])
+    quarterly = property_trends(engine, "Zoloft", ["causes_drowsiness"], freq="quarter")
+    assert monthly["reviews"].sum() == quarterly["reviews"].sum() == (rows["drugName"] == "Zoloft").sum()
+    assert quarterly["period"].is_monotonic_increasing
+    assert quarterly["period"].iloc[0] == "2015Q1"
+
+
+def test_rating_trend(engine, rows):
+    trend = rating_trend(engine, "Ibuprofen", freq="year")
+    ibuprofen = rows[rows["drugName"] == "Ibuprofen"]
+    years = ibuprofen.groupby(ibuprofen["review_date"].dt.year.astype(str))
+    assert trend["period"].tolist() == list(years.groups)
+    assert trend["reviews"].tolist() == years.size().tolist()
+    ratings = pd.to_numeric(ibuprofen["rating"])
+    expected = ratings.groupby(ibuprofen["review_date"].dt.year).mean().round(2)
+    assert trend["avg_rating"].tolist() == pytest.approx(expected.tolist())
+    shares = trend[["negative_pct", "neutral_pct", "positive_pct"]].sum(axis=1)
+    assert (shares <= 100.1).all()
+
+
+def test_unknown_arguments_are_rejected(engine, rows):
+    with pytest.raises(ValueError):
+        property_trends(engine, "Zoloft", ["cures_everything"])
+    with pytest.raises(ValueError):
+        property_trends(engine, "Zoloft", freq="week")
@@ -0,0 +1,78 @@
+import pandas as pd
+
+from ingestion_state import (
+    NO_WATERMARK, INCREMENTAL, FULL_REBUILD, get_state, get_watermark, read_state, start_run,
+    advance_watermark, finish_run,
+)
+
+
+def store(engine, ids):
+    pd.DataFrame({"uniqueID": ids, "drugName": "Drug"}).to_sql(
+        "processed_data", engine, if_exists="append", index=False
+    )
+
+
+def test_fresh_state_is_below_unique_id_zero(engine):
+    assert get_watermark(engine) == NO_WATERMARK
+    assert NO_WATERMARK < 0
+
+
+def test_bootstrap_seeds_from_the_stored_rows(engine):
+    store(engine, [0, 3, 7])
+    state = get_state(engine)
+    assert (state["high_water_mark"], state["total_rows"]) == (7, 3)
+
+
+def test_bootstrap_with_only_unique_id_zero(engine):
+    store(engine, [0])
+    assert get_watermark(engine) == 0
+
+
+def test_watermark_only_moves_forward(engine):
+    get_state(engine)
+    with engine.begin() as conn:
+        advance_watermark(conn, 0, 1)
+    assert get_watermark(engine) == 0
+    with engine.begin() as conn:
+        advance_watermark(conn, 10, 5)
+        advance_watermark(conn, 4, 2)
+    state = get_state(engine)
+    assert (state["high_water_mark"], state["total_rows"]) == (10, 6)
+
+
+def test_watermark_rolls_back_with_the_data(engine):
+    get_state(engine)
+    try:
+        with engine.begin() as conn:
+            advance_watermark(conn, 10, 5)
+            raise RuntimeError("write failed")
+    except RuntimeError:
+        pass
+    assert get_watermark(engine) == NO_WATERMARK
+
+
+def test_full_rebuild_empties_processed_data(engine):
+    store(engine, [0, 1, 2])
+    assert start_run(engine, INCREMENTAL) == 2
+    assert start_run(engine, FULL_REBUILD) == NO_WATERMARK
+    assert pd.read_sql("SELECT COUNT(*) AS n FROM processed_data", engine)["n"][0] == 0
+    finish_run(engine)
+    state = read_state(engine)
+    assert (state["last_run_mode"], state["last_run_status"]) == (FULL_REBUILD, "success")
+
+
+def test_resumed_rebuild_keeps_its_progress(engine):
+    start_run(engine, FULL_REBUILD)
+    store(engine, [0, 1])
+    with engine.begin() as conn:
+        advance_watermark(conn, 1, 2)
+    assert start_run(engine, FULL_REBUILD, resume=True) == 1
+    assert read_state(engine)["last_run_rows"] == 2
+
+
+def test_read_state_never_writes(engine):
+    assert read_state(engine) is None
+    assert read_state(engine, "other_pipeline") is None
+    get_state(engine)
+    assert read_state(engine)["high_water_mark"] == NO_WATERMARK
+    assert read_state(engine, "other_pipeline") is None
@@ -0,0 +1,54 @@
+from keyword_matcher import KeywordMatcher
+
+FAMILIES = {
+    "benefit_mentions": ["pain relief", "works", "no side effects"],
+    "side_effect_mentions": ["pain", "side effects", "headache"],
+}
+
+
+def counts(texts, families=FAMILIES):
+    return KeywordMatcher(families).count(texts).to_dict("records")
+
+
+def test_longest_phrase_wins_over_contained_keyword():
+    # "pain relief" is a benefit, the "pain" inside it is not a side effect
+    assert counts(["great pain relief"]) == [{"benefit_mentions": 1, "side_effect_mentions": 0}]
+    # "no side effects" hides "side effects"
+    assert counts(["no side effects at all"]) == [{"benefit_mentions": 1, "side_effect_mentions": 0}]
+
+
+def test_keyword_outside_a_longer_phrase_still_counts():
+    assert counts(["pain relief but then pain again"]) == [
+        {"benefit_mentions": 1, "side_effect_mentions": 1}
+    ]
+
+
+def test_matches_respect_word_boundaries():
+    assert counts(["painful headaches"]) == [{"benefit_mentions": 0, "side_effect_mentions": 0}]
+
+
+def test_distinct_keywords_are_counted_once_per_review():
+    assert counts(["headache headache pain headache"]) == [
+        {"benefit_mentions": 0, "side_effect_mentions": 2}
+    ]
+
+
+def test_partial_phrase_falls_back_to_shorter_keyword():
+    # "pain" followed by something other than "relief" is still the keyword "pain"
+    assert counts(["pain reliever"]) == [{"benefit_mentions": 0, "side_effect_mentions": 1}]
+
+
+def test_phrase_listed_in_two_families_counts_for_the_first():
+    families = {"first": ["dry mouth"], "second": ["dry mouth", "rash"]}
+    assert counts(["dry mouth and rash"], families) == [{"first": 1, "second": 1}]
+
+
+def test_non_text_rows_count_nothing():
+    assert counts([None, float("nan"), ""]) == [
+        {"benefit_mentions": 0, "side_effect_mentions": 0}
+    ] * 3
+
+
+def test_phrases_go_through_the_normalizer():
+    matcher = KeywordMatcher({"benefit": ["Works Great"]}, normalize=lambda p: p.lower().split()[:1])
+    assert matcher.count(["it works"])["benefit"].tolist() == [1]
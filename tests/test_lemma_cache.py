@@ -0,0 +1,79 @@
+import pytest
+
+from lemma_cache import LemmaCache
+
+
+class CountingLemmatizer:
+    """Strips a trailing "s" and counts the calls the cache could not avoid."""
+
+    def __init__(self):
+        self.calls = 0
+
+    def lemmatize(self, token):
+        self.calls += 1
+        return token[:-1] if token.endswith("s") else token
+
+
+@pytest.fixture
+def path(tmp_path):
+    return str(tmp_path / "lemma_cache.sqlite")
+
+
+def new_cache(path, version="wordnet-1", **kwargs):
+    lemmatizer = CountingLemmatizer()
+    return LemmaCache(path, lemmatizer=lemmatizer, version=version, **kwargs), lemmatizer
+
+
+def test_repeated_tokens_are_lemmatized_once(path):
+    cache, lemmatizer = new_cache(path)
+    assert [cache.lemmatize(t) for t in ["pills", "pills", "day", "pills"]] == ["pill", "pill", "day", "pill"]
+    assert lemmatizer.calls == 2
+    assert cache.take_stats() == (2, 2)
+    assert cache.take_stats() == (0, 0)
+
+
+def test_flushed_lemmas_are_shared_with_later_runs(path):
+    cache, _ = new_cache(path)
+    cache.lemmatize("pills")
+    cache.flush()
+
+    later, lemmatizer = new_cache(path)
+    assert later.lemmatize("pills") == "pill"
+    assert lemmatizer.calls == 0
+    # unflushed lemmas are not
+    cache.lemmatize("days")
+    assert new_cache(path)[0].disk_entries == 1
+
+
+def test_another_resource_version_drops_the_entries(path):
+    cache, _ = new_cache(path)
+    cache.lemmatize("pills")
+    cache.flush()
+
+    upgraded, lemmatizer = new_cache(path, version="wordnet-2")
+    assert upgraded.disk_entries == 0
+    upgraded.lemmatize("pills")
+    assert lemmatizer.calls == 1
+
+
+def test_entries_beyond_the_lru_are_read_from_disk(path):
+    cache, _ = new_cache(path)
+    for token in ["pills", "days", "doses"]:
+        cache.lemmatize(token)
+    cache.flush()
+
+    small, lemmatizer = new_cache(path, max_entries=1)
+    assert len(small.entries) == 1
+    assert [small.lemmatize(t) for t in ["pills", "days", "doses"]] == ["pill", "day", "dose"]
+    assert lemmatizer.calls == 0
+    assert len(small.entries) == 1
+
+
+def test_unusable_path_disables_the_disk_tier(tmp_path):
+    blocker = tmp_path / "file"
+    blocker.write_text("")
+    cache, lemmatizer = new_cache(str(blocker / "lemma_cache.sqlite"))
+    assert cache.path is None
+    assert cache.lemmatize("pills") == "pill"
+    cache.flush()
+    assert lemmatizer.calls == 1
@@ -0,0 +1,30 @@
+from Text_preprocessing import adapt_batch_size
+
+LIMITS = {"target": 2.0, "min_size": 50, "max_size": 5000}
+
+
+def test_slow_writes_halve_the_batch():
+    assert adapt_batch_size(800, 2.5, **LIMITS) == 400
+
+
+def test_fast_writes_double_the_batch():
+    assert adapt_batch_size(800, 0.5, **LIMITS) == 1600
+
+
+def test_writes_near_the_target_keep_the_batch():
+    assert adapt_batch_size(800, 1.0, **LIMITS) == 800
+    assert adapt_batch_size(800, 2.0, **LIMITS) == 800
+
+
+def test_batch_size_stays_within_limits():
+    assert adapt_batch_size(60, 10.0, **LIMITS) == 50
+    assert adapt_batch_size(50, 10.0, **LIMITS) == 50
+    assert adapt_batch_size(4000, 0.1, **LIMITS) == 5000
+    assert adapt_batch_size(5000, 0.1, **LIMITS) == 5000
+
+
+def test_repeated_slow_writes_converge_to_the_minimum():
+    size = 5000
+    for _ in range(10):
+        size = adapt_batch_size(size, 3.0, **LIMITS)
+    assert size == 50
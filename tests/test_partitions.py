@@ -0,0 +1,47 @@
+import pandas as pd
+import pytest
+
+from ingestion_state import NO_WATERMARK
+from Text_preprocessing import plan_partitions, count_pending
+
+IDS = [0, 1, 2, 5, 6, 9, 10, 11, 20]
+
+
+@pytest.fixture
+def raw(engine):
+    pd.DataFrame({"uniqueID": IDS, "drugName": "Drug", "review": "text"}).to_sql(
+        "raw_data", engine, if_exists="append", index=False
+    )
+    return engine
+
+
+def covered(partitions):
+    return [uid for uid in IDS for p in partitions if p["start"] < uid <= p["end"]]
+
+
+def test_partitions_split_on_existing_ids(raw):
+    partitions = plan_partitions(raw, NO_WATERMARK, 20, 3)
+    assert partitions == [{"start": -1, "end": 2}, {"start": 2, "end": 9}, {"start": 9, "end": 20}]
+    assert covered(partitions) == IDS
+
+
+def test_last_partition_ends_at_until_id(raw):
+    partitions = plan_partitions(raw, 1, 11, 4)
+    assert partitions == [{"start": 1, "end": 9}, {"start": 9, "end": 11}]
+    assert covered(partitions) == [2, 5, 6, 9, 10, 11]
+
+
+def test_partition_larger_than_the_range(raw):
+    assert plan_partitions(raw, NO_WATERMARK, 20, 100) == [{"start": -1, "end": 20}]
+
+
+def test_nothing_to_plan(raw):
+    assert plan_partitions(raw, 20, 20, 3) == []
+
+
+def test_count_pending_includes_unique_id_zero(raw):
+    assert count_pending(raw) == {"watermark": NO_WATERMARK, "pending": len(IDS), "max_id": 20}
+
+
+def test_count_pending_without_new_rows(engine):
+    assert count_pending(engine) == {"watermark": NO_WATERMARK, "pending": 0, "max_id": NO_WATERMARK}
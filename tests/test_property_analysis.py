@@ -0,0 +1,77 @@
+import json
+
+import pytest
+
+import drug_property_analyzer
+from property_analysis import PropertyAnalysis, ConditionShare, render_markdown, comparison_frame
+from property_lexicon import medical_properties
+
+ANALYSIS = PropertyAnalysis(
+    drug_name="Sertraline",
+    reviews=40,
+    avg_rating=7.25,
+    counts={"causes_drowsiness": 10, "causes_nausea": 0},
+    percentages={"causes_drowsiness": 25.0, "causes_nausea": 0.0},
+    top_conditions=[ConditionShare("Depression", 30, 75.0), ConditionShare("Anxiety", 10, 25.0)],
+)
+
+
+@pytest.fixture
+def analyzer(engine, monkeypatch):
+    monkeypatch.setattr(drug_property_analyzer, "engine", engine)
+    return drug_property_analyzer
+
+
+def test_dict_round_trip():
+    assert PropertyAnalysis.from_dict(ANALYSIS.to_dict()) == ANALYSIS
+    assert isinstance(PropertyAnalysis.from_dict(ANALYSIS.to_dict()).top_conditions[0], ConditionShare)
+
+
+def test_json_round_trip():
+    payload = ANALYSIS.to_json()
+    assert json.loads(payload)["top_conditions"][0] == {"name": "Depression", "reviews": 30, "percentage": 75.0}
+    assert PropertyAnalysis.from_json(payload) == ANALYSIS
+
+
+def test_msgpack_round_trip():
+    pytest.importorskip("msgpack")
+    assert PropertyAnalysis.from_msgpack(ANALYSIS.to_msgpack()) == ANALYSIS
+
+
+def test_empty_analysis():
+    empty = PropertyAnalysis.from_dict(PropertyAnalysis("Unknown").to_dict())
+    assert empty.empty and empty.avg_rating is None
+    assert render_markdown(empty) == ["No reviews found for Unknown"]
+
+
+def test_render_markdown():
+    lines = render_markdown(ANALYSIS)
+    assert lines[1] == "- Depression: 30 reviews (75.0%)"
+    assert "- 25.0% of reviews mention Causes Drowsiness" in lines
+    assert lines[-1] == "\n**Overall Stats:** 40 reviews, Avg rating: 7.2/10"
+
+
+def test_comparison_frame_has_one_column_per_drug():
+    frame = comparison_frame([ANALYSIS, PropertyAnalysis("Unknown")])
+    assert list(frame.columns) == ["Sertraline", "Unknown"]
+    assert frame.loc["Top condition", "Unknown"] == "N/A"
+    assert frame.loc["Causes Drowsiness (%)", "Sertraline"] == 25.0
+
+
+@pytest.mark.parametrize("mode", drug_property_analyzer.ANALYSIS_MODES)
+def test_analyzer_results_are_plain_json(analyzer, store_processed, mode):
+    store_processed(0, 200)
+    analysis = analyzer.analyze_drug_properties("Zoloft", mode=mode)
+    data = analysis.to_dict()
+    assert PropertyAnalysis.from_json(json.dumps(data)) == analysis
+    assert type(data["reviews"]) is int and type(data["avg_rating"]) is float
+    assert all(type(value) is int for value in data["counts"].values())
+    assert all(type(value) is float for value in data["percentages"].values())
+    for condition in data["top_conditions"]:
+        assert type(condition["reviews"]) is int and type(condition["percentage"]) is float
+    assert list(data["percentages"]) == list(medical_properties)
+
+
+def test_unknown_drug_is_empty(analyzer, store_processed):
+    store_processed(0, 20)
+    assert analyzer.analyze_drug_properties("Unknown").empty
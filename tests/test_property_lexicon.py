@@ -0,0 +1,108 @@
+import numpy as np
+import pandas as pd
+import pytest
+from sqlalchemy import text
+
+import property_lexicon
+from property_lexicon import (
+    compute_masks, mask_matrix, property_bits, refresh_property_bits, current_property_bits,
+    stored_lexicon,
+)
+
+LEXICON = {
+    "causes_drowsiness": ["drowsy", "sleepy"],
+    "causes_nausea": ["nausea", "queasy"],
+    "causes_headache": ["headache"],
+}
+
+
+@pytest.fixture
+def lexicon(monkeypatch):
+    """Swap the lexicon of property_lexicon, returns a setter for later edits."""
+    def use(properties):
+        monkeypatch.setattr(property_lexicon, "medical_properties", properties)
+        monkeypatch.setattr(property_lexicon, "_matcher", None)
+    use(dict(LEXICON))
+    return use
+
+
+def store_reviews(engine, reviews, masks=None):
+    pd.DataFrame({
+        "uniqueID": range(len(reviews)),
+        "drugName": "Drug",
+        "review": reviews,
+        "property_mask": masks,
+    }).to_sql("processed_data", engine, if_exists="append", index=False)
+
+
+def stored_masks(engine):
+    with engine.connect() as conn:
+        return [row[0] for row in conn.execute(
+            text("SELECT property_mask FROM processed_data ORDER BY uniqueID")
+        )]
+
+
+def test_compute_masks_uses_the_given_bits(lexicon):
+    bits = {"causes_drowsiness": 3, "causes_nausea": 0, "causes_headache": 5}
+    reviews = ["so Sleepy today", "nausea and drowsy", "fine", None]
+    assert compute_masks(reviews, bits).tolist() == [8, 9, 0, 0]
+    # limited to some properties, the other bits stay 0
+    assert compute_masks(reviews, bits, properties=["causes_nausea"]).tolist() == [0, 1, 0, 0]
+
+
+def test_mask_matrix_reads_the_bits_back(lexicon):
+    bits = {"causes_drowsiness": 3, "causes_nausea": 0, "causes_headache": 5}
+    matrix = mask_matrix(np.array([8, 9, 0, 32]), bits)
+    assert matrix.to_dict("list") == {
+        "causes_drowsiness": [True, True, False, False],
+        "causes_nausea": [False, True, False, False],
+        "causes_headache": [False, False, False, True],
+    }
+
+
+def test_existing_bits_never_move(engine, lexicon):
+    assert property_bits(engine) == {"causes_drowsiness": 0, "causes_nausea": 1, "causes_headache": 2}
+    refresh_property_bits(engine)
+
+    # a removed property keeps its bit until the masks were refreshed
+    lexicon({"causes_drowsiness": ["drowsy"], "causes_headache": ["headache"], "causes_rash": ["rash"]})
+    assert property_bits(engine) == {"causes_drowsiness": 0, "causes_headache": 2, "causes_rash": 3}
+    refresh_property_bits(engine)
+    assert "causes_nausea" not in stored_lexicon(engine)
+
+    # its bit is free again afterwards
+    lexicon({"causes_drowsiness": ["drowsy"], "causes_headache": ["headache"],
+             "causes_rash": ["rash"], "causes_itching": ["itchy"]})
+    assert property_bits(engine)["causes_itching"] == 1
+
+
+def test_masks_are_current_only_after_a_refresh(engine, lexicon):
+    store_reviews(engine, ["drowsy", "headache"])
+    assert current_property_bits(engine) is None
+    assert refresh_property_bits(engine) == 2
+    assert current_property_bits(engine) == {"causes_drowsiness": 0, "causes_nausea": 1, "causes_headache": 2}
+    assert stored_masks(engine) == [1, 4]
+    assert refresh_property_bits(engine) == 0
+
+
+def test_refresh_recomputes_only_the_changed_properties(engine, lexicon):
+    store_reviews(engine, ["drowsy", "queasy and drowsy", "migraine"])
+    refresh_property_bits(engine)
+    assert stored_masks(engine) == [1, 3, 0]
+
+    # a stale nausea bit shows whether unchanged properties are recomputed
+    with engine.begin() as conn:
+        conn.execute(text("UPDATE processed_data SET property_mask = property_mask | 2 WHERE uniqueID = 0"))
+
+    lexicon({**LEXICON, "causes_headache": ["headache", "migraine"]})
+    assert current_property_bits(engine) is None
+    assert refresh_property_bits(engine) == 1
+    assert stored_masks(engine) == [3, 3, 4]
+    assert current_property_bits(engine) is not None
+
+
+def test_rows_without_a_mask_get_every_bit(engine, lexicon):
+    refresh_property_bits(engine)
+    store_reviews(engine, ["sleepy with a headache", "nothing"], masks=[None, None])
+    assert refresh_property_bits(engine) == 2
+    assert stored_masks(engine) == [5, 0]
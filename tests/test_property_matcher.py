@@ -0,0 +1,83 @@
+import random
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from property_lexicon import PropertyMatcher, medical_properties
+
+FILLER = ["the", "pain", "head", "sick", "stomach", "very", "slept", "great", "relief", "day"]
+
+
+def substring_masks(reviews, properties=medical_properties):
+    """The per property scan PropertyMatcher replaced: any keyword as a case-insensitive substring."""
+    masks = []
+    for review in reviews:
+        review = review.lower() if isinstance(review, str) else ""
+        mask = 0
+        for i, keywords in enumerate(properties.values()):
+            if any(keyword.lower() in review for keyword in keywords):
+                mask |= 1 << i
+        masks.append(mask)
+    return masks
+
+
+def random_reviews(count, seed=0):
+    """Reviews glued from keywords and their fragments, so keywords overlap and nest."""
+    rng = random.Random(seed)
+    keywords = [keyword for words in medical_properties.values() for keyword in words]
+    reviews = []
+    for _ in range(count):
+        parts = []
+        for _ in range(rng.randint(0, 8)):
+            keyword = rng.choice(keywords)
+            if rng.random() < 0.3:
+                keyword = keyword[:rng.randint(1, len(keyword))]
+            parts.append(keyword.upper() if rng.random() < 0.2 else keyword)
+            parts.append(rng.choice(FILLER) if rng.random() < 0.5 else "")
+        reviews.append(rng.choice([" ", "", "-"]).join(parts))
+    return reviews + [None, ""]
+
+
+@pytest.fixture(scope="module")
+def matcher():
+    return PropertyMatcher()
+
+
+def test_masks_equal_the_substring_scan(matcher):
+    reviews = random_reviews(2000)
+    assert matcher.masks(pd.Series(reviews, dtype=object)).tolist() == substring_masks(reviews)
+
+
+def test_arrow_strings_give_the_same_masks(matcher):
+    pytest.importorskip("pyarrow")
+    reviews = random_reviews(500, seed=1)
+    arrow = pd.Series(reviews, dtype="string[pyarrow]")
+    assert matcher.masks(arrow).tolist() == substring_masks(reviews)
+
+
+def test_keyword_inside_a_longer_match_is_recovered():
+    matcher = PropertyMatcher({"relief": ["pain relief"], "pain": ["pain"], "gas": ["gas"]})
+    # the longest match at "pain" is "pain relief", "pain" is implied by it
+    assert matcher.mask("Pain Relief at last") == 0b011
+    assert matcher.mask("gasoline smell") == 0b100
+
+
+def test_keywords_are_taken_literally():
+    matcher = PropertyMatcher({"dose": ["1.5 mg", "(once)"]})
+    assert matcher.mask("took 1.5 mg") == 1
+    assert matcher.mask("took 105 mg") == 0
+    assert matcher.mask("taken (once) daily") == 1
+
+
+def test_matrix_has_one_column_per_property(matcher):
+    frame = matcher.matrix(["drowsy and dizzy", None])
+    assert list(frame.columns) == list(medical_properties)
+    assert frame.loc[0, "causes_drowsiness"] and frame.loc[0, "causes_dizziness"]
+    assert not frame.loc[1].any()
+    assert frame.dtypes.eq(np.bool_).all()
+
+
+def test_at_most_63_properties():
+    with pytest.raises(ValueError):
+        PropertyMatcher({f"p{i}": [f"k{i}"] for i in range(64)})
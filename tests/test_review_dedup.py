@@ -0,0 +1,85 @@
+import pandas as pd
+import pytest
+
+from review_dedup import (
+    ReviewDeduplicator, ensure_dedup_schema, merge_canonicals, dedup_stats, content_hash,
+)
+
+
+@pytest.fixture
+def dedup_engine(engine):
+    ensure_dedup_schema(engine)
+    return engine
+
+
+def raw_chunk(rows):
+    return pd.DataFrame(rows, columns=["uniqueID", "review"])
+
+
+def fake_stages(rows):
+    """Stand-in for the pipeline stages: derived columns from the review text only."""
+    return pd.DataFrame({
+        "uniqueID": rows["uniqueID"].to_numpy(),
+        "review": rows["review"].str.lower().to_numpy(),
+        "benefit_mentions": rows["review"].str.len().to_numpy(),
+        "side_effect_mentions": 0,
+        "property_mask": rows["uniqueID"].to_numpy() * 10,
+    })
+
+
+def dedup(deduplicator, chunk):
+    rows, duplicates = deduplicator.split(chunk)
+    return deduplicator.merge(fake_stages(rows), rows, duplicates)
+
+
+def store(engine, processed):
+    processed.to_sql("processed_data", engine, if_exists="append", index=False)
+
+
+def test_hash_ignores_case_whitespace_and_punctuation():
+    assert content_hash("Great  drug!!") == content_hash("great drug")
+    assert content_hash("great drug") != content_hash("great drugs")
+
+
+def test_copies_in_a_chunk_reuse_the_first_occurrence(dedup_engine):
+    deduplicator = ReviewDeduplicator(dedup_engine)
+    out = dedup(deduplicator, raw_chunk([(1, "Works well"), (2, "Made me dizzy"), (3, "works  WELL")]))
+    assert out["uniqueID"].tolist() == [1, 2, 3]
+    assert out["canonical_id"].tolist() == [1, 2, 1]
+    # the copy carries the canonical row's outputs, not its own
+    assert out.loc[2, "property_mask"] == 10
+    assert out.loc[2, "benefit_mentions"] == len("Works well")
+    assert (deduplicator.rows, deduplicator.duplicates) == (3, 1)
+
+
+def test_copies_of_stored_texts_reuse_the_stored_canonical(dedup_engine):
+    store(dedup_engine, dedup(ReviewDeduplicator(dedup_engine), raw_chunk([(1, "Works well")])))
+    # a later run only finds the text in processed_data
+    out = dedup(ReviewDeduplicator(dedup_engine), raw_chunk([(7, "works well!"), (8, "New text")]))
+    assert out["canonical_id"].tolist() == [1, 8]
+    assert out["property_mask"].tolist() == [10, 80]
+
+
+def test_merge_canonicals_keeps_the_lowest_copy(dedup_engine):
+    # two partitions each took their own copy of the text as canonical
+    first = dedup(ReviewDeduplicator(dedup_engine), raw_chunk([(1, "Works well"), (2, "Other")]))
+    second = dedup(ReviewDeduplicator(dedup_engine), raw_chunk([(5, "works well"), (6, "WORKS WELL")]))
+    store(dedup_engine, first)
+    store(dedup_engine, second)
+    assert dedup_stats(dedup_engine)["distinct_reviews"] == 3
+
+    assert merge_canonicals(dedup_engine) == 1
+    stored = pd.read_sql("SELECT uniqueID, canonical_id FROM processed_data ORDER BY uniqueID", dedup_engine)
+    assert stored["canonical_id"].tolist() == [1, 2, 1, 1]
+    assert dedup_stats(dedup_engine) == {
+        "rows": 4, "distinct_reviews": 2, "duplicates": 2, "dedup_ratio": 0.5, "rows_without_hash": 0,
+    }
+    assert merge_canonicals(dedup_engine) == 0
+
+
+def test_rows_without_hash_count_as_distinct(dedup_engine):
+    pd.DataFrame({"uniqueID": [1, 2], "review": ["a", "a"]}).to_sql(
+        "processed_data", dedup_engine, if_exists="append", index=False
+    )
+    assert dedup_stats(dedup_engine)["distinct_reviews"] == 2
+    assert dedup_stats(dedup_engine)["rows_without_hash"] == 2
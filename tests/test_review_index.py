@@ -0,0 +1,132 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import review_index
+from review_index import Segment, ReviewIndex, BM25_K1, BM25_B, update_index, load_index, read_manifest
+
+VOCABULARY = ["pain", "relief", "sleep", "drowsy", "weight", "gain", "headache", "work", "great", "day"]
+STOPWORDS = {"the", "and", "it"}
+
+
+class QueryNormalizer:
+    """The reviews are already processed tokens, queries only lose their stopwords."""
+
+    def tokenize_and_remove_stopwords(self, text):
+        return " ".join(word for word in text.split() if word not in STOPWORDS)
+
+
+@pytest.fixture(autouse=True)
+def query_normalizer(monkeypatch):
+    monkeypatch.setattr(review_index, "_normalizer", QueryNormalizer())
+
+
+def processed_reviews(count, first_id=0, seed=0):
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame({
+        "uniqueID": np.arange(first_id, first_id + count),
+        "drugName": rng.choice(["Zoloft", "Ibuprofen", "Melatonin"], count),
+        "conditions": rng.choice(np.array(["Pain", "Insomnia", None], dtype=object), count),
+        "review": [" ".join(rng.choice(VOCABULARY, rng.integers(0, 12))) for _ in range(count)],
+    })
+
+
+def split(frame, parts):
+    """Contiguous uniqueID ranges of the frame, one per segment."""
+    bounds = np.linspace(0, len(frame), parts + 1).astype(int)
+    return [frame.iloc[a:b] for a, b in zip(bounds, bounds[1:])]
+
+
+def contains(review, tokens):
+    words = review.split()
+    return any(words[i:i + len(tokens)] == tokens for i in range(len(words) - len(tokens) + 1))
+
+
+def bm25(frame, terms):
+    """Reference BM25 scores of every review."""
+    docs = [review.split() for review in frame["review"]]
+    avgdl = np.mean([len(doc) for doc in docs])
+    scores = np.zeros(len(docs))
+    for term in set(terms):
+        df = sum(term in doc for doc in docs)
+        idf = np.log(1 + (len(docs) - df + 0.5) / (df + 0.5))
+        for i, doc in enumerate(docs):
+            tf = doc.count(term)
+            if tf:
+                scores[i] += idf * tf * (BM25_K1 + 1) / (tf + BM25_K1 * (1 - BM25_B + BM25_B * len(doc) / avgdl))
+    return scores
+
+
+PHRASES = [["pain"], ["pain", "relief"], ["weight", "gain"], ["pain", "pain"], ["day", "work", "great"], ["unknown"]]
+
+
+@pytest.mark.parametrize("tokens", PHRASES)
+def test_phrase_matches_consecutive_tokens(tokens):
+    frame = processed_reviews(400)
+    expected = [contains(review, tokens) for review in frame["review"]]
+    assert Segment.build(frame).phrase(tokens).tolist() == expected
+
+
+def test_saved_and_merged_segments_answer_like_one_segment():
+    frame = processed_reviews(300)
+    whole = Segment.build(frame)
+    parts = [Segment(Segment.build(part).arrays()) for part in split(frame, 3)]
+    merged = Segment.merge(parts)
+    assert merged.doc_ids.tolist() == frame["uniqueID"].tolist()
+    for term in VOCABULARY:
+        for got, want in zip(merged.postings(term), whole.postings(term)):
+            assert got.tolist() == want.tolist()
+    for tokens in PHRASES:
+        assert merged.phrase(tokens).tolist() == whole.phrase(tokens).tolist()
+
+
+def test_search_ranks_by_bm25():
+    frame = processed_reviews(500)
+    index = ReviewIndex([Segment.build(part) for part in split(frame, 2)])
+    results = index.search("the pain and relief", limit=10)
+
+    scores = bm25(frame, ["pain", "relief"])
+    expected = frame.assign(score=scores)[scores > 0].sort_values(
+        ["score", "uniqueID"], ascending=[False, True]
+    ).head(10)
+    assert results["uniqueID"].tolist() == expected["uniqueID"].tolist()
+    assert np.allclose(results["score"], expected["score"])
+
+
+def test_search_filters_and_quoted_phrases():
+    frame = processed_reviews(500)
+    index = ReviewIndex([Segment.build(frame)])
+    results = index.search('"weight gain" sleep', drug="Zoloft", condition="Insomnia", limit=1000)
+    expected = frame[
+        (frame["drugName"] == "Zoloft") & (frame["conditions"] == "Insomnia")
+        & frame["review"].map(lambda review: contains(review, ["weight", "gain"]))
+    ]
+    assert sorted(results["uniqueID"]) == expected["uniqueID"].tolist()
+    assert set(results["drugName"]) <= {"Zoloft"}
+
+
+def test_phrase_lookup_over_segments():
+    frame = processed_reviews(300)
+    index = ReviewIndex([Segment.build(part) for part in split(frame, 3)])
+    expected = frame[frame["review"].map(lambda review: contains(review, ["pain", "relief"]))]
+    assert index.phrase("pain and relief").tolist() == expected["uniqueID"].tolist()
+    drug = expected[expected["drugName"] == "Ibuprofen"]
+    assert index.phrase("pain relief", drug="Ibuprofen").tolist() == drug["uniqueID"].tolist()
+
+
+def test_incremental_index_equals_a_rebuild(engine, store_processed, tmp_path, monkeypatch):
+    monkeypatch.setattr(review_index, "MAX_SMALL_SEGMENTS", 2)
+    incremental, rebuilt = str(tmp_path / "incremental"), str(tmp_path / "rebuilt")
+    for batch, first_id in enumerate([0, 120, 200, 260]):
+        store_processed(first_id, [120, 80, 60, 40][batch], seed=batch)
+        update_index(engine, incremental, chunk_size=50)
+    assert update_index(engine, incremental) == 0
+    assert update_index(engine, rebuilt, rebuild=True) == 300
+
+    manifest = read_manifest(incremental)
+    assert (manifest["watermark"], manifest["docs"]) == (299, 300)
+    assert len(manifest["segments"]) <= 3
+    for query in ['drowsy', 'headache "side effects"', 'pain relief minutes', 'great']:
+        results = load_index(incremental).search(query, limit=50)
+        assert not results.empty
+        pd.testing.assert_frame_equal(results, load_index(rebuilt).search(query, limit=50))
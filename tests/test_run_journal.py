@@ -0,0 +1,81 @@
+from sqlalchemy import text
+
+from ingestion_state import INCREMENTAL, FULL_REBUILD
+from run_journal import (
+    RUNS_TABLE, CLEARED, FAILED, open_run, record_chunk, resume_point, run_rows, close_run,
+    in_flight_runs,
+)
+
+
+def journal(engine, run_id, *chunks):
+    for chunk_start, chunk_end, rows in chunks:
+        with engine.begin() as conn:
+            record_chunk(conn, run_id, chunk_start, chunk_end, rows)
+
+
+def status(engine, run_id):
+    with engine.connect() as conn:
+        return conn.execute(
+            text(f"SELECT status FROM {RUNS_TABLE} WHERE run_id = :run_id"), {"run_id": run_id}
+        ).scalar()
+
+
+def test_resume_point_follows_contiguous_chunks(engine):
+    run_id, _ = open_run(engine, INCREMENTAL)
+    assert resume_point(engine, run_id, -1, 100) == -1
+    journal(engine, run_id, (-1, 10, 11), (10, 25, 15))
+    assert resume_point(engine, run_id, -1, 100) == 25
+
+
+def test_resume_point_stops_at_the_first_gap(engine):
+    run_id, _ = open_run(engine, INCREMENTAL)
+    # (25, 40] was never committed, (40, 60] was committed out of order
+    journal(engine, run_id, (-1, 10, 11), (10, 25, 15), (40, 60, 20))
+    assert resume_point(engine, run_id, -1, 100) == 25
+
+
+def test_resume_point_is_clamped_to_the_partition(engine):
+    run_id, _ = open_run(engine, INCREMENTAL)
+    journal(engine, run_id, (0, 50, 50), (50, 120, 70))
+    # a partition starting inside a journaled chunk
+    assert resume_point(engine, run_id, 30, 100) == 100
+    # chunks of other partitions do not count
+    assert resume_point(engine, run_id, 200, 300) == 200
+
+
+def test_resume_point_is_per_run(engine):
+    first, _ = open_run(engine, INCREMENTAL, run_id="first")
+    second, _ = open_run(engine, INCREMENTAL, run_id="second")
+    journal(engine, first, (-1, 10, 11))
+    assert resume_point(engine, second, -1, 10) == -1
+
+
+def test_open_run_resumes_the_in_flight_run_of_the_same_mode(engine):
+    run_id, resumed = open_run(engine, INCREMENTAL)
+    assert not resumed
+    journal(engine, run_id, (-1, 10, 11))
+    close_run(engine, run_id, FAILED)
+
+    assert open_run(engine, INCREMENTAL) == (run_id, True)
+    journal(engine, run_id, (10, 20, 10))
+    assert run_rows(engine, run_id) == 21
+    [run] = in_flight_runs(engine)
+    assert (run["run_id"], run["attempts"], run["last_uniqueID"]) == (run_id, 2, 20)
+
+
+def test_open_run_of_another_mode_clears_the_in_flight_run(engine):
+    run_id, _ = open_run(engine, INCREMENTAL)
+    rebuild_id, resumed = open_run(engine, FULL_REBUILD)
+    assert rebuild_id != run_id and not resumed
+    assert status(engine, run_id) == CLEARED
+
+
+def test_successful_run_drops_its_chunks(engine):
+    run_id, _ = open_run(engine, INCREMENTAL, run_id="scheduled__1")
+    journal(engine, run_id, (-1, 10, 11))
+    close_run(engine, run_id)
+    assert run_rows(engine, run_id) == 0
+
+    # a finished run id handed out again starts a fresh run
+    assert open_run(engine, INCREMENTAL, run_id="scheduled__1") == ("scheduled__1", False)
+    assert resume_point(engine, run_id, -1, 10) == -1
@@ -0,0 +1,67 @@
+import os
+
+import pandas as pd
+import pytest
+
+from ingestion_state import get_watermark
+from snapshot import publish_snapshot, read_pointer, load_snapshot, load_snapshot_frame
+
+
+@pytest.fixture
+def snapshot_dir(tmp_path):
+    return str(tmp_path / "snapshots")
+
+
+def snapshot_files(snapshot_dir):
+    return sorted(name for name in os.listdir(snapshot_dir) if name.endswith(".arrow"))
+
+
+def test_snapshot_holds_every_processed_row(engine, store_processed, snapshot_dir):
+    rows = store_processed(0, 120)
+    pointer = publish_snapshot(engine, snapshot_dir, chunk_size=50, watermark=get_watermark(engine))
+    assert (pointer["rows"], pointer["watermark"]) == (120, 119)
+
+    frame = load_snapshot_frame(["uniqueID", "drugName", "property_mask", "review_date"], snapshot_dir)
+    assert frame["uniqueID"].tolist() == rows["uniqueID"].tolist()
+    assert frame["drugName"].tolist() == rows["drugName"].tolist()
+    assert frame["property_mask"].tolist() == rows["property_mask"].tolist()
+    assert pd.to_datetime(frame["review_date"].astype(str)).tolist() == rows["review_date"].tolist()
+
+
+def test_unchanged_watermark_keeps_the_current_snapshot(engine, store_processed, snapshot_dir):
+    store_processed(0, 10)
+    first = publish_snapshot(engine, snapshot_dir, watermark=9, force=False)
+    assert publish_snapshot(engine, snapshot_dir, watermark=9, force=False) == first
+    assert len(snapshot_files(snapshot_dir)) == 1
+
+    # forced (e.g. masks changed) or new rows: a new snapshot
+    forced = publish_snapshot(engine, snapshot_dir, watermark=9)
+    store_processed(10, 5)
+    newer = publish_snapshot(engine, snapshot_dir, watermark=14, force=False)
+    assert len({first["version"], forced["version"], newer["version"]}) == 3
+    assert read_pointer(snapshot_dir) == newer
+    assert newer["rows"] == 15
+
+
+def test_old_snapshots_are_pruned(engine, store_processed, snapshot_dir):
+    store_processed(0, 10)
+    for watermark in range(4):
+        pointer = publish_snapshot(engine, snapshot_dir, keep=2, watermark=watermark)
+    files = snapshot_files(snapshot_dir)
+    assert len(files) == 2 and files[-1] == pointer["file"]
+
+
+def test_load_snapshot_is_cached_per_version(engine, store_processed, snapshot_dir):
+    store_processed(0, 10)
+    with pytest.raises(FileNotFoundError):
+        load_snapshot(snapshot_dir)
+    publish_snapshot(engine, snapshot_dir, watermark=9)
+    table, version = load_snapshot(snapshot_dir)
+    assert load_snapshot(snapshot_dir)[0] is table
+    publish_snapshot(engine, snapshot_dir, watermark=10)
+    assert load_snapshot(snapshot_dir)[1] != version
+
+
+def test_empty_processed_data(engine, snapshot_dir):
+    assert publish_snapshot(engine, snapshot_dir)["rows"] == 0
+    assert load_snapshot(snapshot_dir)[0].num_rows == 0